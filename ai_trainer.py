@@ -3,83 +3,124 @@ AI-BD Training System
 This module provides various ways to train and improve the AI-BD chatbot
 """
 
-import json
-import re
 import pickle
 import os
 from datetime import datetime
-from collections import defaultdict, Counter
-import nltk
+from collections import Counter
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import Pipeline
-import pandas as pd
+from storage import open_storage, ConversationHistory
+from data_export import export_stream, import_stream, print_progress
+from model_artifact import save_model, model_exists, install_version, CompiledModel
+from similarity_index import SimilarityIndex, english_stop_words
+from bm25_index import BM25Index, DEFAULT_RANKING
+from semantic_index import SemanticIndex
+from text_processing import extract_keywords
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+# "online" keeps the ML model current by learning from every logged
+# conversation (HashingVectorizer + partial_fit) instead of batch retraining
+DEFAULT_ML_MODE = os.environ.get("AIBD_ML_MODE", "batch")
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+# Response categories the ML model predicts (see categorize_responses)
+ML_CATEGORIES = ('greeting', 'help', 'time', 'weather', 'programming', 'general')
+
+def categorize_responses(responses):
+    """Categorize responses for training"""
+    categories = []
+    for response in responses:
+        if any(word in response.lower() for word in ['hello', 'hi', 'hey', 'greet']):
+            categories.append('greeting')
+        elif any(word in response.lower() for word in ['help', 'assist', 'support']):
+            categories.append('help')
+        elif any(word in response.lower() for word in ['time', 'date', 'clock']):
+            categories.append('time')
+        elif any(word in response.lower() for word in ['weather', 'temperature']):
+            categories.append('weather')
+        elif any(word in response.lower() for word in ['programming', 'code', 'python']):
+            categories.append('programming')
+        else:
+            categories.append('general')
+    return categories
+
+def fit_ml_pipeline(inputs, categories):
+    """Fit the TF-IDF + Naive Bayes pipeline; returns (pipeline, vectorizer)"""
+    # sklearn is only needed to train (and to read a legacy pickled model)
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+    
+    vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+    pipeline = Pipeline([
+        ('tfidf', vectorizer),
+        ('classifier', MultinomialNB())
+    ])
+    pipeline.fit(inputs, categories)
+    return pipeline, vectorizer
 
 class AITrainer:
-    def __init__(self, data_dir="training_data"):
+    def __init__(self, data_dir="training_data", storage_mode=None, write_mode=None, ranking=None,
+                 ml_mode=None, **storage_options):
         self.data_dir = data_dir
         self.conversation_log_file = os.path.join(data_dir, "conversations.json")
         self.feedback_file = os.path.join(data_dir, "feedback.json")
         self.learned_patterns_file = os.path.join(data_dir, "learned_patterns.json")
         self.model_file = os.path.join(data_dir, "trained_model.pkl")
+        self.model_dir = os.path.join(data_dir, "trained_model")
+        self.online_model_dir = os.path.join(data_dir, "online_model")
+        self.ml_mode = ml_mode or DEFAULT_ML_MODE
+        self.storage_mode = storage_mode
         
         # Create data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
+        self.storage = open_storage(data_dir, storage_mode, write_mode, **storage_options)
         
-        # Initialize data structures
-        self.conversations = self.load_conversations()
-        self.feedback_data = self.load_feedback()
+        # Initialize data structures; full histories are streamed from storage
+        # and only the most recent records are kept in memory
+        self.history = self.load_conversations()
+        self.feedback_history = self.load_feedback()
+        self.conversations = self.history.recent
+        self.feedback_data = self.feedback_history.recent
         self.learned_patterns = self.load_learned_patterns()
+        self.build_pattern_index()
+        # TF-IDF index of past inputs, loaded on the first similarity search
+        self.similarity_index = SimilarityIndex(os.path.join(data_dir, "similarity_index.jsonl"), self.history)
+        # BM25 and LSA alternatives ("tfidf", "bm25" or "lsa" picks the default
+        # ranking); the LSA index is built when the ML model is trained
+        self.bm25_index = BM25Index(os.path.join(data_dir, "bm25_index.jsonl"), self.history)
+        self.semantic_index = SemanticIndex(os.path.join(data_dir, "semantic_index"), self.history)
+        self.ranking = ranking or DEFAULT_RANKING
         self.ml_model = None
         self.vectorizer = None
         
         # Load or create ML model
         self.load_or_create_model()
     
+    def warm_up(self):
+        """Do first-use work (lazy imports, loading the search index) ahead of requests"""
+        english_stop_words()
+        if self.ranking == 'bm25':
+            self.bm25_index.load()
+        elif self.ranking == 'lsa':
+            self.semantic_index.load()
+        else:
+            self.similarity_index.load()
+    
     def load_conversations(self):
         """Load conversation history"""
-        if os.path.exists(self.conversation_log_file):
-            with open(self.conversation_log_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+        self.storage.load("conversations", [])
+        return ConversationHistory(self.storage, "conversations")
     
     def load_feedback(self):
         """Load user feedback data"""
-        if os.path.exists(self.feedback_file):
-            with open(self.feedback_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
+        self.storage.load("feedback", [])
+        return ConversationHistory(self.storage, "feedback")
     
     def load_learned_patterns(self):
         """Load learned conversation patterns"""
-        if os.path.exists(self.learned_patterns_file):
-            with open(self.learned_patterns_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return self.storage.load("learned_patterns", {})
     
     def save_data(self):
         """Save all training data"""
-        with open(self.conversation_log_file, 'w', encoding='utf-8') as f:
-            json.dump(self.conversations, f, indent=2, ensure_ascii=False)
-        
-        with open(self.feedback_file, 'w', encoding='utf-8') as f:
-            json.dump(self.feedback_data, f, indent=2, ensure_ascii=False)
-        
-        with open(self.learned_patterns_file, 'w', encoding='utf-8') as f:
-            json.dump(self.learned_patterns, f, indent=2, ensure_ascii=False)
+        self.storage.flush()
     
     def log_conversation(self, user_input, bot_response, context=None):
         """Log a conversation for training"""
@@ -89,8 +130,7 @@ class AITrainer:
             "bot_response": bot_response,
             "context": context or []
         }
-        self.conversations.append(conversation_entry)
-        self.save_data()
+        self.history.append(conversation_entry)
     
     def add_feedback(self, user_input, bot_response, rating, feedback_text=""):
         """Add user feedback for a response (1-5 rating)"""
@@ -101,8 +141,7 @@ class AITrainer:
             "rating": rating,
             "feedback": feedback_text
         }
-        self.feedback_data.append(feedback_entry)
-        self.save_data()
+        self.feedback_history.append(feedback_entry)
         
         # Learn from negative feedback
         if rating <= 2:
@@ -115,37 +154,73 @@ class AITrainer:
         
         # Store as a pattern to avoid in future
         pattern_key = f"avoid_{len(self.learned_patterns)}"
-        self.learned_patterns[pattern_key] = {
+        self.add_pattern(pattern_key, {
             "input_keywords": keywords,
             "bad_response": bot_response,
             "feedback": feedback,
             "learn_type": "negative"
-        }
+        })
     
     def learn_from_positive_feedback(self, user_input, bot_response):
         """Learn from good responses to use similar ones"""
         keywords = self.extract_keywords(user_input)
         
         pattern_key = f"good_{len(self.learned_patterns)}"
-        self.learned_patterns[pattern_key] = {
+        self.add_pattern(pattern_key, {
             "input_keywords": keywords,
             "good_response": bot_response,
             "learn_type": "positive"
-        }
+        })
+    
+    def add_pattern(self, pattern_key, pattern_data):
+        """Store a learned pattern and keep the pattern indexes in sync"""
+        replacing = pattern_key in self.learned_patterns
+        self.storage.put("learned_patterns", pattern_key, pattern_data)
+        if replacing:
+            self.build_pattern_index()
+        else:
+            self.index_pattern(len(self.learned_patterns) - 1, pattern_data)
+    
+    def build_pattern_index(self):
+        """Index learned patterns by keyword (positive) and bad response (negative)"""
+        # Both map to the position of the earliest such pattern, so lookups
+        # give the same answer as scanning the patterns in order
+        self.positive_keywords = {}
+        self.negative_responses = {}
+        for position, pattern_data in enumerate(self.learned_patterns.values()):
+            self.index_pattern(position, pattern_data)
+    
+    def index_pattern(self, position, pattern_data):
+        # learned_patterns.json may also hold the keyword -> responses lists
+        # written by SimpleAITrainer; those never apply here
+        if not isinstance(pattern_data, dict):
+            return
+        if pattern_data.get('learn_type') == 'positive':
+            for keyword in pattern_data['input_keywords']:
+                self.positive_keywords.setdefault(keyword, position)
+        elif pattern_data.get('learn_type') == 'negative':
+            self.negative_responses.setdefault(pattern_data['bad_response'].lower(), position)
     
     def extract_keywords(self, text):
-        """Extract important keywords from text"""
-        from nltk.corpus import stopwords
-        from nltk.tokenize import word_tokenize
-        
-        stop_words = set(stopwords.words('english'))
-        words = word_tokenize(text.lower())
-        keywords = [word for word in words if word.isalnum() and word not in stop_words]
-        return keywords
+        """Extract important keywords from text (cached, same tokens as NLTK's word_tokenize)"""
+        return extract_keywords(text)
+    
+    def learn_online(self):
+        """Serve predictions from the online model once it has learned a batch (on its worker thread)"""
+        self.ml_model = self.online_model
     
     def train_ml_model(self):
         """Train a machine learning model on conversation data"""
-        if len(self.conversations) < 10:
+        if self.ml_mode == 'online':
+            # Already current; just make sure nothing is missed and save it
+            caught_up = self.online_model.catch_up(self.history)
+            self.online_model.save()
+            self.ml_model = self.online_model if self.online_model.learned else None
+            print(f"✅ Online model up to date ({caught_up} conversations learned now, "
+                  f"{self.online_model.learned} in total)")
+            return self.ml_model is not None
+        
+        if len(self.history) < 10:
             print("Need at least 10 conversations to train ML model")
             return False
         
@@ -153,28 +228,23 @@ class AITrainer:
         inputs = []
         responses = []
         
-        for conv in self.conversations:
+        for conv in self.history:
             inputs.append(conv['user_input'])
             responses.append(conv['bot_response'])
         
-        # Create TF-IDF vectorizer and Naive Bayes classifier
-        self.vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-        self.ml_model = Pipeline([
-            ('tfidf', self.vectorizer),
-            ('classifier', MultinomialNB())
-        ])
-        
-        # Train the model
+        # Train a TF-IDF vectorizer and Naive Bayes classifier
         try:
             # For simplicity, we'll create response categories
             response_categories = self.categorize_responses(responses)
-            self.ml_model.fit(inputs, response_categories)
+            pipeline, vectorizer = fit_ml_pipeline(inputs, response_categories)
             
-            # Save the model
-            with open(self.model_file, 'wb') as f:
-                pickle.dump((self.ml_model, self.vectorizer), f)
+            # Save the model as a versioned artifact
+            save_model(self.model_dir, vectorizer, pipeline.named_steps['classifier'], len(inputs))
+            self.ml_model, self.vectorizer = pipeline, vectorizer
             
             print(f"✅ ML model trained on {len(inputs)} conversations")
+            if self.semantic_index.build():
+                print("✅ Semantic index rebuilt")
             return True
         except Exception as e:
             print(f"❌ Error training ML model: {e}")
@@ -182,28 +252,56 @@ class AITrainer:
     
     def categorize_responses(self, responses):
         """Categorize responses for training"""
-        categories = []
-        for response in responses:
-            if any(word in response.lower() for word in ['hello', 'hi', 'hey', 'greet']):
-                categories.append('greeting')
-            elif any(word in response.lower() for word in ['help', 'assist', 'support']):
-                categories.append('help')
-            elif any(word in response.lower() for word in ['time', 'date', 'clock']):
-                categories.append('time')
-            elif any(word in response.lower() for word in ['weather', 'temperature']):
-                categories.append('weather')
-            elif any(word in response.lower() for word in ['programming', 'code', 'python']):
-                categories.append('programming')
-            else:
-                categories.append('general')
-        return categories
+        return categorize_responses(responses)
+    
+    def install_model(self, path, semantic_path=None):
+        """Check the model artifact at path and make it the live model
+        
+        The artifact is moved in as a new version and the model switched
+        with one reference assignment, so a chat request uses either the old
+        model or the new one, never a mix.  The old version's files stay on
+        disk until the next install, as requests may still be using them.
+        A semantic index built with the model at semantic_path is installed
+        along with it, and only if the model passes the check.
+        """
+        # Checked without mapping it, so the directory can be moved on Windows
+        model = CompiledModel(path, mmap_mode=None)
+        probabilities = model.predict_proba(["hello"])
+        if probabilities.shape != (1, len(model.classes_)) or not np.isfinite(probabilities).all():
+            raise ValueError("Trained model gives invalid predictions")
+        # Missing when there was too little text to fit it
+        if semantic_path is not None and os.path.exists(semantic_path):
+            self.semantic_index.install(semantic_path)
+        model = CompiledModel(install_version(path, self.model_dir))
+        self.ml_model = model
+        self.vectorizer = model
     
     def load_or_create_model(self):
         """Load existing ML model or create new one"""
-        if os.path.exists(self.model_file):
+        if self.ml_mode == 'online':
+            from online_model import OnlineModel
+            self.online_model = OnlineModel(self.online_model_dir, ML_CATEGORIES, self.categorize_responses)
+            caught_up = self.online_model.catch_up(self.history)
+            if caught_up:
+                print(f"✅ Online model learned {caught_up} new conversations")
+            self.history.listeners.append(self.online_model.learn_later)
+            self.online_model.listeners.append(self.learn_online)
+            if self.online_model.learned:
+                self.ml_model = self.online_model
+        elif model_exists(self.model_dir):
+            try:
+                self.ml_model = self.vectorizer = CompiledModel(self.model_dir)
+                print("✅ Loaded existing ML model")
+            except Exception as e:
+                print(f"❌ Error loading model: {e}")
+                self.ml_model = None
+                self.vectorizer = None
+        elif os.path.exists(self.model_file):
+            # Model pickled by an older version: load it once and convert it
             try:
                 with open(self.model_file, 'rb') as f:
                     self.ml_model, self.vectorizer = pickle.load(f)
+                save_model(self.model_dir, self.vectorizer, self.ml_model.named_steps['classifier'])
                 print("✅ Loaded existing ML model")
             except Exception as e:
                 print(f"❌ Error loading model: {e}")
@@ -212,12 +310,14 @@ class AITrainer:
     
     def get_ml_suggestion(self, user_input):
         """Get ML model suggestion for response"""
-        if self.ml_model is None:
+        # One read: a retrain may swap in a new model meanwhile
+        model = self.ml_model
+        if model is None:
             return None
         
         try:
-            category = self.ml_model.predict([user_input])[0]
-            confidence = max(self.ml_model.predict_proba([user_input])[0])
+            category = model.predict([user_input])[0]
+            confidence = max(model.predict_proba([user_input])[0])
             
             return {
                 'category': category,
@@ -227,101 +327,122 @@ class AITrainer:
             print(f"Error getting ML suggestion: {e}")
             return None
     
-    def find_similar_conversations(self, user_input, top_k=3):
-        """Find similar past conversations"""
-        if not self.conversations:
-            return []
-        
-        # Use TF-IDF to find similar conversations
-        all_inputs = [conv['user_input'] for conv in self.conversations]
-        all_inputs.append(user_input)
-        
-        vectorizer = TfidfVectorizer(stop_words='english')
-        tfidf_matrix = vectorizer.fit_transform(all_inputs)
-        
-        # Calculate similarity with the new input (last item)
-        similarities = cosine_similarity(tfidf_matrix[-1:], tfidf_matrix[:-1])[0]
-        
-        # Get top similar conversations
-        similar_indices = similarities.argsort()[-top_k:][::-1]
-        
-        similar_conversations = []
-        for idx in similar_indices:
-            if similarities[idx] > 0.1:  # Minimum similarity threshold
-                similar_conversations.append({
-                    'conversation': self.conversations[idx],
-                    'similarity': similarities[idx]
-                })
+    def get_ml_suggestions(self, user_inputs):
+        """ML model suggestions for many inputs with one vectorization and prediction"""
+        model = self.ml_model
+        if model is None:
+            return [None] * len(user_inputs)
         
-        return similar_conversations
+        try:
+            probabilities = model.predict_proba(list(user_inputs))
+            best = probabilities.argmax(axis=1)
+            categories = model.classes_[best]
+            confidences = probabilities[np.arange(len(best)), best]
+            
+            return [{'category': category, 'confidence': confidence}
+                    for category, confidence in zip(categories, confidences)]
+        except Exception as e:
+            print(f"Error getting ML suggestions: {e}")
+            return [None] * len(user_inputs)
+    
+    def find_similar_conversations_batch(self, user_inputs, top_k=3, ranking=None):
+        """find_similar_conversations for many inputs with one sparse matrix product"""
+        if (ranking or self.ranking) == 'bm25':
+            return [self.bm25_index.search(user_input, top_k) for user_input in user_inputs]
+        if (ranking or self.ranking) == 'lsa':
+            return [self.semantic_index.search(user_input, top_k, min_similarity=0.1) for user_input in user_inputs]
+        return self.similarity_index.search_batch(user_inputs, top_k, min_similarity=0.1)
+    
+    def find_similar_conversations(self, user_input, top_k=3, approximate=None, ranking=None):
+        """Find similar past conversations (approximate=True for LSH search)
+
+        ranking='bm25' ranks by BM25 score instead of TF-IDF cosine, and
+        ranking='lsa' by cosine in LSA space (catches paraphrases).
+        """
+        if (ranking or self.ranking) == 'bm25':
+            return self.bm25_index.search(user_input, top_k)
+        if (ranking or self.ranking) == 'lsa':
+            return self.semantic_index.search(user_input, top_k, min_similarity=0.1)
+        # Minimum similarity threshold of 0.1
+        return self.similarity_index.search(user_input, top_k, min_similarity=0.1, approximate=approximate)
     
     def get_adaptive_response(self, user_input, base_response):
         """Get an adaptive response based on learning"""
         # Check if we have learned patterns that apply
         keywords = self.extract_keywords(user_input)
         
-        for pattern_key, pattern_data in self.learned_patterns.items():
-            if pattern_data['learn_type'] == 'positive':
-                # If current input has similar keywords to a positively rated response
-                if any(keyword in pattern_data['input_keywords'] for keyword in keywords):
-                    return f"{base_response} (I've learned you might like responses like this!)"
-            
-            elif pattern_data['learn_type'] == 'negative':
-                # Avoid responses similar to negatively rated ones
-                if base_response.lower() == pattern_data['bad_response'].lower():
-                    return "Let me try a different approach to answer that better."
+        # If current input has similar keywords to a positively rated response
+        positive = min((self.positive_keywords[keyword] for keyword in keywords
+                        if keyword in self.positive_keywords), default=None)
+        # Avoid responses similar to negatively rated ones
+        negative = self.negative_responses.get(base_response.lower())
+        
+        # The earliest learned pattern that applies wins
+        if positive is not None and (negative is None or positive < negative):
+            return f"{base_response} (I've learned you might like responses like this!)"
+        if negative is not None:
+            return "Let me try a different approach to answer that better."
         
         return base_response
     
     def generate_training_report(self):
         """Generate a report on training progress"""
         report = {
-            "total_conversations": len(self.conversations),
-            "total_feedback": len(self.feedback_data),
+            "total_conversations": len(self.history),
+            "total_feedback": len(self.feedback_history),
             "learned_patterns": len(self.learned_patterns),
             "average_rating": 0,
             "ml_model_trained": self.ml_model is not None
         }
         
-        if self.feedback_data:
-            ratings = [f['rating'] for f in self.feedback_data]
-            report['average_rating'] = sum(ratings) / len(ratings)
+        if report['total_feedback']:
+            ratings = sum(f['rating'] for f in self.feedback_history)
+            report['average_rating'] = ratings / report['total_feedback']
         
         # Conversation topics analysis
-        if self.conversations:
-            all_text = ' '.join([conv['user_input'] for conv in self.conversations])
-            keywords = self.extract_keywords(all_text)
-            common_topics = Counter(keywords).most_common(10)
+        if report['total_conversations']:
+            keywords = Counter()
+            for conv in self.history:
+                keywords.update(self.extract_keywords(conv['user_input']))
+            common_topics = keywords.most_common(10)
             report['common_topics'] = common_topics
         
         return report
     
-    def export_training_data(self, filename="ai_bd_training_export.json"):
-        """Export all training data for backup or sharing"""
-        export_data = {
-            "conversations": self.conversations,
-            "feedback": self.feedback_data,
-            "learned_patterns": self.learned_patterns,
+    def export_training_data(self, filename="ai_bd_training_export.json", progress=print_progress):
+        """Export all training data for backup or sharing
+
+        Records are streamed from storage one at a time; use a .jsonl or
+        .jsonl.gz filename for a line-per-record (optionally gzipped) export.
+        """
+        meta = {
             "export_date": datetime.now().isoformat(),
             "version": "1.0"
         }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, indent=2, ensure_ascii=False)
+        lists = {
+            "conversations": self.history,
+            "feedback": self.feedback_history
+        }
+        export_stream(filename, meta, lists, {"learned_patterns": self.learned_patterns}, progress)
         
         print(f"✅ Training data exported to {filename}")
     
-    def import_training_data(self, filename):
+    def import_patterns(self, patterns):
+        self.storage.update("learned_patterns", patterns)
+        self.build_pattern_index()
+    
+    def import_training_data(self, filename, progress=print_progress):
         """Import training data from file"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                import_data = json.load(f)
-            
-            self.conversations.extend(import_data.get('conversations', []))
-            self.feedback_data.extend(import_data.get('feedback', []))
-            self.learned_patterns.update(import_data.get('learned_patterns', {}))
+            lists = {
+                "conversations": self.history.extend,
+                "feedback": self.feedback_history.extend
+            }
+            mappings = {
+                "learned_patterns": self.import_patterns
+            }
+            import_stream(filename, lists, mappings, progress)
             
-            self.save_data()
             print(f"✅ Training data imported from {filename}")
             return True
         except Exception as e:
@@ -364,7 +485,7 @@ if __name__ == "__main__":
     trainer = AITrainer()
     
     # Create sample data if no conversations exist
-    if len(trainer.conversations) == 0:
+    if len(trainer.history) == 0:
         print("Creating sample training data...")
         create_sample_training_data(trainer)
     
@@ -375,7 +496,8 @@ if __name__ == "__main__":
         print(f"  {key}: {value}")
     
     # Try to train ML model
-    if len(trainer.conversations) >= 10:
+    conversation_count = len(trainer.history)
+    if conversation_count >= 10:
         trainer.train_ml_model()
     else:
-        print(f"Need {10 - len(trainer.conversations)} more conversations to train ML model")
+        print(f"Need {10 - conversation_count} more conversations to train ML model")
@@ -1,18 +1,37 @@
 from flask import Flask, render_template, request, jsonify
-import re
 import random
 import datetime
-import json
+from pattern_matcher import PatternMatcher
+from spelling import DEFAULT_SPELLING
+from retrain_jobs import RetrainJobs, RetrainScheduler, AUTO_RETRAIN
 import os
+import threading
 
-# Import training system
-try:
-    from ai_trainer import AITrainer
-    TRAINING_ENABLED = True
-except ImportError as e:
-    print("WARNING: Training modules not available. Install requirements: pip install -r requirements.txt")
-    print(f"Error: {e}")
-    TRAINING_ENABLED = False
+# With AIBD_FAST_START=1 the training system is loaded in the background,
+# so the server answers rule-based chat while numpy/sklearn and the data load
+FAST_START = os.environ.get("AIBD_FAST_START") == "1"
+TRAINING_ENABLED = True
+
+def load_trainer():
+    """Import the training system and create a warmed-up trainer, or None"""
+    global TRAINING_ENABLED
+    try:
+        from ai_trainer import AITrainer
+        from storage import SERVER_WRITE_MODE
+    except ImportError as e:
+        print("WARNING: Training modules not available. Install requirements: pip install -r requirements.txt")
+        print(f"Error: {e}")
+        TRAINING_ENABLED = False
+        return None
+    
+    try:
+        trainer = AITrainer(write_mode=SERVER_WRITE_MODE)
+        trainer.warm_up()
+        print("AI Training system initialized")
+        return trainer
+    except Exception as e:
+        print(f"Training system error: {e}")
+        return None
 
 app = Flask(__name__)
 
@@ -20,13 +39,12 @@ class CustomAIChatbot:
     def __init__(self):
         # Initialize training system if available
         self.trainer = None
-        if TRAINING_ENABLED:
-            try:
-                self.trainer = AITrainer()
-                print("AI Training system initialized")
-            except Exception as e:
-                print(f"Training system error: {e}")
-                self.trainer = None
+        self.retrain_jobs = None
+        self.retrain_scheduler = None
+        if FAST_START:
+            threading.Thread(target=self.start_training, name="trainer-warm-up", daemon=True).start()
+        else:
+            self.start_training()
         
         self.conversation_patterns = {
             # Greetings
@@ -137,6 +155,18 @@ class CustomAIChatbot:
         ]
         
         self.context_memory = []
+        
+        # All patterns compiled into one matcher; first match in dict order wins,
+        # retried with misspelled rule words corrected if AIBD_SPELLING=1
+        self.pattern_matcher = PatternMatcher(self.conversation_patterns, spelling=DEFAULT_SPELLING)
+    
+    def start_training(self):
+        trainer = load_trainer()
+        if trainer:
+            self.retrain_jobs = RetrainJobs(trainer)
+            if AUTO_RETRAIN and trainer.ml_mode != 'online':
+                self.retrain_scheduler = RetrainScheduler(trainer, self.retrain_jobs)
+            self.trainer = trainer
     
     def get_response(self, user_input):
         user_input_lower = user_input.lower()
@@ -148,10 +178,9 @@ class CustomAIChatbot:
         
         # Get base response from patterns
         base_response = None
-        for pattern, responses in self.conversation_patterns.items():
-            if re.search(pattern, user_input_lower):
-                base_response = random.choice(responses)
-                break
+        pattern = self.pattern_matcher.match(user_input_lower)
+        if pattern is not None:
+            base_response = random.choice(self.conversation_patterns[pattern])
         
         # If no pattern matches, use fallback
         if not base_response:
@@ -252,31 +281,40 @@ def training_report():
     
     try:
         report = chatbot.trainer.generate_training_report()
+        if chatbot.retrain_scheduler:
+            report['auto_retrain'] = chatbot.retrain_scheduler.status()
         return jsonify(report)
     except Exception as e:
         return jsonify({'error': str(e)})
 
 @app.route('/retrain', methods=['POST'])
 def retrain():
-    """Retrain the ML model"""
+    """Start retraining the ML model in the background"""
     if not TRAINING_ENABLED or not chatbot.trainer:
         return jsonify({'success': False, 'message': 'Training not available'})
     
     try:
-        success = chatbot.trainer.train_ml_model()
-        if success:
-            return jsonify({
-                'success': True, 
-                'message': 'AI model retrained successfully!'
-            })
-        else:
-            return jsonify({
-                'success': False, 
-                'message': 'Need more conversation data to retrain'
-            })
+        job = chatbot.retrain_jobs.submit()
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'message': 'Retraining started'
+        })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/retrain/<job_id>')
+def retrain_status(job_id):
+    """Progress of a retraining job"""
+    if not TRAINING_ENABLED or not chatbot.retrain_jobs:
+        return jsonify({'success': False, 'message': 'Training not available'})
+    
+    job = chatbot.retrain_jobs.status(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown retrain job'}), 404
+    return jsonify({'success': True, **job})
+
 @app.route('/export_training')
 def export_training():
     """Export training data"""
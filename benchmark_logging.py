@@ -0,0 +1,51 @@
+"""
+AI-BD Logging Benchmark
+Latency of log_conversation on a large history with the background writer
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from ai_trainer import AITrainer
+from benchmark_memory import make_conversations
+
+# Chat turns logged per mode, and the pause between them (a steady trickle of requests)
+TURNS = 2000
+PAUSE = 0.001
+
+
+def measure(mode, history_size, turns=TURNS):
+    """log_conversation latencies (seconds) with history_size records already stored"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        with open(os.path.join(data_dir, "conversations.json"), 'w', encoding='utf-8') as f:
+            f.write(make_conversations(history_size, shape="trainer"))
+        # jsonl snapshots often enough that several happen during the run
+        options = {'snapshot_every': 500} if mode == "jsonl" else {}
+        trainer = AITrainer(data_dir=data_dir, storage_mode=mode, write_mode="background", **options)
+        latencies = []
+        for i in range(turns):
+            start = time.perf_counter()
+            trainer.log_conversation(f"benchmark question {i}", "benchmark answer")
+            latencies.append(time.perf_counter() - start)
+            time.sleep(PAUSE)
+        trainer.storage.close()
+    return sorted(latencies)
+
+
+def main():
+    history_size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"🧪 Logging {TURNS} turns on top of {history_size} conversations (background writer)...")
+    print(f"  {'mode':<8}{'p50':>10}{'p99':>10}{'max':>10}")
+    for mode in ("json", "jsonl"):
+        latencies = measure(mode, history_size)
+        p50 = statistics.median(latencies)
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print(f"  {mode:<8}{p50 * 1000:>8.2f}ms{p99 * 1000:>8.2f}ms{latencies[-1] * 1000:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+AI-BD Memory Benchmark
+Compare the RAM used by conversation history as a list of dicts and as a compact store
+"""
+
+import json
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from compact_store import CompactConversations
+
+
+def make_conversations(count, shape="simple", distinct_responses=500):
+    """Build logged turns the way the trainers store them
+
+    Every user input is different, as in real traffic; only bot responses
+    (and feedback labels) repeat.  "simple" records are SimpleAITrainer's
+    (a feedback label), "trainer" records AITrainer's: conversations carry
+    the last inputs as context and every fourth record is a feedback entry
+    with a rating and free text.
+    """
+    random.seed(42)
+    openers = ["tell me about", "what do you know about", "can you explain", "how does", "why is"]
+    responses = [f"Here is what I know about topic {i}. " * 3 for i in range(distinct_responses)] + ["Hi there"]
+    feedback = [None, None, None, 'good', 'bad', 'User taught response']
+    comments = ["", "", "", "Too vague", "Great answer!", "Wrong topic"]
+    start = datetime(2025, 7, 28, 4, 11, 50, 371965)
+
+    conversations = []
+    context = []
+    for i in range(count):
+        record = {
+            'timestamp': (start + timedelta(seconds=i * 7.123457)).isoformat(),
+            'user_input': f"{random.choice(openers)} topic number {i}",
+            'bot_response': random.choice(responses)
+        }
+        if shape == "simple":
+            record['feedback'] = random.choice(feedback)
+        elif i % 4 == 3:
+            record['rating'] = random.randint(1, 5)
+            record['feedback'] = random.choice(comments)
+        else:
+            record['context'] = context[-3:]
+            context.append(record['user_input'].lower())
+        conversations.append(record)
+    # Round-trip through JSON so strings are not shared, as after load_conversations()
+    return json.dumps(conversations)
+
+
+def measure(build, payload):
+    tracemalloc.start()
+    result = build(payload)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for shape in ("simple", "trainer"):
+        print(f"🧪 Building {count} {shape} conversations...")
+        payload = make_conversations(count, shape)
+
+        records, dict_bytes = measure(json.loads, payload)
+        compact, compact_bytes = measure(lambda text: CompactConversations(json.loads(text)), payload)
+
+        assert len(compact) == len(records)
+        assert all(dict(compact[i]) == records[i] for i in range(0, count, max(count // 1000, 1)))
+
+        print(f"  List of dicts:  {dict_bytes / 1024 / 1024:8.1f} MB ({dict_bytes / count:.0f} bytes/turn)")
+        print(f"  Compact store:  {compact_bytes / 1024 / 1024:8.1f} MB ({compact_bytes / count:.0f} bytes/turn)")
+        print(f"  Reduction:      {dict_bytes / max(compact_bytes, 1):8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
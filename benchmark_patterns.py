@@ -0,0 +1,64 @@
+"""
+AI-BD Pattern Matching Benchmark
+Compare rule-by-rule re.search with the compiled PatternMatcher
+"""
+
+import random
+import re
+import sys
+import time
+
+from pattern_matcher import PatternMatcher
+
+
+def make_rules(count):
+    """Rules shaped like conversation_patterns: word-bounded alternations"""
+    random.seed(42)
+    words = [f"w{i}" for i in range(count * 4)]
+    rules = []
+    for i in range(count):
+        alternatives = random.sample(words, 4) + [f"phrase {i} here"]
+        rules.append(r'\b(' + '|'.join(alternatives) + r')\b')
+    return rules, words
+
+
+def make_inputs(words, count, hit_rate=0.5):
+    inputs = []
+    for _ in range(count):
+        text = " ".join(random.choice(["please", "tell", "me", "about", "the", "thing"]) for _ in range(8))
+        if random.random() < hit_rate:
+            text += " " + random.choice(words)
+        inputs.append(text)
+    return inputs
+
+
+def linear(rules, text):
+    for pattern in rules:
+        if re.search(pattern, text):
+            return pattern
+    return None
+
+
+def timed(function, inputs):
+    start = time.perf_counter()
+    results = [function(text) for text in inputs]
+    return results, (time.perf_counter() - start) / len(inputs)
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [12, 100, 500]
+    print(f"  {'rules':>6}{'re.search loop':>18}{'PatternMatcher':>18}{'speed-up':>10}")
+    for count in counts:
+        rules, words = make_rules(count)
+        inputs = make_inputs(words, 2000)
+        matcher = PatternMatcher(rules)
+
+        expected, loop_time = timed(lambda text: linear(rules, text), inputs)
+        found, matcher_time = timed(matcher.match, inputs)
+        assert found == expected
+
+        print(f"  {count:>6}{loop_time * 1e6:>16.1f}us{matcher_time * 1e6:>16.1f}us{loop_time / matcher_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+AI-BD Similarity Benchmark
+Compare recall and latency of approximate (LSH) and exact similarity search
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from similarity_index import SimilarityIndex
+from storage import open_storage, ConversationHistory
+
+
+# (tables, bits, probes) to compare; the default is 16 x 12 with 4 probes
+CONFIGS = ((8, 12, 4), (16, 12, 4), (32, 12, 8), (32, 10, 8))
+
+
+def make_conversations(count, vocabulary=5000):
+    """Logged turns whose inputs draw words from a Zipf-like distribution"""
+    random.seed(42)
+    words = [f"word{i}" for i in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    conversations = []
+    for i in range(count):
+        text = " ".join(random.choices(words, weights, k=random.randint(4, 10)))
+        conversations.append({'timestamp': str(i), 'user_input': text, 'bot_response': f"r{i}"})
+    return conversations
+
+
+def make_queries(conversations, count):
+    """Existing inputs with one word dropped, like a rephrased question"""
+    queries = []
+    for record in random.sample(conversations, count):
+        words = record['user_input'].split()
+        words.pop(random.randrange(len(words)))
+        queries.append(" ".join(words))
+    return queries
+
+
+def run(index, queries, top_k, approximate):
+    """Ranked record IDs per query and the mean latency"""
+    start = time.perf_counter()
+    results = [index.search(query, top_k, min_similarity=0.0, approximate=approximate) for query in queries]
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return [[r['conversation']['timestamp'] for r in result] for result in results], elapsed
+
+
+def recall(found, exact, k):
+    hits = sum(len(set(a[:k]) & set(e[:k])) for a, e in zip(found, exact))
+    return hits / max(sum(len(e[:k]) for e in exact), 1)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # find_similar_conversations asks for the 3 best
+    top_k = 3
+    print(f"🧪 Building {count} conversations...")
+    conversations = make_conversations(count)
+    queries = make_queries(conversations, 200)
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        storage = open_storage(work_dir, "json", "direct")
+        storage.load("conversations", [])
+        history = ConversationHistory(storage, "conversations", dedup=False)
+        history.extend(conversations)
+        print(f"  {'mode':<24}{'recall@1':>10}{'recall@' + str(top_k):>10}{'latency':>12}{'build':>10}")
+        exact = None
+        for tables, bits, probes in CONFIGS:
+            # min_records=0: measure LSH at every size
+            index = SimilarityIndex(os.path.join(work_dir, f"index_{tables}_{bits}.jsonl"),
+                                    history, approximate=True, tables=tables, bits=bits, probes=probes,
+                                    min_records=0)
+            start = time.perf_counter()
+            index.load()
+            build = time.perf_counter() - start
+            if exact is None:
+                exact, exact_time = run(index, queries, top_k, approximate=False)
+                print(f"  {'exact':<24}{1.0:>10.3f}{1.0:>10.3f}{exact_time * 1000:>10.2f}ms{build:>9.1f}s")
+            found, elapsed = run(index, queries, top_k, approximate=True)
+            print(f"  {f'lsh {tables}x{bits}, {probes} probes':<24}{recall(found, exact, 1):>10.3f}"
+                  f"{recall(found, exact, top_k):>10.3f}{elapsed * 1000:>10.2f}ms{build:>9.1f}s")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+AI-BD Startup Benchmark
+Time from a cold interpreter to the first answered request, with and without fast start
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds a run may wait for the trainer before it counts as failed
+TRAINER_TIMEOUT = 300
+
+# Runs in a fresh interpreter; prints the timings as JSON, or exits with an
+# error if the trainer fails to load or takes longer than sys.argv[1] seconds
+PROBE = """
+import json, sys, threading, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+client = app.app.test_client()
+client.post('/chat', json={'message': 'hello there'})
+first_chat = time.perf_counter() - start
+# With fast start the trainer loads on its own thread
+for thread in threading.enumerate():
+    if thread.name == 'trainer-warm-up':
+        thread.join(float(sys.argv[1]))
+        if thread.is_alive():
+            sys.exit(f"Trainer not ready after {sys.argv[1]}s")
+if app.TRAINING_ENABLED and app.chatbot.trainer is None:
+    sys.exit("Trainer failed to load")
+trainer_ready = time.perf_counter() - start
+print(json.dumps({'import': imported, 'first chat': first_chat, 'trainer ready': trainer_ready}))
+"""
+
+
+def measure(fast_start, runs):
+    """Median timings over runs, each in a new interpreter and empty data directory"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, AIBD_FAST_START="1" if fast_start else "0")
+    results = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as work_dir:
+            probe = subprocess.run([sys.executable, "-c", PROBE, str(TRAINER_TIMEOUT)], cwd=work_dir, env=env,
+                                   capture_output=True, text=True)
+        if probe.returncode != 0:
+            error = probe.stderr.strip().splitlines()
+            raise RuntimeError(error[-1] if error else f"Probe exited with code {probe.returncode}")
+        results.append(json.loads(probe.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(result[key] for result in results) for key in results[0]}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"🧪 Starting app.py {runs} times per mode...")
+    print(f"  {'mode':<12}{'import':>10}{'first chat':>12}{'trainer ready':>15}")
+    for label, fast_start in (("default", False), ("fast start", True)):
+        timings = measure(fast_start, runs)
+        print(f"  {label:<12}{timings['import']:>9.2f}s{timings['first chat']:>11.2f}s{timings['trainer ready']:>14.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+AI-BD BM25 Index
+Okapi BM25 ranking of past user inputs over a persistent inverted index
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import islice
+from storage import SidecarFile
+
+# Word tokens as in the TF-IDF index; stop words are left in because their
+# idf is near zero and MaxScore pruning skips their long postings anyway
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# "bm25" makes AITrainer rank similar conversations with BM25 by default
+DEFAULT_RANKING = os.environ.get("AIBD_RANKING", "tfidf")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class BM25Index:
+    """Inverted index with document lengths, ranking records by BM25
+
+    Stored like the TF-IDF similarity index: ``path`` caches the term
+    counts of every record (one line each, written through a SidecarFile),
+    records logged since are indexed from the history on load, and results
+    are read back from the history by position.  In memory it keeps
+    postings (term -> record IDs and counts, in record order) and the
+    length of every record.
+
+    Searches only visit records sharing a query term.  Query terms are
+    scored rarest first (MaxScore): once the k-th best partial score beats
+    the most the remaining terms could add, no unseen record can reach the
+    top k, and the remaining (common, long) postings are only probed by
+    bisection for the records already found.  Needs no numpy or sklearn.
+    """
+
+    def __init__(self, path, history, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self.history = history
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.file = SidecarFile(history.storage, path)
+        history.listeners.append(self.add)
+
+    def load(self):
+        """Read the cached term counts and index the records logged since"""
+        with self.lock:
+            if self.loaded:
+                return
+            self.reset()
+            total = len(self.history)
+            if self.read_terms(total):
+                indexed = len(self.lengths)
+                new = islice(self.history.iter_from(indexed), total - indexed)
+                self.file.append(b"".join(self.index_record(record) for record in new))
+                self.file.write()
+            else:
+                self.rebuild()
+            self.loaded = True
+
+    def read_terms(self, total):
+        """Index the term counts in path; False if they do not fit a history of total records"""
+        if not os.path.exists(self.path):
+            return True
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if len(self.lengths) == total:
+                    # The history was cleared or replaced
+                    return False
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted write
+                    return False
+                if 'record' in entry:
+                    # Older files kept a copy of every record; rewrite without
+                    return False
+                self.index_terms(entry['terms'])
+        return True
+
+    def reset(self):
+        self.vocabulary = {}
+        self.postings = []
+        self.lengths = array('I')
+        self.total_length = 0
+
+    def rebuild(self):
+        self.reset()
+        self.file.replace(self.index_record(record) for record in self.history)
+
+    def index_record(self, record):
+        """Index a record and return its line for the term cache"""
+        terms = Counter(tokenize(record.get('user_input')))
+        self.index_terms(terms)
+        return json.dumps({"terms": terms}, ensure_ascii=False).encode('utf-8') + b"\n"
+
+    def index_terms(self, terms):
+        document = len(self.lengths)
+        for term, count in terms.items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.postings)
+                self.postings.append((array('I'), array('I')))
+            documents, counts = self.postings[term_id]
+            documents.append(document)
+            counts.append(count)
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.total_length += length
+
+    def add(self, records):
+        """Index newly stored records (called by the history after extend)"""
+        with self.lock:
+            if not self.loaded:
+                # load() indexes them from the history
+                return
+            self.file.append(b"".join(self.index_record(record) for record in records))
+
+    def idf(self, term_id):
+        """Non-negative BM25 idf (as in Lucene)"""
+        frequency = len(self.postings[term_id][0])
+        return math.log(1 + (len(self.lengths) - frequency + 0.5) / (frequency + 0.5))
+
+    def search(self, text, top_k=3, min_score=0.0):
+        """Top-k indexed records by BM25 score of their input against text
+
+        Results look like the TF-IDF index's, with the BM25 score under
+        'similarity' (unbounded, unlike a cosine).
+        """
+        self.load()
+        with self.lock:
+            query = [self.vocabulary[term] for term in set(tokenize(text)) if term in self.vocabulary]
+            if not query or not top_k:
+                return []
+            k1, b = self.k1, self.b
+            average_length = self.total_length / len(self.lengths)
+            lengths = self.lengths
+
+            # A term adds at most idf * (k1 + 1); rarest (highest bound) first
+            bounds = {term_id: self.idf(term_id) * (k1 + 1) for term_id in query}
+            query.sort(key=bounds.get, reverse=True)
+            remaining = sum(bounds.values())
+            scores = {}
+            closed = False
+
+            for term_id in query:
+                idf = bounds[term_id] / (k1 + 1)
+                remaining -= bounds[term_id]
+                documents, counts = self.postings[term_id]
+                if not closed:
+                    for document, count in zip(documents, counts):
+                        norm = k1 * (1 - b + b * lengths[document] / average_length)
+                        scores[document] = scores.get(document, 0.0) + idf * count * (k1 + 1) / (count + norm)
+                    if len(scores) >= top_k and heapq.nlargest(top_k, scores.values())[-1] > remaining:
+                        closed = True
+                    continue
+                # No unseen record can make the top k any more
+                for document in scores:
+                    position = bisect_left(documents, document)
+                    if position < len(documents) and documents[position] == document:
+                        count = counts[position]
+                        norm = k1 * (1 - b + b * lengths[document] / average_length)
+                        scores[document] += idf * count * (k1 + 1) / (count + norm)
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            hits = [(document, score) for document, score in best if score > min_score]
+
+        records = self.history.records_at([document for document, _ in hits])
+        return [{'conversation': record, 'similarity': score} for record, (_, score) in zip(records, hits)]
@@ -0,0 +1,242 @@
+"""
+AI-BD Compact Conversation Store
+Array-backed in-memory representation of conversation records
+"""
+
+from array import array
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+# Columns stored in arrays; every other key goes to the per-record extras
+COLUMNS = ('timestamp', 'user_input', 'bot_response', 'feedback', 'context', 'rating')
+
+# Rating column value of records without an integer rating in range
+NO_RATING = -128
+
+
+class StringTable:
+    """Interned strings referenced by integer IDs"""
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self.ids[text] = string_id
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def timestamp_to_float(timestamp):
+    """Seconds since the epoch for a naive ISO timestamp, None if it is not one"""
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        return None
+    seconds = (parsed - EPOCH).total_seconds()
+    # Only keep timestamps that convert back to the exact same string
+    if float_to_timestamp(seconds) != timestamp:
+        return None
+    return seconds
+
+
+def float_to_timestamp(seconds):
+    return (EPOCH + timedelta(seconds=seconds)).isoformat()
+
+
+class ConversationRecord(Mapping):
+    """Read-only dict-like view of one record in a CompactConversations store"""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.store.value(self.index, key)
+
+    def __iter__(self):
+        return iter(self.store.shapes[self.store.shape_ids[self.index]])
+
+    def __len__(self):
+        return len(self.store.shapes[self.store.shape_ids[self.index]])
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CompactConversations:
+    """List-like store of conversation records backed by typed arrays
+
+    Timestamps are kept as float64 seconds; user inputs, bot responses,
+    feedback text and context entries as IDs into a shared string table
+    (repeated texts are stored once); context lists as a run of such IDs
+    with an offset per record; ratings as a signed byte and the key order
+    of each record as a one-byte shape ID.  Anything else, or a value of
+    an unexpected type, is kept in a sparse per-record dict.  Records are
+    handed out as ConversationRecord views.
+    """
+
+    def __init__(self, records=()):
+        self.strings = StringTable()
+        self.shapes = []
+        self.shape_index = {}
+        self.timestamps = array('d')
+        self.inputs = array('I')
+        self.responses = array('I')
+        # String ID + 1, or 0 for None
+        self.feedback = array('I')
+        self.ratings = array('b')
+        # Context entries of record i are context_ids[context_offsets[i]:context_offsets[i + 1]]
+        self.context_ids = array('I')
+        self.context_offsets = array('I', [0])
+        self.shape_ids = array('B')
+        self.extras = {}
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield ConversationRecord(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ConversationRecord(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("record index out of range")
+        return ConversationRecord(self, index)
+
+    def shape_id(self, keys):
+        shape = tuple(keys)
+        if shape not in self.shape_index:
+            if len(self.shapes) >= 256:
+                raise ValueError("Too many distinct record layouts for a compact store")
+            self.shape_index[shape] = len(self.shapes)
+            self.shapes.append(shape)
+        return self.shape_index[shape]
+
+    def append(self, record):
+        index = len(self)
+        extras = {}
+        for key, value in record.items():
+            if key not in COLUMNS:
+                extras[key] = value
+
+        seconds = None
+        if 'timestamp' in record:
+            seconds = timestamp_to_float(record['timestamp'])
+            if seconds is None:
+                extras['timestamp'] = record['timestamp']
+        self.timestamps.append(float('nan') if seconds is None else seconds)
+
+        for key, column in (('user_input', self.inputs), ('bot_response', self.responses)):
+            value = record.get(key)
+            if isinstance(value, str):
+                column.append(self.strings.intern(value))
+            else:
+                column.append(0)
+                if key in record:
+                    extras[key] = value
+
+        label = record.get('feedback')
+        if label is None or isinstance(label, str):
+            self.feedback.append(0 if label is None else self.strings.intern(label) + 1)
+        else:
+            self.feedback.append(0)
+            extras['feedback'] = label
+
+        rating = record.get('rating')
+        if type(rating) is int and NO_RATING < rating < 128:
+            self.ratings.append(rating)
+        else:
+            self.ratings.append(NO_RATING)
+            if 'rating' in record:
+                extras['rating'] = rating
+
+        context = record.get('context')
+        if isinstance(context, list) and all(isinstance(entry, str) for entry in context):
+            self.context_ids.extend(self.strings.intern(entry) for entry in context)
+        elif 'context' in record:
+            extras['context'] = context
+        self.context_offsets.append(len(self.context_ids))
+
+        self.shape_ids.append(self.shape_id(record.keys()))
+        if extras:
+            self.extras[index] = extras
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def value(self, index, key):
+        if key not in self.shapes[self.shape_ids[index]]:
+            raise KeyError(key)
+        extras = self.extras.get(index)
+        if extras and key in extras:
+            return extras[key]
+        if key == 'timestamp':
+            return float_to_timestamp(self.timestamps[index])
+        if key == 'user_input':
+            return self.strings[self.inputs[index]]
+        if key == 'bot_response':
+            return self.strings[self.responses[index]]
+        if key == 'feedback':
+            label_id = self.feedback[index]
+            return None if label_id == 0 else self.strings[label_id - 1]
+        if key == 'rating':
+            return self.ratings[index]
+        if key == 'context':
+            # A new list each time, as the stored record is read-only
+            ids = self.context_ids[self.context_offsets[index]:self.context_offsets[index + 1]]
+            return [self.strings[string_id] for string_id in ids]
+        raise KeyError(key)
+
+    def __delitem__(self, index):
+        """Delete a record or a slice of records (e.g. a rotated-out prefix)"""
+        if not isinstance(index, slice):
+            index = slice(index, index + 1 if index != -1 else None)
+        removed = set(range(*index.indices(len(self))))
+        kept = [i for i in range(len(self)) if i not in removed]
+        offsets = self.context_offsets
+        context_ids = array('I')
+        context_offsets = array('I', [0])
+        for i in kept:
+            context_ids.extend(self.context_ids[offsets[i]:offsets[i + 1]])
+            context_offsets.append(len(context_ids))
+        self.context_ids = context_ids
+        self.context_offsets = context_offsets
+        for column in (self.timestamps, self.inputs, self.responses, self.feedback, self.ratings, self.shape_ids):
+            del column[index]
+        new_index = {old: new for new, old in enumerate(kept)}
+        self.extras = {new_index[i]: extras for i, extras in self.extras.items() if i in new_index}
+
+    def to_list(self):
+        """Plain list of dicts, e.g. for JSON serialization"""
+        return [dict(record) for record in self]
+
+
+def plain(value):
+    """json ``default`` hook turning compact stores and views into plain JSON values"""
+    if isinstance(value, CompactConversations):
+        return value.to_list()
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,173 @@
+"""
+AI-BD Training Data Export
+Streaming export and import of training data, one record at a time
+"""
+
+import gzip
+import json
+from compact_store import plain
+
+# Records handed to the trainer per extend()/update() call while importing
+IMPORT_BATCH_SIZE = 1000
+
+# Progress is reported every this many records (and at the end of a section)
+PROGRESS_EVERY = 10000
+
+
+def open_export(filename, mode):
+    """Open an export file as text, gzip-compressed when it ends in .gz"""
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't', encoding='utf-8', compresslevel=6)
+    return open(filename, mode, encoding='utf-8')
+
+
+def is_jsonl(filename):
+    """JSON Lines exports end in .jsonl or .jsonl.gz, anything else is one JSON document"""
+    if filename.endswith('.gz'):
+        filename = filename[:-3]
+    return filename.endswith('.jsonl')
+
+
+def print_progress(section, count):
+    print(f"📦 {section}: {count} records")
+
+
+def dumps(value, indent=None):
+    return json.dumps(value, indent=indent, ensure_ascii=False, default=plain)
+
+
+def export_stream(filename, meta, lists, mappings, progress=None):
+    """Write training data to filename without building it in memory first
+
+    lists maps a section name to an iterable of records and mappings maps a
+    section name to a dict.  .jsonl files get one JSON object per line (a
+    meta line, then {"section", "record"} or {"section", "key", "value"}
+    lines); other files get the usual single JSON document, written
+    incrementally.  Returns the number of records written per section.
+    """
+    counts = {}
+    with open_export(filename, 'w') as f:
+        if is_jsonl(filename):
+            f.write(dumps(dict(meta, type="meta")) + "\n")
+            for section, records in lists.items():
+                counts[section] = 0
+                for record in records:
+                    f.write(dumps({"section": section, "record": record}) + "\n")
+                    counts[section] += 1
+                    if progress and counts[section] % PROGRESS_EVERY == 0:
+                        progress(section, counts[section])
+                if progress:
+                    progress(section, counts[section])
+            for section, mapping in mappings.items():
+                counts[section] = 0
+                for key, value in mapping.items():
+                    f.write(dumps({"section": section, "key": key, "value": value}) + "\n")
+                    counts[section] += 1
+                if progress:
+                    progress(section, counts[section])
+            return counts
+
+        f.write("{")
+        separator = "\n"
+        for section, records in lists.items():
+            f.write(f'{separator}  {dumps(section)}: [')
+            counts[section] = 0
+            for record in records:
+                prefix = "\n    " if counts[section] == 0 else ",\n    "
+                f.write(prefix + dumps(record, indent=2).replace("\n", "\n    "))
+                counts[section] += 1
+                if progress and counts[section] % PROGRESS_EVERY == 0:
+                    progress(section, counts[section])
+            f.write("\n  ]" if counts[section] else "]")
+            separator = ",\n"
+            if progress:
+                progress(section, counts[section])
+        for section, mapping in mappings.items():
+            f.write(f'{separator}  {dumps(section)}: ')
+            f.write(dumps(mapping, indent=2).replace("\n", "\n  "))
+            counts[section] = len(mapping)
+            separator = ",\n"
+            if progress:
+                progress(section, counts[section])
+        for key, value in meta.items():
+            f.write(f'{separator}  {dumps(key)}: ' + dumps(value, indent=2).replace("\n", "\n  "))
+            separator = ",\n"
+        f.write("\n}\n")
+    return counts
+
+
+def read_export(filename):
+    """Yield (section, item) pairs from an export file
+
+    item is a record for list sections and a (key, value) pair for dict
+    sections; the meta line/keys are yielded as ("meta", dict).  Only
+    JSON Lines files are read one line at a time, plain .json exports
+    from older versions are loaded whole.
+    """
+    with open_export(filename, 'r') as f:
+        if is_jsonl(filename):
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("type") == "meta":
+                    entry.pop("type")
+                    yield "meta", entry
+                elif "record" in entry:
+                    yield entry["section"], entry["record"]
+                else:
+                    yield entry["section"], (entry["key"], entry["value"])
+            return
+        data = json.load(f)
+
+    meta = {}
+    for section, value in data.items():
+        if isinstance(value, list):
+            for record in value:
+                yield section, record
+        elif isinstance(value, dict):
+            for item in value.items():
+                yield section, item
+        else:
+            meta[section] = value
+    yield "meta", meta
+
+
+def import_stream(filename, lists, mappings, progress=None):
+    """Feed an export file into the trainer in bounded batches
+
+    lists maps a section name to a callable taking a list of records (e.g.
+    ConversationHistory.extend) and mappings maps a section name to a
+    callable taking a dict of entries (e.g. a storage update).  Sections
+    without a handler are skipped.  Returns the number of records imported
+    per section.
+    """
+    counts = {}
+    batches = {}
+
+    def flush(section):
+        batch = batches.pop(section, None)
+        if not batch:
+            return
+        if section in lists:
+            lists[section](batch)
+        else:
+            mappings[section](dict(batch))
+
+    for section, item in read_export(filename):
+        if section not in lists and section not in mappings:
+            continue
+        batch = batches.setdefault(section, [])
+        batch.append(item)
+        counts[section] = counts.get(section, 0) + 1
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush(section)
+        if progress and counts[section] % PROGRESS_EVERY == 0:
+            progress(section, counts[section])
+
+    for section in list(batches):
+        flush(section)
+    if progress:
+        for section, count in counts.items():
+            progress(section, count)
+    return counts
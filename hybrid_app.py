@@ -1,57 +1,84 @@
-import sys
 import os
-from flask import Flask, render_template, request, jsonify
 import json
-import re
+from flask import Flask, render_template, request, jsonify
 from datetime import datetime
 from collections import Counter
 import pickle
 import requests
+from data_export import export_stream, import_stream
+from response_table import ResponseTable, best_response
+from spelling import SpellingIndex, DEFAULT_SPELLING
+from text_processing import extract_simple_keywords
+try:
+    from semantic_index import SemanticIndex
+except ImportError:
+    SemanticIndex = None
+from bm25_index import BM25Index
+from storage import open_storage, ConversationHistory, ExactResponseIndex, SERVER_WRITE_MODE
+
+# Feedback labels that mark a response as worth repeating
+POSITIVE_FEEDBACK = ('good', 'User taught response')
+
+# Minimum LSA cosine for reusing the response to a paraphrased question
+SEMANTIC_THRESHOLD = 0.8
 
 class SimpleAITrainer:
     """Lightweight AI trainer that works without sklearn/pandas"""
     
-    def __init__(self):
-        self.conversations_file = "training_data/conversations.json"
-        self.patterns_file = "training_data/learned_patterns.json"
+    def __init__(self, storage_mode=None, write_mode=None, spelling=None, **storage_options):
         self.model_file = "training_data/simple_model.pkl"
         
         # Ensure directories exist
         os.makedirs("training_data", exist_ok=True)
+        self.storage = open_storage("training_data", storage_mode, write_mode, **storage_options)
         
-        # Load existing data
-        self.conversations = self.load_conversations()
+        # Load existing data; only recent conversations are kept in memory
+        self.history = self.load_conversations()
+        self.conversations = self.history.recent
         self.patterns = self.load_patterns()
+        # Keyword -> ResponseTable; AITrainer entries sharing the file are not lists
+        self.response_tables = {keyword: ResponseTable(entries) for keyword, entries in self.patterns.items()
+                                if isinstance(entries, list)}
+        # Learned keywords, to match misspelled keywords to their tables
+        # (opt-in: AIBD_SPELLING=1 or spelling=True)
+        if spelling is None:
+            spelling = DEFAULT_SPELLING
+        self.spelling = SpellingIndex(self.response_tables) if spelling else None
+        # BM25 index of past inputs, loaded on the first similarity search
+        self.bm25_index = BM25Index("training_data/bm25_index.jsonl", self.history)
+        # LSA vectors of positively rated inputs (needs numpy; built on training).
+        # Not AITrainer's semantic_index, which covers every conversation
+        self.semantic_index = SemanticIndex("training_data/positive_semantic_index", self.history) if SemanticIndex else None
+        
+        # Normalized input -> most recent positively rated response, kept
+        # up to date with every logged or imported conversation
+        self.exact_responses = ExactResponseIndex(self.history, "training_data/exact_responses.jsonl",
+                                                  POSITIVE_FEEDBACK)
         
     def load_conversations(self):
         """Load conversation history"""
-        if os.path.exists(self.conversations_file):
-            try:
-                with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+        # A ValueError (JSON superseded by another storage mode) is not
+        # recoverable here: starting empty would overwrite the old file
+        try:
+            self.storage.load("conversations", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.storage.load_default("conversations", [])
+        return ConversationHistory(self.storage, "conversations")
     
     def load_patterns(self):
         """Load learned patterns"""
-        if os.path.exists(self.patterns_file):
-            try:
-                with open(self.patterns_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        try:
+            return self.storage.load("learned_patterns", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            return self.storage.load_default("learned_patterns", {})
     
     def save_conversations(self):
         """Save conversations to file"""
-        with open(self.conversations_file, 'w', encoding='utf-8') as f:
-            json.dump(self.conversations, f, indent=2, ensure_ascii=False)
+        self.storage.flush("conversations")
     
     def save_patterns(self):
         """Save patterns to file"""
-        with open(self.patterns_file, 'w', encoding='utf-8') as f:
-            json.dump(self.patterns, f, indent=2, ensure_ascii=False)
+        self.storage.flush("learned_patterns")
     
     def log_conversation(self, user_input, bot_response, feedback=None):
         """Log a conversation"""
@@ -62,11 +89,10 @@ class SimpleAITrainer:
             'feedback': feedback
         }
         
-        self.conversations.append(conversation)
-        self.save_conversations()
+        self.history.append(conversation)
         
         # Auto-learn from positive feedback
-        if feedback in ('good', 'User taught response'):
+        if feedback in POSITIVE_FEEDBACK:
             self.learn_from_positive_feedback(user_input, bot_response)
     
     def learn_from_positive_feedback(self, user_input, bot_response):
@@ -74,61 +100,67 @@ class SimpleAITrainer:
         # Extract keywords from user input
         keywords = self.extract_keywords(user_input.lower())
         
-        # Store the successful response pattern
+        # Store the successful response pattern, one more vote per keyword,
+        # with a single write for the whole turn
+        changed = {}
         for keyword in keywords:
-            if keyword not in self.patterns:
-                self.patterns[keyword] = []
-            
-            # Store response if not already there
-            if bot_response not in self.patterns[keyword]:
-                self.patterns[keyword].append(bot_response)
-        
-        self.save_patterns()
+            table = self.response_table(keyword)
+            table.add(bot_response)
+            changed[keyword] = table.to_list()
+        if changed:
+            self.storage.update("learned_patterns", changed)
+    
+    def response_table(self, keyword):
+        """Response table of a keyword, created on first use"""
+        table = self.response_tables.get(keyword)
+        if table is None:
+            table = self.response_tables[keyword] = ResponseTable()
+            if self.spelling is not None:
+                self.spelling.add(keyword)
+        return table
     
     def extract_keywords(self, text):
-        """Extract meaningful keywords from text"""
-        # Remove common words
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those'}
-        
-        # Extract words (simple tokenization)
-        words = re.findall(r'\b\w+\b', text.lower())
-        
-        # Filter out stop words and short words
-        keywords = [word for word in words if word not in stop_words and len(word) > 2]
-        
-        return keywords[:5]  # Return top 5 keywords
+        """Extract meaningful keywords from text (cached per input)"""
+        return extract_simple_keywords(text)
     
     def get_learned_response(self, user_input):
         """Get a response based on learned patterns or exact match"""
         # First, check for exact match in conversations with positive feedback
-        for conv in reversed(self.conversations):
-            if conv.get('feedback') in ('good', 'User taught response') and conv['user_input'].strip().lower() == user_input.strip().lower():
-                return conv['bot_response']
+        response = self.exact_responses.get(user_input)
+        if response is not None:
+            return response
         
         # Fallback to keyword-based matching
         keywords = self.extract_keywords(user_input.lower())
-        possible_responses = []
-        for keyword in keywords:
-            if keyword in self.patterns:
-                possible_responses.extend(self.patterns[keyword])
-        
-        # Return most common response if any found
-        if possible_responses:
-            response_counts = Counter(possible_responses)
-            return response_counts.most_common(1)[0][0]
-        
-        return None
+        # Return the response with the most votes over the keywords, if any
+        # With spelling, unknown keywords are looked up as the closest learned keyword
+        if self.spelling is not None:
+            keywords = [self.spelling.correct(keyword) for keyword in keywords]
+        tables = [self.response_tables[keyword] for keyword in keywords if keyword in self.response_tables]
+        return best_response(tables)
+    
+    def get_semantic_response(self, user_input):
+        """Response to the closest paraphrase among positively rated inputs, if close enough"""
+        if self.semantic_index is None:
+            return None
+        found = self.semantic_index.search(user_input, top_k=1, min_similarity=SEMANTIC_THRESHOLD)
+        return found[0]['conversation']['bot_response'] if found else None
+    
+    def find_similar_conversations(self, user_input, top_k=3):
+        """Find similar past conversations, ranked by BM25"""
+        return self.bm25_index.search(user_input, top_k)
     
     def get_training_stats(self):
         """Get training statistics"""
-        total_conversations = len(self.conversations)
+        total_conversations = len(self.history)
+        feedback_counts = self.history.feedback_counts()
         
         # Count feedback - include both 'good' and 'User taught response'
-        positive_feedback = sum(1 for conv in self.conversations if conv.get('feedback') in ('good', 'User taught response'))
-        negative_feedback = sum(1 for conv in self.conversations if conv.get('feedback') == 'bad')
+        positive_feedback = feedback_counts['good'] + feedback_counts['User taught response']
+        negative_feedback = feedback_counts['bad']
         
         # Count learned patterns
-        total_patterns = sum(len(responses) for responses in self.patterns.values())
+        total_patterns = sum(len(table) for table in self.response_tables.values())
         
         return {
             'total_conversations': total_conversations,
@@ -147,71 +179,74 @@ class SimpleAITrainer:
         word_freq = Counter()
         response_patterns = {}
         
-        for conv in self.conversations:
-            if conv.get('feedback') in ('good', 'User taught response'):
-                words = self.extract_keywords(conv['user_input'])
-                word_freq.update(words)
-                
-                # Associate words with successful responses
-                for word in words:
-                    if word not in response_patterns:
-                        response_patterns[word] = []
-                    response_patterns[word].append(conv['bot_response'])
+        for conv in self.history.iter(feedback=POSITIVE_FEEDBACK):
+            words = self.extract_keywords(conv['user_input'])
+            word_freq.update(words)
+            
+            # Associate words with successful responses
+            for word in words:
+                if word not in response_patterns:
+                    response_patterns[word] = []
+                response_patterns[word].append(conv['bot_response'])
         
         # Save the simple model
         model_data = {
             'word_frequencies': dict(word_freq),
             'response_patterns': response_patterns,
             'training_date': datetime.now().isoformat(),
-            'total_conversations': len(self.conversations)
+            'total_conversations': len(self.history)
         }
         
         with open(self.model_file, 'wb') as f:
             pickle.dump(model_data, f)
         
-        print(f"Simple model trained with {len(self.conversations)} conversations")
+        if self.semantic_index is not None:
+            try:
+                if self.semantic_index.build(feedback=POSITIVE_FEEDBACK):
+                    print("Semantic index rebuilt")
+            except ImportError as e:
+                print(f"Semantic index not built (needs scikit-learn): {e}")
+        
+        print(f"Simple model trained with {model_data['total_conversations']} conversations")
         print(f"Learned {len(response_patterns)} word-response patterns")
         
         return True
     
-    def export_training_data(self, filename="exported_training_data.json"):
-        """Export all training data"""
-        export_data = {
-            'conversations': self.conversations,
-            'patterns': self.patterns,
+    def export_training_data(self, filename="exported_training_data.json", progress=None):
+        """Export all training data (streamed; .jsonl/.jsonl.gz for JSON Lines)"""
+        meta = {
             'stats': self.get_training_stats(),
             'export_date': datetime.now().isoformat()
         }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, indent=2, ensure_ascii=False)
+        export_stream(filename, meta, {'conversations': self.history}, {'patterns': self.patterns}, progress)
         
         return filename
     
-    def import_training_data(self, filename):
+    def import_training_data(self, filename, progress=None):
         """Import training data from file"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                import_data = json.load(f)
-            
-            if 'conversations' in import_data:
-                self.conversations.extend(import_data['conversations'])
-                self.save_conversations()
-            
-            if 'patterns' in import_data:
-                # Merge patterns
-                for keyword, responses in import_data['patterns'].items():
-                    if keyword not in self.patterns:
-                        self.patterns[keyword] = []
-                    self.patterns[keyword].extend(responses)
-                    # Remove duplicates
-                    self.patterns[keyword] = list(set(self.patterns[keyword]))
-                self.save_patterns()
-            
+            import_stream(filename, {'conversations': self.history.extend},
+                          {'patterns': self.merge_patterns}, progress)
             return True
         except Exception as e:
             print(f"Import failed: {e}")
             return False
+    
+    def merge_patterns(self, patterns):
+        """Merge imported keyword patterns into the learned ones"""
+        merged = {}
+        for keyword, entries in patterns.items():
+            if not isinstance(entries, list):
+                continue
+            table = self.response_table(keyword)
+            # Keep the larger weight so importing the same data twice changes nothing
+            changed = False
+            for response, weight in ResponseTable(entries).weights.items():
+                changed = table.raise_to(response, weight) or changed
+            if changed:
+                merged[keyword] = table.to_list()
+        if merged:
+            self.storage.update("learned_patterns", merged)
 
 # Always try to initialize trainer
 try:
@@ -227,7 +262,7 @@ class CustomAIChatbot:
     def __init__(self):
         # Only use training data for responses
         if TRAINING_AVAILABLE:
-            self.trainer = SimpleAITrainer()
+            self.trainer = SimpleAITrainer(write_mode=SERVER_WRITE_MODE)
         else:
             self.trainer = None
     
@@ -237,6 +272,10 @@ class CustomAIChatbot:
             learned_response = self.trainer.get_learned_response(user_input)
             if learned_response:
                 return learned_response
+            # A paraphrase of a question answered well before
+            semantic_response = self.trainer.get_semantic_response(user_input)
+            if semantic_response:
+                return semantic_response
         # Wikipedia fallback
         wiki_summary = get_wikipedia_summary(user_input)
         # Self-learn: log Wikipedia answer as 'User taught response'
@@ -15,14 +15,12 @@ pip install --upgrade pip
 pip install Flask==2.3.3
 pip install Werkzeug==2.3.7
 pip install scikit-learn==1.3.0
-pip install nltk==3.8.1
 pip install numpy==1.24.3
-pip install pandas==1.5.3
 pip install joblib==1.3.2
 
 echo.
 echo Testing installation...
-python -c "import sklearn, nltk, numpy, pandas; print('All packages installed successfully!')"
+python -c "import sklearn, numpy; print('All packages installed successfully!')"
 
 if %errorlevel% equ 0 (
     echo.
@@ -13,28 +13,18 @@ echo This may take a few minutes...
 
 REM Install packages one by one with specific Windows-friendly versions
 echo.
-echo [1/4] Installing NumPy...
+echo [1/2] Installing NumPy...
 "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install numpy==1.24.3 --only-binary=all
 
-echo.
-echo [2/4] Installing Pandas...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install pandas==2.0.3 --only-binary=all
 
 echo.
-echo [3/4] Installing Scikit-learn...
+echo [2/2] Installing Scikit-learn...
 "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install scikit-learn==1.3.0 --only-binary=all
 
-echo.
-echo [4/4] Installing NLTK...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install nltk==3.8.1 --only-binary=all
-
-echo.
-echo Downloading NLTK data...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import nltk; nltk.download('punkt', quiet=True); nltk.download('stopwords', quiet=True); print('NLTK data downloaded!')"
 
 echo.
 echo Testing installation...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, nltk, numpy, pandas; print('✓ All packages installed successfully!')"
+"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, numpy; print('✓ All packages installed successfully!')"
 if %errorlevel% equ 0 (
     echo.
     echo ✓ Training features installed successfully!
@@ -47,11 +37,11 @@ if %errorlevel% equ 0 (
     
     REM Try installing from a different index
     echo Installing from alternative package index...
-    "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install --trusted-host pypi.org --trusted-host pypi.python.org --trusted-host files.pythonhosted.org numpy pandas scikit-learn nltk
+    "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install --trusted-host pypi.org --trusted-host pypi.python.org --trusted-host files.pythonhosted.org numpy scikit-learn
     
     echo.
     echo Re-testing installation...
-    "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, nltk, numpy, pandas; print('✓ All packages installed successfully!')"
+    "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, numpy; print('✓ All packages installed successfully!')"
     if %errorlevel% equ 0 (
         echo ✓ Training features installed successfully with alternative method!
     ) else (
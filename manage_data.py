@@ -6,13 +6,21 @@ Manage your AI training data easily
 import os
 import json
 import shutil
+import hashlib
 from datetime import datetime
 
+# Files that are never modified after they are written (closed, compressed
+# history segments and their block offsets), so a restore can hardlink them
+# instead of copying
+IMMUTABLE_SUFFIXES = ('.gz', '.xz', '.idx')
+
 class DataManager:
     def __init__(self):
         self.project_dir = r"c:\Users\Admin\Desktop\React projects\aiBD"
         self.data_dir = os.path.join(self.project_dir, "training_data")
         self.backup_dir = os.path.join(self.project_dir, "data_backups")
+        # Content-addressed file store shared by incremental backups
+        self.objects_dir = os.path.join(self.backup_dir, ".objects")
         
         # Ensure backup directory exists
         os.makedirs(self.backup_dir, exist_ok=True)
@@ -56,8 +64,13 @@ class DataManager:
             bytes /= 1024.0
         return f"{bytes:.1f} TB"
     
-    def backup_data(self):
-        """Create a backup of training data"""
+    def backup_data(self, incremental=True):
+        """Create a backup of training data
+
+        Incremental backups store every file once under .objects by its
+        SHA-256 and hardlink it into the backup folder, so files that did not
+        change since the last backup cost neither time nor disk space.
+        """
         if not os.path.exists(self.data_dir):
             print("❌ No training data to backup")
             return False
@@ -67,13 +80,94 @@ class DataManager:
         backup_path = os.path.join(self.backup_dir, backup_name)
         
         try:
-            shutil.copytree(self.data_dir, backup_path)
-            print(f"✅ Backup created: {backup_path}")
+            if incremental:
+                stored, reused = self.snapshot(self.data_dir, backup_path)
+                print(f"✅ Backup created: {backup_path} ({stored} new files, {reused} unchanged)")
+            else:
+                shutil.copytree(self.data_dir, backup_path)
+                print(f"✅ Backup created: {backup_path}")
             return True
         except Exception as e:
             print(f"❌ Backup failed: {e}")
             return False
     
+    def snapshot(self, source_dir, backup_path):
+        """Hardlink the files of source_dir into backup_path via the object store"""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        cache_file = os.path.join(self.objects_dir, "cache.json")
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        
+        temp_path = backup_path + ".tmp"
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path)
+        stored = reused = 0
+        for root, dirs, files in os.walk(source_dir):
+            relative_root = os.path.relpath(root, source_dir)
+            os.makedirs(os.path.join(temp_path, relative_root), exist_ok=True)
+            for name in files:
+                source = os.path.join(root, name)
+                relative = os.path.normpath(os.path.join(relative_root, name))
+                stat = os.stat(source)
+                
+                # Unchanged size and mtime: reuse the hash from the last backup
+                cached = cache.get(relative)
+                digest = None
+                if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+                    digest = cached[2]
+                    if not os.path.exists(self.object_path(digest)):
+                        digest = None
+                if digest is None:
+                    digest, created = self.store_object(source)
+                    stored += created
+                    reused += not created
+                else:
+                    reused += 1
+                cache[relative] = [stat.st_size, stat.st_mtime_ns, digest]
+                
+                target = os.path.join(temp_path, relative)
+                try:
+                    os.link(self.object_path(digest), target)
+                except OSError:
+                    # Filesystem without hardlinks (or the link limit reached)
+                    shutil.copy2(self.object_path(digest), target)
+        os.replace(temp_path, backup_path)
+        
+        with open(cache_file + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(cache_file + ".tmp", cache_file)
+        return stored, reused
+    
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+    
+    def store_object(self, source):
+        """Copy a file into the object store, hashing it on the way
+
+        Objects are copies, never links to the live data, so later in-place
+        writes to training data cannot change a backup.  Returns the digest
+        and whether a new object was stored.
+        """
+        digest = hashlib.sha256()
+        temp_file = os.path.join(self.objects_dir, f"incoming_{os.getpid()}.tmp")
+        with open(source, 'rb') as src, open(temp_file, 'wb') as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                digest.update(chunk)
+                dst.write(chunk)
+        shutil.copystat(source, temp_file)
+        
+        digest = digest.hexdigest()
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            os.remove(temp_file)
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_file, path)
+        return digest, True
+    
     def restore_data(self, backup_name=None):
         """Restore data from backup"""
         if not os.path.exists(self.backup_dir):
@@ -81,7 +175,8 @@ class DataManager:
             return False
         
         backups = [d for d in os.listdir(self.backup_dir) 
-                  if os.path.isdir(os.path.join(self.backup_dir, d))]
+                  if os.path.isdir(os.path.join(self.backup_dir, d))
+                  and not d.startswith('.') and not d.endswith('.tmp')]
         
         if not backups:
             print("❌ No backup directories found")
@@ -105,23 +200,50 @@ class DataManager:
         
         backup_path = os.path.join(self.backup_dir, backup_name)
         
-        # Backup current data first
+        # Backup current data first (incremental, so mostly hardlinks)
         if os.path.exists(self.data_dir):
             current_backup = f"before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             current_backup_path = os.path.join(self.backup_dir, current_backup)
-            shutil.copytree(self.data_dir, current_backup_path)
+            self.snapshot(self.data_dir, current_backup_path)
             print(f"💾 Current data backed up to: {current_backup}")
         
+        staging_dir = self.data_dir + ".restore"
+        old_dir = self.data_dir + ".old"
         try:
+            # Build the restored copy next to the data folder, then swap it in
+            for path in (staging_dir, old_dir):
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+            shutil.copytree(backup_path, staging_dir, copy_function=self.restore_file)
+            
             if os.path.exists(self.data_dir):
-                shutil.rmtree(self.data_dir)
-            shutil.copytree(backup_path, self.data_dir)
+                os.replace(self.data_dir, old_dir)
+            try:
+                os.replace(staging_dir, self.data_dir)
+            except OSError:
+                if os.path.exists(old_dir):
+                    os.replace(old_dir, self.data_dir)
+                raise
+            if os.path.exists(old_dir):
+                shutil.rmtree(old_dir)
             print(f"✅ Data restored from: {backup_name}")
             return True
         except Exception as e:
+            if os.path.exists(staging_dir):
+                shutil.rmtree(staging_dir, ignore_errors=True)
             print(f"❌ Restore failed: {e}")
             return False
     
+    def restore_file(self, source, target):
+        """Copy a backed-up file, hardlinking the ones that are never modified"""
+        if source.endswith(IMMUTABLE_SUFFIXES):
+            try:
+                os.link(source, target)
+                return target
+            except OSError:
+                pass
+        return shutil.copy2(source, target)
+    
     def show_data_stats(self):
         """Show training data statistics"""
         try:
@@ -198,8 +320,8 @@ class DataManager:
             
             print("✅ Sample training data created!")
             print("📄 Files created:")
-            print(f"   • conversations.json ({len(trainer.conversations)} conversations)")
-            print(f"   • feedback.json ({len(trainer.feedback_data)} feedback entries)")
+            print(f"   • conversations.json ({len(trainer.history)} conversations)")
+            print(f"   • feedback.json ({len(trainer.feedback_history)} feedback entries)")
             print(f"   • learned_patterns.json ({len(trainer.learned_patterns)} patterns)")
             print()
             print("💡 You can now:")
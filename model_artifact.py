@@ -0,0 +1,211 @@
+"""
+AI-BD Model Artifact
+Versioned on-disk format for the trained TF-IDF + Naive Bayes model
+"""
+
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+import numpy as np
+
+# Bump when the files or their meaning change; older artifacts are rejected
+SCHEMA_VERSION = 1
+
+ARRAYS = ('terms', 'idf', 'feature_log_prob', 'class_log_prior')
+
+# Names the live version directory under a model path
+CURRENT_FILE = "CURRENT"
+
+
+def save_model(path, vectorizer, classifier, conversations=None):
+    """Write a fitted TfidfVectorizer + MultinomialNB as a new version of the model at path
+
+    It is written next to path and installed with ``install_version``, so
+    readers never see a half-written model.  Returns the version directory.
+    """
+    temp_dir = path + ".tmp"
+    write_model(temp_dir, vectorizer, classifier, conversations)
+    return install_version(temp_dir, path)
+
+
+def write_model(directory, vectorizer, classifier, conversations=None):
+    """Write a fitted TfidfVectorizer + MultinomialNB as a model directory
+
+    The directory holds meta.json (schema version, classes, tokenizer
+    settings, and how many conversations it was trained on if given) and
+    one .npy file per array, so it loads without sklearn and
+    can be memory-mapped.
+    """
+    if vectorizer.analyzer != 'word' or tuple(vectorizer.ngram_range) != (1, 1):
+        raise ValueError("Only word unigram vectorizers can be saved as a model artifact")
+    if vectorizer.tokenizer is not None or vectorizer.preprocessor is not None or vectorizer.strip_accents:
+        raise ValueError("Custom tokenizers and preprocessors cannot be saved as a model artifact")
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, index in vectorizer.vocabulary_.items():
+        terms[index] = term
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(terms))
+
+    meta = {
+        'schema_version': SCHEMA_VERSION,
+        'created': datetime.now().isoformat(),
+        'classes': [str(label) for label in classifier.classes_],
+        'n_features': len(terms),
+        'lowercase': vectorizer.lowercase,
+        'token_pattern': vectorizer.token_pattern,
+        'binary': vectorizer.binary,
+        'sublinear_tf': vectorizer.sublinear_tf,
+        'norm': vectorizer.norm,
+        'conversations': conversations
+    }
+    arrays = {
+        'terms': np.array(terms, dtype=str),
+        'idf': np.asarray(idf, dtype=np.float64),
+        'feature_log_prob': np.asarray(classifier.feature_log_prob_, dtype=np.float64),
+        'class_log_prior': np.asarray(classifier.class_log_prior_, dtype=np.float64)
+    }
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+    # meta.json last: a directory without it is never loaded
+    with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+
+def current_version(path):
+    """Directory of the installed version under path, or None if there is none"""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        # Unversioned directory written by an older release
+        return path if os.path.exists(os.path.join(path, "meta.json")) else None
+    return os.path.join(path, name)
+
+
+def install_version(source, path):
+    """Move the directory source under path and make it the current version
+
+    path holds one subdirectory per version and a CURRENT file naming the
+    live one, replaced in one rename, so readers never see a mix of old and
+    new files.  Nothing that may still be memory-mapped is deleted (Windows
+    refuses, and other platforms would pull files from under a reader): the
+    version being replaced stays until the next install, and only the ones
+    before it are removed.  Returns the new version directory.
+    """
+    os.makedirs(path, exist_ok=True)
+    previous = current_version(path)
+    name = datetime.now().strftime("v%Y%m%d-%H%M%S-%f")
+    while os.path.exists(os.path.join(path, name)):
+        name += "-1"
+    version = os.path.join(path, name)
+    os.replace(source, version)
+    pointer = os.path.join(path, CURRENT_FILE + ".tmp")
+    with open(pointer, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(path, CURRENT_FILE))
+    prune_versions(path, keep=(version, previous))
+    return version
+
+
+def prune_versions(path, keep=()):
+    """Delete the versions under path except those in keep
+
+    A version that is still mapped somewhere (e.g. by another process on
+    Windows) is left for the next prune.
+    """
+    keep = {os.path.abspath(directory) for directory in keep if directory}
+    legacy = os.path.abspath(path) in keep
+    for name in os.listdir(path):
+        entry = os.path.join(path, name)
+        if name.startswith(CURRENT_FILE) or os.path.abspath(entry) in keep:
+            continue
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        elif not legacy:
+            # Files of an unversioned model, once a later version replaced it
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+
+
+def model_exists(path):
+    return current_version(path) is not None
+
+
+class CompiledModel:
+    """TF-IDF + Naive Bayes model loaded from a model directory
+
+    Offers the predict/predict_proba/transform calls the trainer used on the
+    sklearn Pipeline.  Arrays are memory-mapped read-only by default, so
+    several processes share one copy through the page cache.
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        # A model path with versions loads its current one
+        path = current_version(path) or path
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('schema_version') != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported model schema version {meta.get('schema_version')} "
+                             f"(expected {SCHEMA_VERSION}), retrain the model")
+
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in ARRAYS}
+        n_features = meta['n_features']
+        if arrays['idf'].shape != (n_features,) or arrays['feature_log_prob'].shape != (len(meta['classes']), n_features):
+            raise ValueError("Model arrays do not match meta.json, retrain the model")
+
+        self.meta = meta
+        self.classes_ = np.array(meta['classes'])
+        self.idf = arrays['idf']
+        self.feature_log_prob = arrays['feature_log_prob']
+        self.class_log_prior = arrays['class_log_prior']
+        self.vocabulary = {str(term): index for index, term in enumerate(arrays['terms'])}
+        self.token_pattern = re.compile(meta['token_pattern'])
+
+    def transform(self, texts):
+        """TF-IDF rows for texts as a dense (n_texts, n_features) array"""
+        meta = self.meta
+        matrix = np.zeros((len(texts), meta['n_features']))
+        for row, text in enumerate(texts):
+            if meta['lowercase']:
+                text = text.lower()
+            # Stop words never made it into the vocabulary, so the lookup drops them
+            for token in self.token_pattern.findall(text):
+                index = self.vocabulary.get(token)
+                if index is not None:
+                    matrix[row, index] += 1
+        if meta['binary']:
+            np.minimum(matrix, 1, out=matrix)
+        elif meta['sublinear_tf']:
+            nonzero = matrix > 0
+            matrix[nonzero] = np.log(matrix[nonzero]) + 1
+        matrix *= self.idf
+        if meta['norm'] == 'l2':
+            norms = np.sqrt((matrix ** 2).sum(axis=1, keepdims=True))
+        elif meta['norm'] == 'l1':
+            norms = np.abs(matrix).sum(axis=1, keepdims=True)
+        else:
+            return matrix
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def joint_log_likelihood(self, texts):
+        return self.transform(texts) @ self.feature_log_prob.T + self.class_log_prior
+
+    def predict(self, texts):
+        return self.classes_[np.argmax(self.joint_log_likelihood(texts), axis=1)]
+
+    def predict_proba(self, texts):
+        scores = self.joint_log_likelihood(texts)
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
@@ -0,0 +1,190 @@
+"""
+AI-BD Online Model
+Naive Bayes over hashed features, updated as conversations are logged
+"""
+
+import json
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime
+from itertools import islice
+import numpy as np
+
+# Bump when the files or their meaning change; older state is relearned
+SCHEMA_VERSION = 1
+
+# Hashed feature space; fixed, so the vectorizer needs no fitting.  Chat
+# vocabularies are a few thousand words, and every update and prediction
+# touches the whole (classes x features) table, so it is kept small
+N_FEATURES = 2 ** 14
+
+# Records learned between saves; anything learned after the last save is
+# learned again from the history on the next start
+SAVE_EVERY = 100
+CATCH_UP_BATCH = 1000
+
+
+class OnlineModel:
+    """Response-category classifier that learns one micro-batch at a time
+
+    Inputs are turned into features by a stateless HashingVectorizer and
+    fed to MultinomialNB.partial_fit, so learning a batch costs the same
+    whatever the size of the history.  ``learned`` counts the history
+    records the model has seen; the per-class counts are saved to ``path``
+    (meta.json plus .npy files) and ``catch_up`` learns only the records
+    logged since.  ``learn_later`` queues records for a worker thread, so
+    logging a conversation never waits for partial_fit or a save; the
+    functions in ``listeners`` are called there after each batch.  Offers
+    the predict/predict_proba/classes_ interface of the batch model.  Needs
+    sklearn.
+    """
+
+    def __init__(self, path, classes, categorize):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+
+        self.path = path
+        self.classes = list(classes)
+        self.categorize = categorize
+        self.vectorizer = HashingVectorizer(n_features=N_FEATURES, alternate_sign=False, stop_words='english')
+        self.classifier = MultinomialNB()
+        self.lock = threading.Lock()
+        self.learned = 0
+        self.unsaved = 0
+        self.listeners = []
+        self.queue = queue.Queue()
+        self.worker = None
+        self.load()
+
+    @property
+    def classes_(self):
+        return self.classifier.classes_
+
+    def load(self):
+        meta_file = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_file):
+            return
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('schema_version') != SCHEMA_VERSION or meta.get('n_features') != N_FEATURES \
+                or sorted(meta.get('classes', [])) != sorted(self.classes):
+            print("Online model state is outdated, relearning it from the history")
+            return
+
+        classifier = self.classifier
+        # In the order partial_fit put them, which the saved counts follow
+        classifier.classes_ = np.array(meta['classes'])
+        classifier.class_count_ = np.load(os.path.join(self.path, "class_count.npy"))
+        classifier.feature_count_ = np.load(os.path.join(self.path, "feature_count.npy"))
+        classifier.n_features_in_ = N_FEATURES
+        # Same smoothing as MultinomialNB (alpha=1, fitted class prior)
+        smoothed = classifier.feature_count_ + classifier.alpha
+        classifier.feature_log_prob_ = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        with np.errstate(divide='ignore'):
+            classifier.class_log_prior_ = np.log(classifier.class_count_) - np.log(classifier.class_count_.sum())
+        self.learned = meta['learned']
+
+    def save(self):
+        """Write the class and feature counts next to path and swap them in"""
+        with self.lock:
+            if not self.learned:
+                return
+            meta = {
+                'schema_version': SCHEMA_VERSION,
+                'saved': datetime.now().isoformat(),
+                'classes': [str(label) for label in self.classifier.classes_],
+                'n_features': N_FEATURES,
+                'learned': self.learned
+            }
+            temp_dir = self.path + ".tmp"
+            old_dir = self.path + ".old"
+            for directory in (temp_dir, old_dir):
+                if os.path.exists(directory):
+                    shutil.rmtree(directory)
+            os.makedirs(temp_dir)
+            np.save(os.path.join(temp_dir, "class_count.npy"), self.classifier.class_count_)
+            np.save(os.path.join(temp_dir, "feature_count.npy"), self.classifier.feature_count_)
+            with open(os.path.join(temp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2)
+            if os.path.exists(self.path):
+                os.replace(self.path, old_dir)
+            os.replace(temp_dir, self.path)
+            if os.path.exists(old_dir):
+                shutil.rmtree(old_dir)
+            self.unsaved = 0
+
+    def learn_later(self, records):
+        """Queue newly stored records to be learned on the worker thread (a history listener)"""
+        records = list(records)
+        if not records:
+            return
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name="online-model", daemon=True)
+                self.worker.start()
+        self.queue.put(records)
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            # Whatever was queued meanwhile is learned as one micro-batch
+            taken = 1
+            while True:
+                try:
+                    batch += self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+            try:
+                self.learn(batch)
+                for listener in self.listeners:
+                    listener()
+            except Exception as e:
+                print(f"❌ Online model could not learn {len(batch)} conversations: {e}")
+            finally:
+                for _ in range(taken):
+                    self.queue.task_done()
+
+    def wait(self):
+        """Block until every queued record has been learned"""
+        self.queue.join()
+
+    def learn(self, records):
+        """Update the model with newly stored records"""
+        records = list(records)
+        if not records:
+            return
+        features = self.vectorizer.transform([record.get('user_input') or "" for record in records])
+        labels = self.categorize([record.get('bot_response') or "" for record in records])
+        with self.lock:
+            self.classifier.partial_fit(features, labels, classes=self.classes)
+            self.learned += len(records)
+            self.unsaved += len(records)
+            due = self.unsaved >= SAVE_EVERY
+        if due:
+            self.save()
+
+    def catch_up(self, history):
+        """Learn the records of history the saved state has not seen; returns how many"""
+        # Queued records are already in the history; learn them first so they are not counted twice
+        self.wait()
+        start = self.learned
+        records = history.iter_from(start)
+        while True:
+            batch = list(islice(records, CATCH_UP_BATCH))
+            if not batch:
+                break
+            self.learn(batch)
+        return self.learned - start
+
+    def predict(self, texts):
+        features = self.vectorizer.transform(texts)
+        with self.lock:
+            return self.classifier.predict(features)
+
+    def predict_proba(self, texts):
+        features = self.vectorizer.transform(texts)
+        with self.lock:
+            return self.classifier.predict_proba(features)
@@ -0,0 +1,124 @@
+"""
+AI-BD Pattern Matcher
+Finds the first matching conversation rule in one pass over the input
+"""
+
+import re
+from spelling import SpellingIndex
+
+# A rule of the form \b(alternative|alternative|...)\b whose alternatives
+# are plain text (escaped punctuation allowed) can be matched by lookup
+WORD_BOUNDED = re.compile(r'^\\b\((?:\?:)?(.*)\)\\b$', re.S)
+SPECIAL = re.compile(r'(?<!\\)[.^$*+?{}\[\]()|]|\\[A-Za-z0-9]')
+WORD = re.compile(r'\w+')
+WORD_CHAR = re.compile(r'\w')
+
+# With adaptive=True, rules are reordered after this many matches
+REORDER_EVERY = 1000
+
+
+def literal_alternatives(pattern):
+    """The literal strings a word-bounded alternation matches, or None"""
+    found = WORD_BOUNDED.match(pattern)
+    if not found:
+        return None
+    body = found.group(1)
+    alternatives = []
+    # Split on unescaped |; any other special character means a real regex
+    for alternative in re.split(r'(?<!\\)\|', body):
+        if not alternative or SPECIAL.search(alternative):
+            return None
+        literal = re.sub(r'\\(.)', r'\1', alternative)
+        if not WORD.match(literal):
+            return None
+        alternatives.append(literal)
+    return alternatives
+
+
+class PatternMatcher:
+    """First-match lookup over an ordered collection of regex rules
+
+    Gives the same answer as calling ``re.search`` for each rule in order
+    and taking the first hit.  Rules that are word-bounded alternations of
+    plain text (like ``\\b(hello|hi|good morning)\\b``) are indexed by the
+    first word of each alternative, so one pass over the words of the input
+    finds every literal hit and the best-ranked one wins; any other rule is
+    searched as a regex, and only if it outranks the best literal hit.
+
+    With ``adaptive`` the precedence becomes observed hit frequency (most
+    matched rules first), which changes the winner when several rules match
+    the same input; the default keeps the original order.
+
+    With ``spelling`` an input that matches no rule is tried once more with
+    its unknown words corrected to the closest word of a literal rule
+    ("hellooo" -> "hello"); see SpellingIndex for which words are corrected.
+    """
+
+    def __init__(self, patterns, adaptive=False, spelling=False):
+        self.patterns = list(patterns)
+        self.literals = [literal_alternatives(pattern) for pattern in self.patterns]
+        self.regexes = [re.compile(pattern) for pattern in self.patterns]
+        self.adaptive = adaptive
+        self.hits = [0] * len(self.patterns)
+        self.matches = 0
+        self.compile(range(len(self.patterns)))
+        self.spelling = None
+        if spelling:
+            self.spelling = SpellingIndex(word for literals in self.literals if literals
+                                          for literal in literals for word in WORD.findall(literal))
+
+    def compile(self, order):
+        """Build the lookup tables for rule indices in precedence order"""
+        order = list(order)
+        by_first_word = {}
+        standalone = []
+        for rank, index in enumerate(order):
+            if self.literals[index] is None:
+                standalone.append((rank, self.regexes[index]))
+                continue
+            for literal in self.literals[index]:
+                first_word = WORD.match(literal).group()
+                by_first_word.setdefault(first_word, []).append((rank, literal))
+        # One assignment, so concurrent matches never mix two orders
+        self.compiled = (order, by_first_word, standalone)
+
+    def match(self, text):
+        """The first rule (by precedence) that matches text, or None"""
+        pattern = self.match_exact(text)
+        if pattern is None and self.spelling is not None:
+            corrected = WORD.sub(lambda word: self.spelling.correct(word.group()), text)
+            if corrected != text:
+                pattern = self.match_exact(corrected)
+        return pattern
+
+    def match_exact(self, text):
+        order, by_first_word, standalone = self.compiled
+        best = len(order)
+        for word in WORD.finditer(text):
+            for rank, literal in by_first_word.get(word.group(), ()):
+                if rank < best and text.startswith(literal, word.start()):
+                    end = word.start() + len(literal)
+                    # \b after the literal: word character on exactly one side
+                    after = end < len(text) and WORD_CHAR.match(text, end) is not None
+                    if after != (WORD_CHAR.match(text, end - 1) is not None):
+                        best = rank
+        for rank, regex in standalone:
+            if rank >= best:
+                break
+            if regex.search(text):
+                best = rank
+                break
+        if best == len(order):
+            return None
+
+        index = order[best]
+        if self.adaptive:
+            self.record_hit(index)
+        return self.patterns[index]
+
+    def record_hit(self, index):
+        self.hits[index] += 1
+        self.matches += 1
+        if self.matches % REORDER_EVERY == 0:
+            # Stable sort: ties keep their original order
+            self.compile(sorted(range(len(self.patterns)), key=lambda i: -self.hits[i]))
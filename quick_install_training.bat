@@ -28,21 +28,15 @@ echo • Installing Flask...
 echo • Installing scikit-learn...
 "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install scikit-learn==1.3.0 --quiet
 
-echo • Installing NLTK...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install nltk==3.8.1 --quiet
-
 echo • Installing NumPy...
 "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install numpy==1.24.3 --quiet
 
-echo • Installing Pandas...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install pandas==1.5.3 --quiet
-
 echo • Installing Joblib...
 "C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -m pip install joblib==1.3.2 --quiet
 
 echo.
 echo Testing installation...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, nltk, numpy, pandas; print('✓ All packages installed successfully!')"
+"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, numpy; print('✓ All packages installed successfully!')"
 
 if %errorlevel% equ 0 (
     echo.
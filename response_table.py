@@ -0,0 +1,90 @@
+"""
+AI-BD Response Tables
+Weighted responses learned per keyword, kept ranked best first
+"""
+
+
+class ResponseTable:
+    """Responses learned for one keyword with their weights, best first
+
+    ``ranking`` is kept sorted by weight as responses are added (ties keep
+    the order they were learned in), so the best response of a keyword is
+    always ``ranking[0]``.  Stored as a list of [response, weight] pairs.
+    """
+
+    __slots__ = ('weights', 'ranking', 'positions')
+
+    def __init__(self, entries=()):
+        self.weights = {}
+        self.ranking = []
+        self.positions = {}
+        for entry in entries:
+            # Older pattern files hold plain response strings, one vote each
+            response, weight = (entry, 1) if isinstance(entry, str) else entry
+            self.add(response, weight)
+
+    def __len__(self):
+        return len(self.ranking)
+
+    def add(self, response, weight=1):
+        """Add weight to a response and move it up the ranking as needed"""
+        if response in self.weights:
+            self.weights[response] += weight
+            position = self.positions[response]
+        else:
+            self.weights[response] = weight
+            position = len(self.ranking)
+            self.ranking.append(response)
+
+        new_weight = self.weights[response]
+        while position > 0 and self.weights[self.ranking[position - 1]] < new_weight:
+            above = self.ranking[position - 1]
+            self.ranking[position] = above
+            self.positions[above] = position
+            position -= 1
+        self.ranking[position] = response
+        self.positions[response] = position
+
+    def raise_to(self, response, weight):
+        """Make a response weigh at least weight; True if that changed anything"""
+        current = self.weights.get(response, 0)
+        if current >= weight:
+            return False
+        self.add(response, weight - current)
+        return True
+
+    def to_list(self):
+        return [[response, self.weights[response]] for response in self.ranking]
+
+
+def best_response(tables):
+    """Response with the highest total weight over a few tables, or None
+
+    Walks the rankings in step (the threshold algorithm): once the best
+    total seen is at least the sum of the weights at the current depth, no
+    response further down can beat it, so usually only the top of each
+    table is read.  Ties go to the response seen first.
+    """
+    tables = [table for table in tables if table.ranking]
+    if not tables:
+        return None
+    if len(tables) == 1:
+        return tables[0].ranking[0]
+
+    best, best_total = None, 0
+    seen = set()
+    for depth in range(max(len(table.ranking) for table in tables)):
+        threshold = 0
+        for table in tables:
+            if depth >= len(table.ranking):
+                continue
+            response = table.ranking[depth]
+            threshold += table.weights[response]
+            if response not in seen:
+                seen.add(response)
+                total = sum(other.weights.get(response, 0) for other in tables)
+                if total > best_total:
+                    best, best_total = response, total
+        if best_total >= threshold:
+            break
+    return best
@@ -0,0 +1,314 @@
+"""
+AI-BD Retrain Jobs
+Retrain the ML model in a separate process and swap it in when it is ready
+"""
+
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Finished jobs remembered for the status endpoint
+KEEP_JOBS = 50
+
+# With AIBD_AUTO_RETRAIN=1 the web app retrains by itself (see RetrainScheduler)
+AUTO_RETRAIN = os.environ.get("AIBD_AUTO_RETRAIN") == "1"
+
+# Scheduler thresholds: new conversations or feedback entries since the
+# last model, and the vocabulary drift of new inputs (checked once there
+# are DRIFT_MIN_CONVERSATIONS of them)
+RETRAIN_AFTER_CONVERSATIONS = 500
+RETRAIN_AFTER_FEEDBACK = 50
+RETRAIN_DRIFT = 0.2
+DRIFT_MIN_CONVERSATIONS = 50
+# A word unknown to the model counts towards drift once it has been seen
+# this often (one-off typos and names do not make a new topic)
+DRIFT_MIN_COUNT = 3
+# Least time between two retrains, in seconds
+MIN_RETRAIN_INTERVAL = int(os.environ.get("AIBD_RETRAIN_INTERVAL", 1800))
+
+
+def report(**progress):
+    """Tell the parent process how the training run is going (one JSON line)"""
+    print(json.dumps(progress), flush=True)
+
+
+def train(data_dir, storage_mode, output_dir):
+    """Child process: fit the model on the stored history and write it to output_dir
+
+    output_dir gets the model (trained_model) and a fresh LSA index
+    (semantic_index); the server installs both only once the model passes
+    its check.  Opens the history read-only (no snapshots, no conversion), so
+    the server keeps logging meanwhile.
+    """
+    from ai_trainer import categorize_responses, fit_ml_pipeline
+    from model_artifact import write_model
+    from semantic_index import write_semantic_index
+    from storage import open_storage, ConversationHistory
+
+    report(stage='loading')
+    storage = open_storage(data_dir, storage_mode or None, 'direct', read_only=True)
+    storage.load("conversations", [])
+    history = ConversationHistory(storage, "conversations", dedup=False)
+    inputs = []
+    responses = []
+    for conv in history:
+        inputs.append(conv['user_input'])
+        responses.append(conv['bot_response'])
+    if len(inputs) < 10:
+        raise ValueError("Need at least 10 conversations to train ML model")
+
+    report(stage='fitting', conversations=len(inputs))
+    pipeline, vectorizer = fit_ml_pipeline(inputs, categorize_responses(responses))
+    write_model(os.path.join(output_dir, "trained_model"), vectorizer, pipeline.named_steps['classifier'], len(inputs))
+
+    report(stage='indexing', conversations=len(inputs))
+    write_semantic_index(os.path.join(output_dir, "semantic_index"), history)
+    report(stage='trained', conversations=len(inputs))
+
+
+class RetrainJobs:
+    """Retraining requests for a trainer, run one at a time off the request thread
+
+    ``submit`` queues a job and returns at once; a worker thread runs it.
+    In the default batch mode the model is fitted by a separate Python
+    process (so the server's threads and GIL are not held), written to a
+    candidate directory, checked, and installed with
+    ``AITrainer.install_model``.  An online-mode trainer just catches up in
+    the worker.  ``status`` reports a job's state and stage.
+    """
+
+    def __init__(self, trainer):
+        self.trainer = trainer
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.worker = None
+        self.last_submitted = None
+
+    def submit(self):
+        """Queue a retrain and return its job (a queued job is shared, as it will see the same data)"""
+        with self.lock:
+            for job in self.jobs.values():
+                if job['status'] == 'queued':
+                    return dict(job)
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'status': 'queued',
+                'stage': None,
+                'conversations': None,
+                'message': None,
+                'created': datetime.now().isoformat(),
+                'started': None,
+                'finished': None
+            }
+            self.jobs[job['id']] = job
+            self.last_submitted = time.monotonic()
+            finished = [job_id for job_id, old in self.jobs.items() if old['finished']]
+            for job_id in finished[:max(len(finished) - KEEP_JOBS, 0)]:
+                del self.jobs[job_id]
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name="retrain-jobs", daemon=True)
+                self.worker.start()
+            self.queue.put(job['id'])
+            return dict(job)
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def busy(self):
+        """Whether a job is queued or running"""
+        with self.lock:
+            return any(job['status'] in ('queued', 'running') for job in self.jobs.values())
+
+    def update(self, job_id, **changes):
+        with self.lock:
+            self.jobs[job_id].update(changes)
+
+    def run(self):
+        while True:
+            job_id = self.queue.get()
+            self.update(job_id, status='running', started=datetime.now().isoformat())
+            try:
+                message = self.retrain(job_id)
+                self.update(job_id, status='succeeded', message=message)
+            except Exception as e:
+                print(f"❌ Retrain job {job_id} failed: {e}")
+                self.update(job_id, status='failed', message=str(e))
+            finally:
+                self.update(job_id, finished=datetime.now().isoformat())
+
+    def retrain(self, job_id):
+        trainer = self.trainer
+        if trainer.ml_mode == 'online':
+            if not trainer.train_ml_model():
+                raise ValueError("No conversations to learn from yet")
+            return "Online model is up to date"
+
+        # The child reads the history from disk: let queued writes reach it
+        if hasattr(trainer.storage, 'wait_for'):
+            trainer.storage.wait_for()
+        candidate = trainer.model_dir + ".candidate"
+        if os.path.exists(candidate):
+            shutil.rmtree(candidate)
+        command = [sys.executable, os.path.abspath(__file__), "train",
+                   trainer.data_dir, trainer.storage_mode or "", candidate]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        error = None
+        for line in process.stdout:
+            try:
+                progress = json.loads(line)
+            except ValueError:
+                # Ordinary output of the modules it imports
+                continue
+            if not isinstance(progress, dict):
+                continue
+            error = progress.pop('error', None) or error
+            self.update(job_id, **progress)
+        if process.wait() != 0:
+            raise RuntimeError(error or f"Training process exited with code {process.returncode}")
+
+        self.update(job_id, stage='installing')
+        trainer.install_model(os.path.join(candidate, "trained_model"), os.path.join(candidate, "semantic_index"))
+        shutil.rmtree(candidate, ignore_errors=True)
+        self.update(job_id, stage='installed')
+        conversations = self.status(job_id)['conversations']
+        print(f"✅ ML model retrained on {conversations} conversations")
+        return f"Model retrained on {conversations} conversations"
+
+
+class RetrainScheduler:
+    """Submits retrain jobs when enough has changed since the last model
+
+    Listens to the trainer's conversation and feedback histories and counts
+    the records stored since the model was trained.  Drift is the share of
+    words (stop words aside) in new inputs that the model's vocabulary does
+    not know, counting only words seen at least DRIFT_MIN_COUNT times.  A
+    job is submitted when a threshold is crossed, unless one is already
+    queued or running or the last was submitted (by anyone) less than
+    ``min_interval`` seconds ago, so bursts of traffic cause at most one
+    retrain per interval.  The counts start again when a new model is
+    installed.  Batch mode only: an online model is always current.
+    """
+
+    def __init__(self, trainer, jobs, conversations=RETRAIN_AFTER_CONVERSATIONS,
+                 feedback=RETRAIN_AFTER_FEEDBACK, drift=RETRAIN_DRIFT,
+                 min_interval=MIN_RETRAIN_INTERVAL):
+        self.trainer = trainer
+        self.jobs = jobs
+        self.thresholds = {'conversations': conversations, 'feedback': feedback, 'drift': drift}
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.model = None
+        self.reset()
+        trainer.history.listeners.append(self.conversations_logged)
+        trainer.feedback_history.listeners.append(self.feedback_logged)
+
+    def reset(self):
+        """Start counting from the trainer's current model"""
+        model = self.trainer.ml_model
+        self.model = model
+        self.vocabulary = getattr(model, 'vocabulary', None)
+        if self.vocabulary is None and model is not None:
+            # A Pipeline trained in this process
+            self.vocabulary = self.trainer.vectorizer.vocabulary_
+        trained_on = getattr(model, 'meta', {}).get('conversations')
+        if model is None:
+            self.new_conversations = len(self.trainer.history)
+        elif trained_on is not None:
+            self.new_conversations = max(len(self.trainer.history) - trained_on, 0)
+        else:
+            # No count (older artifact, trained in this process): the model
+            # is taken to cover the history as it is now
+            self.new_conversations = 0
+        self.new_feedback = 0
+        self.words = 0
+        self.unknown_words = {}
+
+    def conversations_logged(self, records):
+        from similarity_index import tokenize
+
+        with self.lock:
+            if self.trainer.ml_model is not self.model:
+                # Retrained since; reset counts the stored records as well
+                self.reset()
+            else:
+                self.new_conversations += len(records)
+            if self.vocabulary is not None:
+                for record in records:
+                    for word in tokenize(record.get('user_input')):
+                        self.words += 1
+                        if word not in self.vocabulary:
+                            self.unknown_words[word] = self.unknown_words.get(word, 0) + 1
+        self.check()
+
+    def feedback_logged(self, records):
+        with self.lock:
+            if self.trainer.ml_model is not self.model:
+                self.reset()
+            self.new_feedback += len(records)
+        self.check()
+
+    def drift(self):
+        """Share of new input words the model does not know (0 to 1)"""
+        if not self.words:
+            return 0.0
+        unknown = sum(count for count in self.unknown_words.values() if count >= DRIFT_MIN_COUNT)
+        return unknown / self.words
+
+    def status(self):
+        with self.lock:
+            return {
+                'new_conversations': self.new_conversations,
+                'new_feedback': self.new_feedback,
+                'drift': round(self.drift(), 3),
+                'thresholds': dict(self.thresholds)
+            }
+
+    def due(self):
+        """Why a retrain is due, or None"""
+        thresholds = self.thresholds
+        if self.model is None:
+            # Train the first model as soon as there is enough data
+            return "first model" if self.new_conversations >= 10 else None
+        if self.new_conversations >= thresholds['conversations']:
+            return f"{self.new_conversations} new conversations"
+        if self.new_feedback >= thresholds['feedback']:
+            return f"{self.new_feedback} new feedback entries"
+        if self.new_conversations >= DRIFT_MIN_CONVERSATIONS:
+            drift = self.drift()
+            if drift >= thresholds['drift']:
+                return f"vocabulary drift {drift:.0%}"
+        return None
+
+    def check(self):
+        """Submit a retrain if one is due and allowed"""
+        with self.lock:
+            reason = self.due()
+        if reason is None or self.jobs.busy():
+            return None
+        last = self.jobs.last_submitted
+        if last is not None and time.monotonic() - last < self.min_interval:
+            return None
+        job = self.jobs.submit()
+        print(f"🔄 Scheduled retrain {job['id']}: {reason}")
+        return job
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "train":
+        try:
+            train(*sys.argv[2:5])
+        except Exception as e:
+            report(error=str(e))
+            sys.exit(1)
+    else:
+        print("Usage: python retrain_jobs.py train <data_dir> <storage_mode> <output_dir>")
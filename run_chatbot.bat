@@ -15,7 +15,7 @@ if %errorlevel% neq 0 (
 echo Starting AI-BD...
 echo.
 echo Checking for training features...
-"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, nltk, numpy, pandas; print('Training features available!')" 2>nul
+"C:/Users/Admin/Desktop/React projects/aiBD/.venv/Scripts/python.exe" -c "import sklearn, numpy; print('Training features available!')" 2>nul
 if %errorlevel% neq 0 (
     echo Training features not installed.
     echo.
@@ -3,7 +3,7 @@ echo Starting AI-BD with Training Features...
 cd /d "c:\Users\Admin\Desktop\React projects\aiBD"
 
 echo Checking training dependencies...
-"C:/Users/Admin/Desktop\React projects\aiBD/.venv/Scripts/python.exe" -c "import sklearn, nltk, numpy, pandas; print('Training modules available!')" 2>nul
+"C:/Users/Admin/Desktop\React projects\aiBD/.venv/Scripts/python.exe" -c "import sklearn, numpy; print('Training modules available!')" 2>nul
 if %errorlevel% neq 0 (
     echo Training modules not installed!
     echo Run install_training.bat to install them.
@@ -0,0 +1,195 @@
+"""
+AI-BD Semantic Index
+LSA (truncated SVD of TF-IDF) vectors of past user inputs for paraphrase lookups
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime
+import numpy as np
+from model_artifact import current_version, install_version
+from storage import matches
+
+# Bump when the files or their meaning change; older indexes are ignored until retrained
+SCHEMA_VERSION = 2
+
+# Latent dimensions kept by the SVD (fewer if the data is smaller)
+N_COMPONENTS = 100
+
+# Same tokens as TfidfVectorizer; stop words never reach the vocabulary
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def build_semantic_index(path, history, feedback=None, n_components=N_COMPONENTS):
+    """Fit LSA on the user inputs of history and install it as a new version at path
+
+    Like the model artifact it is written next to path and installed with
+    ``install_version``, so the version a reader has mapped is not deleted
+    under it.  Needs sklearn; returns False if there is too little text to fit.
+    """
+    temp_dir = path + ".tmp"
+    if not write_semantic_index(temp_dir, history, feedback, n_components):
+        return False
+    install_version(temp_dir, path)
+    return True
+
+
+def write_semantic_index(directory, history, feedback=None, n_components=N_COMPONENTS):
+    """Fit LSA on the user inputs of history and write the index directory
+
+    Only records with the given feedback are indexed when it is set.  The
+    directory holds meta.json, the vocabulary and idf of the TF-IDF step,
+    term_vectors.npy (each term's direction in the latent space),
+    vectors.npy (one unit-length float32 row per indexed record) and
+    positions.npy (where each of them is in the history).  Returns False if
+    there is too little text to fit.
+    """
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    positions = []
+    inputs = []
+    total = 0
+    for total, record in enumerate(history, 1):
+        if feedback is None or matches(record, feedback=feedback):
+            positions.append(total - 1)
+            inputs.append(record.get('user_input') or "")
+    vectorizer = TfidfVectorizer(stop_words='english', dtype=np.float32)
+    try:
+        matrix = vectorizer.fit_transform(inputs)
+    except ValueError:
+        # Empty vocabulary
+        return False
+    n_components = min(n_components, matrix.shape[1] - 1, matrix.shape[0] - 1)
+    if n_components < 1:
+        return False
+    svd = TruncatedSVD(n_components=n_components, random_state=42)
+    vectors = svd.fit_transform(matrix).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    vectors /= norms
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, index in vectorizer.vocabulary_.items():
+        terms[index] = term
+    meta = {
+        'schema_version': SCHEMA_VERSION,
+        'created': datetime.now().isoformat(),
+        'records': len(positions),
+        'history_records': total,
+        'n_components': n_components
+    }
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    np.save(os.path.join(directory, "positions.npy"), np.array(positions, dtype=np.uint64))
+    np.save(os.path.join(directory, "terms.npy"), np.array(terms, dtype=str))
+    np.save(os.path.join(directory, "idf.npy"), vectorizer.idf_.astype(np.float32))
+    np.save(os.path.join(directory, "term_vectors.npy"), np.ascontiguousarray(svd.components_.T, dtype=np.float32))
+    np.save(os.path.join(directory, "vectors.npy"), vectors)
+    # meta.json last: a directory without it is never loaded
+    with open(os.path.join(directory, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return True
+
+
+class SemanticIndex:
+    """Nearest past inputs in LSA space, read from a built index directory
+
+    The record vectors are memory-mapped float32, so the index costs little
+    memory and is shared between processes through the page cache; a search
+    is one matrix-vector product over them.  Results are read back from the
+    history by position.  Records logged after the last build are not
+    searched until the index is built again (on training).  Searching needs
+    only numpy.
+    """
+
+    def __init__(self, path, history):
+        self.path = path
+        self.history = history
+        self.lock = threading.Lock()
+        self.state = None
+
+    def build(self, feedback=None, n_components=N_COMPONENTS):
+        """Rebuild the index from the history; the next search loads the new one"""
+        built = build_semantic_index(self.path, self.history, feedback, n_components)
+        if built:
+            self.reload()
+        return built
+
+    def install(self, directory):
+        """Install an index written by write_semantic_index; the next search loads it"""
+        install_version(directory, self.path)
+        self.reload()
+
+    def reload(self):
+        """Map the index again on the next search (e.g. after another process rebuilt it)"""
+        with self.lock:
+            self.state = None
+
+    def exists(self):
+        return current_version(self.path) is not None
+
+    def load(self):
+        """Memory-map the current version of the index, or None if there is no usable index yet"""
+        with self.lock:
+            directory = current_version(self.path) if self.state is None else None
+            if directory is not None:
+                with open(os.path.join(directory, "meta.json"), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                if meta.get('schema_version') != SCHEMA_VERSION:
+                    print(f"Semantic index schema {meta.get('schema_version')} is outdated, retrain to rebuild it")
+                    return None
+                if len(self.history) < meta['history_records']:
+                    # The history was cleared or replaced: positions point at other records
+                    print("Semantic index is older than the history, retrain to rebuild it")
+                    return None
+                load = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                terms = np.load(os.path.join(directory, "terms.npy"))
+                self.state = {
+                    'vocabulary': {str(term): index for index, term in enumerate(terms)},
+                    'idf': load('idf'),
+                    'term_vectors': load('term_vectors'),
+                    'vectors': load('vectors'),
+                    'positions': load('positions')
+                }
+            return self.state
+
+    def embed(self, state, text):
+        """Unit-length LSA vector of text, or None if it has no known terms"""
+        counts = {}
+        for token in TOKEN_PATTERN.findall((text or "").lower()):
+            index = state['vocabulary'].get(token)
+            if index is not None:
+                counts[index] = counts.get(index, 0) + 1
+        if not counts:
+            return None
+        indices = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts)) * state['idf'][indices]
+        vector = weights @ state['term_vectors'][indices]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def search(self, text, top_k=3, min_similarity=0.0):
+        """Top-k indexed records by cosine similarity in LSA space"""
+        state = self.load()
+        if state is None or not top_k:
+            return []
+        query = self.embed(state, text)
+        if query is None:
+            return []
+        similarities = state['vectors'] @ query
+        if len(similarities) > top_k:
+            best = np.argpartition(-similarities, top_k)[:top_k]
+        else:
+            best = np.arange(len(similarities))
+        best = best[np.argsort(-similarities[best])]
+
+        best = [row for row in best if similarities[row] > min_similarity]
+        records = self.history.records_at([int(state['positions'][row]) for row in best])
+        return [{'conversation': record, 'similarity': float(similarities[row])}
+                for row, record in zip(best, records)]
@@ -0,0 +1,382 @@
+"""
+AI-BD Similarity Index
+Persistent, incrementally updated TF-IDF index over past user inputs
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from array import array
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+import numpy as np
+from storage import SidecarFile
+
+# Same tokens as TfidfVectorizer(stop_words='english')
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+# Document norms are recomputed in the background once the collection has
+# grown by this fraction since they were last computed
+REWEIGHT_GROWTH = 0.1
+
+# "ann" answers searches from random-projection LSH buckets instead of the
+# full postings; more tables raise recall, more bits per table cut latency.
+# In benchmark_similarity.py the defaults find the best match for 99% of
+# queries but only about 70% of the top 3, at half the latency of an exact
+# search from 100k records on
+DEFAULT_APPROXIMATE = os.environ.get("AIBD_SIMILARITY_MODE", "exact") == "ann"
+LSH_TABLES = 16
+LSH_BITS = 12
+# Extra buckets looked up per table by flipping the query's least certain bits
+LSH_PROBES = 4
+# Below this many records an exact search is as fast, so it is used instead
+ANN_MIN_RECORDS = 100000
+
+
+@lru_cache(maxsize=None)
+def english_stop_words():
+    # Imported on first use: sklearn takes longer to import than the app to start
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    return ENGLISH_STOP_WORDS
+
+
+def tokenize(text):
+    stop_words = english_stop_words()
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower())
+            if token not in stop_words]
+
+
+class SimilarityIndex:
+    """Inverted TF-IDF index over the user inputs of a history
+
+    ``path`` caches the term counts of every record, one line each in
+    history order, so loading does not tokenize the whole history again:
+    records logged since are indexed from the history, and the file is
+    only rebuilt if it has lines the history does not.  New lines are
+    written through a SidecarFile, so with a background writer they never
+    touch the request thread.  Results are read back from the history by
+    position.  In memory it keeps postings (term -> documents and counts),
+    document frequencies and document norms.
+
+    Weights follow TfidfVectorizer's defaults (raw counts, smoothed idf,
+    l2 norm).  Query weights always use the current idf; document norms are
+    computed when a record is added and refreshed for the whole collection
+    by a background thread as it grows.
+
+    With ``approximate`` every record is also hashed into ``tables`` LSH
+    tables keyed by ``bits`` signs of random projections of its TF-IDF
+    vector (SimHash), and approximate searches only score the records that
+    share a bucket with the query in at least one table (or one of ``probes``
+    neighbouring buckets with a single bit flipped), once the index holds
+    ``min_records`` records.
+    """
+
+    def __init__(self, path, history, approximate=None, tables=LSH_TABLES, bits=LSH_BITS, probes=LSH_PROBES,
+                 min_records=ANN_MIN_RECORDS):
+        self.path = path
+        self.history = history
+        self.approximate = DEFAULT_APPROXIMATE if approximate is None else approximate
+        self.tables = tables
+        self.bits = bits
+        self.probes = probes
+        self.min_records = min_records
+        self.planes = {}
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.reweighting = False
+        self.file = SidecarFile(history.storage, path)
+        history.listeners.append(self.add)
+
+    def load(self):
+        """Read the cached term counts and index the records logged since"""
+        with self.lock:
+            if self.loaded:
+                return
+            self.reset()
+            total = len(self.history)
+            if self.read_terms(total):
+                new = islice(self.history.iter_from(self.documents), total - self.documents)
+                self.file.append(b"".join(self.index_record(record) for record in new))
+                self.file.write()
+            else:
+                self.rebuild()
+            self.update_norms()
+            if self.buckets is not None:
+                self.fill_buckets()
+            self.loaded = True
+
+    def read_terms(self, total):
+        """Index the term counts in path; False if they do not fit a history of total records"""
+        if not os.path.exists(self.path):
+            return True
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if self.documents == total:
+                    # The history was cleared or replaced
+                    return False
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted write
+                    return False
+                if 'record' in entry:
+                    # Older files kept a copy of every record; rewrite without
+                    return False
+                self.index_terms(entry['terms'])
+        return True
+
+    def fill_buckets(self):
+        """Hash every record into the LSH tables using the final idf weights"""
+        with open(self.path, 'rb') as f:
+            for document, line in enumerate(islice(f, self.documents)):
+                for table, key in enumerate(self.bucket_keys(self.weights(json.loads(line)['terms']))):
+                    self.buckets[table].setdefault(key, array('I')).append(document)
+
+    def reset(self):
+        self.vocabulary = {}
+        self.terms = []
+        self.document_frequency = array('I')
+        self.postings = []
+        self.documents = 0
+        self.norms = array('d')
+        self.weighted_count = 0
+        self.buckets = [{} for _ in range(self.tables)] if self.approximate else None
+        self.matrix = None
+
+    def rebuild(self):
+        self.reset()
+        self.file.replace(self.index_record(record) for record in self.history)
+
+    def index_record(self, record):
+        """Index a record and return its line for the term cache"""
+        terms = Counter(tokenize(record.get('user_input')))
+        self.index_terms(terms)
+        return json.dumps({"terms": terms}, ensure_ascii=False).encode('utf-8') + b"\n"
+
+    def index_terms(self, terms):
+        for term, count in terms.items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.postings)
+                self.terms.append(term)
+                self.postings.append((array('I'), array('f')))
+                self.document_frequency.append(0)
+            documents, counts = self.postings[term_id]
+            documents.append(self.documents)
+            counts.append(count)
+            self.document_frequency[term_id] += 1
+        weights = self.weights(terms)
+        # While loading, buckets are filled afterwards with the final idf
+        if self.buckets is not None and self.loaded:
+            for table, key in enumerate(self.bucket_keys(weights)):
+                self.buckets[table].setdefault(key, array('I')).append(self.documents)
+        self.documents += 1
+        self.norms.append(math.sqrt(sum(weight ** 2 for weight in weights.values())))
+
+    def idf(self, term_id):
+        total = self.documents
+        return math.log((1 + total) / (1 + self.document_frequency[term_id])) + 1
+
+    def weights(self, terms):
+        """TF-IDF weight of every known term, keyed by term ID"""
+        weights = {}
+        for term, count in terms.items():
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                weights[term_id] = count * self.idf(term_id)
+        return weights
+
+    def plane(self, term_id):
+        """Random projection components of a term, derived from the term itself"""
+        plane = self.planes.get(term_id)
+        if plane is None:
+            term = self.terms[term_id]
+            seed = zlib.crc32(term.encode('utf-8'))
+            plane = self.planes[term_id] = np.random.default_rng(seed).standard_normal(self.tables * self.bits)
+        return plane
+
+    def project(self, weights):
+        projection = np.zeros(self.tables * self.bits)
+        for term_id, weight in weights.items():
+            projection += weight * self.plane(term_id)
+        return projection.reshape(self.tables, self.bits)
+
+    def bucket_keys(self, weights):
+        """LSH bucket of a weighted vector in each table"""
+        return ((self.project(weights) > 0) @ (1 << np.arange(self.bits))).tolist()
+
+    def probe_keys(self, weights):
+        """Buckets to look up per table: the query's own and its nearest neighbours"""
+        projection = self.project(weights)
+        keys = ((projection > 0) @ (1 << np.arange(self.bits))).tolist()
+        uncertain = np.argsort(np.abs(projection), axis=1)[:, :self.probes]
+        return [[key] + [key ^ (1 << int(bit)) for bit in bits] for key, bits in zip(keys, uncertain)]
+
+    def add(self, records):
+        """Index newly stored records (called by the history after extend)"""
+        with self.lock:
+            if not self.loaded:
+                # load() indexes them from the history
+                return
+            self.file.append(b"".join(self.index_record(record) for record in records))
+            if not self.reweighting and self.documents > self.weighted_count * (1 + REWEIGHT_GROWTH):
+                self.reweighting = True
+                threading.Thread(target=self.update_norms, name="similarity-reweight", daemon=True).start()
+
+    def update_norms(self):
+        """Recompute every document norm with the current idf weights"""
+        try:
+            with self.lock:
+                total = self.documents
+                term_ids = list(range(len(self.postings)))
+            squares = np.zeros(total)
+            for term_id in term_ids:
+                with self.lock:
+                    documents = np.array(self.postings[term_id][0])
+                    counts = np.array(self.postings[term_id][1], dtype=np.float64)
+                    weight = math.log((1 + total) / (1 + self.document_frequency[term_id])) + 1
+                keep = documents < total
+                np.add.at(squares, documents[keep], (counts[keep] * weight) ** 2)
+            with self.lock:
+                norms = array('d', np.sqrt(squares).tobytes())
+                # Records added meanwhile keep the norms computed when they were added
+                norms.extend(self.norms[total:])
+                self.norms = norms
+                self.weighted_count = total
+        finally:
+            self.reweighting = False
+
+    def search(self, text, top_k=3, min_similarity=0.1, approximate=None):
+        """Top-k indexed records by cosine similarity of their input to text
+
+        approximate=True (or the index default) scores only LSH candidates;
+        it needs an index created with approximate enabled, and smaller
+        indexes than min_records are searched exactly anyway.
+        """
+        self.load()
+        if approximate is None:
+            approximate = self.approximate
+        with self.lock:
+            weights = self.weights(Counter(tokenize(text)))
+            if not weights:
+                return []
+            query_norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+
+            if approximate and self.buckets is not None and self.documents >= self.min_records:
+                candidates, scores = self.score_buckets(weights)
+            else:
+                candidates, scores = self.score_postings(weights)
+            if not len(candidates):
+                return []
+            norms = np.frombuffer(self.norms, dtype=np.float64)[candidates]
+            similarities = scores / (norms * query_norm)
+
+            if len(similarities) > top_k:
+                best = np.argpartition(-similarities, top_k)[:top_k]
+            else:
+                best = np.arange(len(similarities))
+            best = best[np.argsort(-similarities[best])]
+            hits = [(int(candidates[position]), similarities[position]) for position in best
+                    if similarities[position] > min_similarity]
+        return self.read_results([hits])[0]
+
+    def search_batch(self, texts, top_k=3, min_similarity=0.1):
+        """search() for many texts with one sparse matrix product (exact path)"""
+        from scipy import sparse
+        self.load()
+        queries = [Counter(tokenize(text)) for text in texts]
+        with self.lock:
+            idf = self.idf_vector()
+            rows, columns, counts = [], [], []
+            for row, query in enumerate(queries):
+                for term, count in query.items():
+                    term_id = self.vocabulary.get(term)
+                    if term_id is not None:
+                        rows.append(row)
+                        columns.append(term_id)
+                        counts.append(count)
+            counts = np.array(counts, dtype=np.float64)
+            columns = np.array(columns, dtype=np.int64)
+            weights = sparse.csr_matrix((counts * idf[columns], (rows, columns)),
+                                        shape=(len(queries), len(self.postings)))
+            query_norms = np.sqrt(weights.multiply(weights).sum(axis=1)).A1
+            query_norms[query_norms == 0] = 1
+
+            # (query x term) . (term x record): every query against every record at once
+            scores = (weights.multiply(idf)).tocsr() @ self.term_matrix()
+            scores = scores.tocsr()
+            document_norms = np.frombuffer(self.norms, dtype=np.float64)
+
+            batch = []
+            for row in range(len(queries)):
+                start, end = scores.indptr[row], scores.indptr[row + 1]
+                documents = scores.indices[start:end]
+                similarities = scores.data[start:end] / (document_norms[documents] * query_norms[row])
+                if len(similarities) > top_k:
+                    best = np.argpartition(-similarities, top_k)[:top_k]
+                else:
+                    best = np.arange(len(similarities))
+                best = best[np.argsort(-similarities[best])]
+                batch.append([(int(documents[position]), similarities[position])
+                              for position in best if similarities[position] > min_similarity])
+        return self.read_results(batch)
+
+    def idf_vector(self):
+        total = self.documents
+        document_frequency = np.frombuffer(self.document_frequency, dtype=np.uint32)
+        return np.log((1 + total) / (1 + document_frequency)) + 1
+
+    def term_matrix(self):
+        """Raw counts as a sparse (term x record) matrix, cached until records are added"""
+        from scipy import sparse
+        shape = (len(self.postings), self.documents)
+        if self.matrix is None or self.matrix.shape != shape:
+            lengths = [len(documents) for documents, _ in self.postings]
+            indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=indptr[1:])
+            indices = np.concatenate([np.array(documents, dtype=np.int64) for documents, _ in self.postings] or [[]])
+            data = np.concatenate([np.array(counts, dtype=np.float64) for _, counts in self.postings] or [[]])
+            self.matrix = sparse.csr_matrix((data, indices, indptr), shape=shape)
+        return self.matrix
+
+    def read_results(self, batch):
+        """Turn lists of (record position, similarity) into result dicts, reading each record"""
+        positions = sorted({document for hits in batch for document, _ in hits})
+        records = dict(zip(positions, self.history.records_at(positions)))
+        return [[{'conversation': records[document], 'similarity': float(similarity)}
+                 for document, similarity in hits] for hits in batch]
+
+    def score_postings(self, weights):
+        """Exact path: dot products with every record sharing a query term"""
+        documents = np.concatenate([np.array(self.postings[term_id][0]) for term_id in weights])
+        contributions = []
+        for term_id, query_weight in weights.items():
+            counts = np.array(self.postings[term_id][1], dtype=np.float64)
+            contributions.append(counts * self.idf(term_id) * query_weight)
+        candidates, positions = np.unique(documents, return_inverse=True)
+        return candidates, np.bincount(positions, weights=np.concatenate(contributions))
+
+    def score_buckets(self, weights):
+        """Approximate path: dot products with the records in the query's LSH buckets"""
+        found = [self.buckets[table].get(key)
+                 for table, keys in enumerate(self.probe_keys(weights)) for key in keys]
+        found = [np.frombuffer(documents, dtype=np.uint32) for documents in found if documents]
+        if not found:
+            return np.array([], dtype=np.int64), np.array([])
+        candidates = np.unique(np.concatenate(found))
+        scores = np.zeros(len(candidates))
+        for term_id, query_weight in weights.items():
+            # Postings are in record order, so candidates are found by bisection
+            # (zero-copy views; appends wait for the lock held by search)
+            documents = np.frombuffer(self.postings[term_id][0], dtype=np.uint32)
+            positions = np.searchsorted(documents, candidates)
+            inside = positions < len(documents)
+            hits = np.zeros(len(candidates), dtype=bool)
+            hits[inside] = documents[positions[inside]] == candidates[inside]
+            counts = np.frombuffer(self.postings[term_id][1], dtype=np.float32)
+            scores[hits] += counts[positions[hits]] * self.idf(term_id) * query_weight
+        return candidates, scores
@@ -1,8 +1,9 @@
 from flask import Flask, render_template, request, jsonify
-import re
 import random
 import datetime
 import json
+from pattern_matcher import PatternMatcher
+from spelling import DEFAULT_SPELLING
 
 app = Flask(__name__)
 
@@ -117,6 +118,10 @@ class CustomAIChatbot:
         ]
         
         self.context_memory = []
+        
+        # All patterns compiled into one matcher; first match in dict order wins,
+        # retried with misspelled rule words corrected if AIBD_SPELLING=1
+        self.pattern_matcher = PatternMatcher(self.conversation_patterns, spelling=DEFAULT_SPELLING)
     
     def get_response(self, user_input):
         user_input_lower = user_input.lower()
@@ -127,10 +132,10 @@ class CustomAIChatbot:
             self.context_memory.pop(0)
         
         # Check for patterns
-        for pattern, responses in self.conversation_patterns.items():
-            if re.search(pattern, user_input_lower):
-                response = random.choice(responses)
-                return self.add_personality(response, user_input_lower)
+        pattern = self.pattern_matcher.match(user_input_lower)
+        if pattern is not None:
+            response = random.choice(self.conversation_patterns[pattern])
+            return self.add_personality(response, user_input_lower)
         
         # If no pattern matches, use fallback with context awareness
         return self.contextual_fallback(user_input_lower)
@@ -0,0 +1,124 @@
+"""
+AI-BD Spelling Index
+Symmetric-delete (SymSpell) correction of misspelled words against a known vocabulary
+"""
+
+import os
+from functools import lru_cache
+from itertools import combinations
+
+# Correction is opt-in (AIBD_SPELLING=1): it can turn a correctly spelled
+# word into a rule or keyword word ("held" -> "help")
+DEFAULT_SPELLING = os.environ.get("AIBD_SPELLING") == "1"
+
+# Word list (one word per line, e.g. /usr/share/dict/words) whose words are
+# never corrected
+LEXICON_FILE = os.environ.get("AIBD_LEXICON")
+
+# Edits allowed for a word of a given length: none below 4 letters (too many
+# short words are one edit apart), one up to 7, then MAX_DISTANCE.  Without
+# a lexicon to tell real words from typos, none below 5 letters and one up
+# to 8 ("food", "game" and "lime" are one edit from "good", "name", "time")
+MAX_DISTANCE = 2
+# Only the first letters are indexed, which bounds the deletes per word
+PREFIX_LENGTH = 7
+
+
+def allowed_distance(word, max_distance=MAX_DISTANCE, strict=False):
+    if len(word) < (5 if strict else 4):
+        return 0
+    return min(max_distance, 1 if len(word) < (9 if strict else 8) else 2)
+
+
+@lru_cache(maxsize=None)
+def load_lexicon(path):
+    """Lowercased words of a word list file, or an empty set without one"""
+    if not path:
+        return frozenset()
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return frozenset(line.strip().lower() for line in f if line.strip())
+
+
+def deletes(word, distance):
+    """Every string made by removing up to distance characters from word"""
+    found = {word}
+    for removed in range(1, min(distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), removed):
+            found.add("".join(char for i, char in enumerate(word) if i not in positions))
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein (optimal string alignment) distance, or limit + 1 if above limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+class SpellingIndex:
+    """Known words indexed by their deletes, for constant-time correction
+
+    Every word is stored under each string obtained by deleting up to
+    ``max_distance`` characters from its first ``prefix_length`` letters.
+    Two words within that many edits share at least one such delete, so a
+    lookup only generates the deletes of the input (a bounded number) and
+    checks the few words stored under them, whatever the vocabulary size.
+
+    Words of ``lexicon`` (by default the AIBD_LEXICON word list) are real
+    words and left alone; without a lexicon only longer words are corrected.
+    """
+
+    def __init__(self, words=(), max_distance=MAX_DISTANCE, prefix_length=PREFIX_LENGTH, lexicon=None):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.lexicon = load_lexicon(LEXICON_FILE) if lexicon is None else lexicon
+        self.counts = {}
+        self.by_delete = {}
+        for word in words:
+            self.add(word)
+
+    def __contains__(self, word):
+        return word in self.counts
+
+    def add(self, word, count=1):
+        """Add a word to the vocabulary (count breaks ties between corrections)"""
+        if word in self.counts:
+            self.counts[word] += count
+            return
+        self.counts[word] = count
+        for key in deletes(word[:self.prefix_length], self.max_distance):
+            self.by_delete.setdefault(key, []).append(word)
+
+    def correct(self, word):
+        """The closest known word to word (most frequent on ties), or word itself"""
+        if word in self.counts or word in self.lexicon:
+            return word
+        limit = allowed_distance(word, self.max_distance, strict=not self.lexicon)
+        if not limit:
+            return word
+
+        best, best_key = word, None
+        seen = set()
+        for key in deletes(word[:self.prefix_length], limit):
+            for candidate in self.by_delete.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, limit)
+                if distance <= limit:
+                    candidate_key = (distance, -self.counts[candidate], candidate)
+                    if best_key is None or candidate_key < best_key:
+                        best, best_key = candidate, candidate_key
+        return best
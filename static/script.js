@@ -420,8 +420,13 @@ async function retrainModel() {
             }
         });
         
-        const data = await response.json();
-        if (data.success) {
+        let data = await response.json();
+        // Servers with background retraining answer with a job to poll
+        while (data.success && (data.status === 'queued' || data.status === 'running')) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            data = await (await fetch(`/retrain/${data.job_id || data.id}`)).json();
+        }
+        if (data.success && data.status !== 'failed') {
             window.chatbot.showTrainingNotification('AI model retrained successfully! 🚀');
             window.chatbot.refreshTrainingStats();
         } else {
@@ -0,0 +1,1529 @@
+"""
+AI-BD Training Data Storage
+Storage modes used by the trainers to persist conversations, feedback and patterns
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import atexit
+import queue
+import gzip
+import hashlib
+import lzma
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import islice
+from urllib.request import pathname2url
+from compact_store import CompactConversations, plain
+
+# "json" rewrites the whole file on every change (original behaviour),
+# "jsonl" appends one record per change and snapshots periodically,
+# "sqlite" keeps everything in indexed tables in training_data.db,
+# "segmented" splits conversation history into compressed daily segments
+DEFAULT_STORAGE_MODE = os.environ.get("AIBD_STORAGE_MODE", "json")
+
+# "direct" writes inside the calling thread (original behaviour),
+# "background" queues writes for a batching writer thread and returns at once,
+# "group" queues them too but waits until the batch holding them is written
+DEFAULT_WRITE_MODE = os.environ.get("AIBD_WRITE_MODE", "direct")
+
+# The web apps keep disk writes off the request thread unless told otherwise
+SERVER_WRITE_MODE = os.environ.get("AIBD_WRITE_MODE", "background")
+
+# Keep JSON-backed conversation lists in memory as compact arrays
+DEFAULT_COMPACT = os.environ.get("AIBD_COMPACT_MEMORY", "0") == "1"
+
+# Number of most recent records the trainers keep in memory
+RECENT_WINDOW = 1000
+
+# New content hashes kept in a set before they are merged into the sorted array
+RECENT_HASHES = 65536
+
+# Records per separately compressed block of a closed segment, so a lookup
+# by position decompresses one block instead of the segment up to it
+SEGMENT_BLOCK_RECORDS = 256
+
+# Collections kept by the trainers and their empty values
+COLLECTIONS = {
+    "conversations": [],
+    "feedback": [],
+    "learned_patterns": {}
+}
+
+
+def normalize_input(text):
+    """Normalize user input for exact-match lookups"""
+    return (text or "").strip().lower()
+
+
+def feedback_type(record):
+    """Feedback label of a record: the 1-5 rating bucket or the feedback tag"""
+    rating = record.get('rating')
+    if rating is not None:
+        if rating >= 4:
+            return 'positive'
+        if rating <= 2:
+            return 'negative'
+        return 'neutral'
+    return record.get('feedback')
+
+
+def matches(record, norm_input=None, feedback=None, since=None, until=None):
+    """Check a record against the filters accepted by StorageBackend.query"""
+    if norm_input is not None and normalize_input(record.get('user_input')) != norm_input:
+        return False
+    if feedback is not None:
+        wanted = feedback if isinstance(feedback, (tuple, list, set)) else (feedback,)
+        if feedback_type(record) not in wanted:
+            return False
+    timestamp = record.get('timestamp') or ''
+    if since is not None and timestamp < since:
+        return False
+    if until is not None and timestamp >= until:
+        return False
+    return True
+
+
+def apply_entry(data, entry):
+    """Apply one change to an in-memory collection"""
+    if entry['op'] == 'append':
+        data.append(entry['value'])
+    elif entry['op'] == 'put':
+        data[entry['key']] = entry['value']
+
+
+class StorageBackend:
+    """Interface shared by all storage modes
+
+    A collection is either a list of records (conversations, feedback) or a
+    dict of entries (learned patterns).  ``load`` returns the live in-memory
+    copy; ``append``/``put`` change it and persist the change; ``flush``
+    persists the whole collection after it was changed in bulk.
+
+    Changes are applied in memory by ``change`` and written by ``persist``,
+    so a BackgroundWriter can batch the writes.  ``lock`` guards the
+    in-memory collections and ``io_lock`` the files; when both are needed
+    ``lock`` is taken first.
+
+    A ``read_only`` storage (e.g. a retrain process reading the server's
+    data) loads and reads but never rewrites, snapshots or truncates files.
+    """
+
+    # Whether query() reads from disk and so must see queued writes first
+    queries_disk = False
+
+    def __init__(self, data_dir, read_only=False):
+        self.data_dir = data_dir
+        self.read_only = read_only
+        self.collections = {}
+        self.lock = threading.RLock()
+        self.io_lock = threading.RLock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def load(self, name, default):
+        raise NotImplementedError
+
+    def load_default(self, name, default):
+        """Start a collection from its default value (e.g. after a corrupt file)"""
+        with self.lock:
+            default = self.in_memory(default)
+            self.collections[name] = default
+            return default
+
+    def in_memory(self, data):
+        """Representation used in memory for a loaded collection"""
+        return data
+
+    def change(self, name, entry):
+        """Apply a change in memory and return it for persist()"""
+        if self.read_only:
+            raise ValueError(f"Cannot change {name}: storage is read-only")
+        with self.lock:
+            apply_entry(self.collections[name], entry)
+            return (name, entry)
+
+    def append(self, name, record):
+        """Append a record to a list collection and persist it"""
+        with self.lock:
+            self.persist([self.change(name, {'op': 'append', 'value': record})])
+
+    def put(self, name, key, value):
+        """Set a key in a dict collection and persist it"""
+        with self.lock:
+            self.persist([self.change(name, {'op': 'put', 'key': key, 'value': value})])
+
+    def extend(self, name, records):
+        """Append many records to a list collection with a single write"""
+        with self.lock:
+            self.persist([self.change(name, {'op': 'append', 'value': record}) for record in records])
+
+    def update(self, name, entries):
+        """Set many keys in a dict collection with a single write"""
+        with self.lock:
+            self.persist([self.change(name, {'op': 'put', 'key': key, 'value': value})
+                          for key, value in entries.items()])
+
+    def persist(self, changes):
+        """Write a batch of changes that were already applied in memory"""
+        raise NotImplementedError
+
+    def flush(self, name=None):
+        raise NotImplementedError
+
+    def iter_records(self, name, newest_first=False, since=None, until=None, feedback=None):
+        """Yield the records of a list collection, oldest first by default
+
+        ``since``/``until`` bound the ISO timestamp (``until`` is exclusive)
+        and ``feedback`` keeps only the given feedback type(s).
+        """
+        data = self.collections[name]
+        records = (data[i] for i in range(len(data) - 1, -1, -1)) if newest_first else data
+        for record in records:
+            if matches(record, None, feedback, since, until):
+                yield record
+
+    def iter_from(self, name, start):
+        """Yield the records of a list collection from position start on"""
+        data = self.collections[name]
+        for index in range(start, len(data)):
+            yield data[index]
+
+    def records_at(self, name, positions):
+        """Records of a list collection at the given positions (as in iteration order)"""
+        with self.lock:
+            data = self.collections[name]
+            return [dict(data[position]) for position in positions]
+
+    def count(self, name):
+        """Number of records in a list collection"""
+        return len(self.collections[name])
+
+    def feedback_counts(self, name):
+        """Number of records of each feedback type in a list collection"""
+        return Counter(feedback_type(record) for record in self.iter_records(name))
+
+    def query(self, name, norm_input=None, feedback=None, since=None, until=None,
+              newest_first=False, limit=None):
+        """Return records of a list collection matching the given filters"""
+        records = self.iter_records(name, newest_first, since, until, feedback)
+        if norm_input is not None:
+            records = (record for record in records if normalize_input(record.get('user_input')) == norm_input)
+        return list(islice(records, limit))
+
+    def contents_reader(self, name):
+        """Function returning a collection as it is now, to serialize without ``lock``
+
+        Call it with ``lock`` held; the function it returns can run after
+        the lock is released, so requests can keep changing the collection
+        meanwhile.  Records are only appended and dict values only replaced,
+        never changed in place, so this costs a shallow dict copy or just
+        the list length.
+        """
+        data = self.collections[name]
+        if isinstance(data, dict):
+            copy = dict(data)
+            return lambda: copy
+        length = len(data)
+        return lambda: data[:length]
+
+    def after_writes(self, callback):
+        """Call callback once the changes made so far are written (at once here)"""
+        callback()
+
+    def close(self):
+        """Release files or connections held by the storage"""
+        pass
+
+
+class JsonStorage(StorageBackend):
+    """Original storage: one JSON file per collection, rewritten on every change
+
+    With ``compact=True`` list collections are held in memory as
+    CompactConversations instead of a list of dicts.
+    """
+
+    def __init__(self, data_dir, compact=False, read_only=False):
+        super().__init__(data_dir, read_only)
+        self.compact = compact
+
+    def in_memory(self, data):
+        """Representation used in memory for a loaded collection"""
+        if self.compact and isinstance(data, list):
+            return CompactConversations(data)
+        return data
+
+    def json_path(self, name):
+        return os.path.join(self.data_dir, f"{name}.json")
+
+    def read_json(self, name, default):
+        path = self.json_path(name)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return default
+
+    def newer_stores(self, name):
+        """Files of the other storage modes written after <name>.json
+
+        Those modes never update the JSON file, so it is stale once they
+        have been used.
+        """
+        path = self.json_path(name)
+        json_time = os.path.getmtime(path) if os.path.exists(path) else 0
+        candidates = [
+            os.path.join(self.data_dir, f"{name}.snapshot.json"),
+            os.path.join(self.data_dir, f"{name}.jsonl"),
+            os.path.join(self.data_dir, "segments", name, "manifest.json")
+        ]
+        newer = [candidate for candidate in candidates
+                 if os.path.exists(candidate) and os.path.getsize(candidate)
+                 and os.path.getmtime(candidate) > json_time]
+        db_file = os.path.join(self.data_dir, "training_data.db")
+        if os.path.exists(db_file) and max(os.path.getmtime(db_file + suffix) for suffix in ("", "-wal")
+                                           if os.path.exists(db_file + suffix)) > json_time:
+            conn = sqlite3.connect(db_file)
+            try:
+                table = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+                if table and conn.execute(f'SELECT EXISTS (SELECT 1 FROM "{name}")').fetchone()[0]:
+                    newer.append(db_file)
+            finally:
+                conn.close()
+        return newer
+
+    def load(self, name, default):
+        """Load a collection (a list or a dict) and keep it as the live copy
+
+        Refuses to load a JSON file that another storage mode has superseded.
+        """
+        newer = self.newer_stores(name)
+        if newer:
+            raise ValueError(f"{self.json_path(name)} is older than {', '.join(newer)}; "
+                             f"set AIBD_STORAGE_MODE to the mode that wrote them")
+        with self.lock:
+            data = self.in_memory(self.read_json(name, default))
+            self.collections[name] = data
+            return data
+
+    def persist(self, changes):
+        """Rewrite each changed collection once for the whole batch"""
+        self.flush_collections(list(dict.fromkeys(name for name, _ in changes)))
+
+    def flush(self, name=None):
+        """Write the full contents of one or all collections"""
+        self.flush_collections([name] if name else list(self.collections))
+
+    def flush_collections(self, names):
+        with self.lock:
+            readers = {name: self.contents_reader(name) for name in names}
+        # Serialized without the lock, so queued changes can still be applied
+        with self.io_lock:
+            for name, contents in readers.items():
+                text = json.dumps(contents(), indent=2, ensure_ascii=False, default=plain)
+                with open(self.json_path(name), 'w', encoding='utf-8') as f:
+                    f.write(text)
+
+
+class JsonlStorage(JsonStorage):
+    """Append-only JSON Lines log per collection with periodic snapshots
+
+    Every change is one line appended to ``<name>.jsonl``.  Every
+    ``snapshot_every`` changes the collection is written to
+    ``<name>.snapshot.json`` together with the sequence number of the last
+    change it contains, and the log is truncated.  Loading reads the snapshot
+    (or the original ``<name>.json`` when there is none yet) and replays the
+    log entries newer than the snapshot, so a crash between writing the
+    snapshot and truncating the log never applies a change twice.
+    """
+
+    def __init__(self, data_dir, snapshot_every=1000, fsync=False, compact=False, read_only=False):
+        super().__init__(data_dir, compact, read_only)
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.seq = {}
+        self.pending = {}
+        self.log_files = {}
+
+    def log_path(self, name):
+        return os.path.join(self.data_dir, f"{name}.jsonl")
+
+    def snapshot_path(self, name):
+        return os.path.join(self.data_dir, f"{name}.snapshot.json")
+
+    def load(self, name, default):
+        """Load the latest snapshot and replay the log on top of it"""
+        with self.lock:
+            seq = 0
+            if os.path.exists(self.snapshot_path(name)):
+                with open(self.snapshot_path(name), 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                data = snapshot['data']
+                seq = snapshot['seq']
+            else:
+                data = self.read_json(name, default)
+
+            replayed = 0
+            if os.path.exists(self.log_path(name)):
+                with open(self.log_path(name), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # A torn final line from an interrupted write
+                            continue
+                        if entry['seq'] <= seq:
+                            continue
+                        apply_entry(data, entry)
+                        seq = entry['seq']
+                        replayed += 1
+
+            data = self.in_memory(data)
+            self.collections[name] = data
+            self.seq[name] = seq
+            self.pending[name] = replayed
+            if replayed >= self.snapshot_every and not self.read_only:
+                self.snapshot(name)
+            return data
+
+    def load_default(self, name, default):
+        """Start a collection from its default value (e.g. after a corrupt file)"""
+        with self.lock:
+            default = self.in_memory(default)
+            self.collections[name] = default
+            self.seq.setdefault(name, 0)
+            self.pending[name] = 0
+            return default
+
+    def change(self, name, entry):
+        """Number the change when it is applied so snapshots know what they hold"""
+        with self.lock:
+            self.seq[name] += 1
+            entry['seq'] = self.seq[name]
+            return super().change(name, entry)
+
+    def persist(self, changes):
+        """Append one line per change, flushing each log file once per batch"""
+        with self.io_lock:
+            touched = {}
+            for name, entry in changes:
+                if name not in self.log_files:
+                    self.log_files[name] = open(self.log_path(name), 'a', encoding='utf-8')
+                self.log_files[name].write(json.dumps(entry, ensure_ascii=False, default=plain) + "\n")
+                touched[name] = self.log_files[name]
+                self.pending[name] += 1
+            for f in touched.values():
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        for name in touched:
+            if self.pending[name] >= self.snapshot_every:
+                self.snapshot(name)
+
+    def snapshot(self, name):
+        """Write the collection with its sequence number and truncate the log
+
+        Log lines for changes already applied in memory but written after
+        the snapshot carry a seq the snapshot covers, so replay skips them.
+        """
+        self.lock.acquire()
+        self.io_lock.acquire()
+        try:
+            try:
+                seq = self.seq[name]
+                contents = self.contents_reader(name)
+            finally:
+                self.lock.release()
+            # Serialized without the lock, so queued changes can still be applied
+            text = json.dumps({'seq': seq, 'data': contents()}, ensure_ascii=False, default=plain)
+            tmp_path = self.snapshot_path(name) + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path(name))
+            if name in self.log_files:
+                self.log_files.pop(name).close()
+            open(self.log_path(name), 'w', encoding='utf-8').close()
+            self.pending[name] = 0
+        finally:
+            self.io_lock.release()
+
+    def flush(self, name=None):
+        """Snapshot one or all collections (used after bulk changes)"""
+        with self.lock:
+            names = [name] if name else list(self.collections)
+            for collection in names:
+                self.snapshot(collection)
+
+    def close(self):
+        """Close open log files"""
+        with self.io_lock:
+            for f in self.log_files.values():
+                f.close()
+            self.log_files = {}
+
+
+class SqliteStorage(StorageBackend):
+    """SQLite storage (WAL journal) with one indexed table per collection
+
+    List collections are stored with the normalized user input, timestamp
+    and feedback type in their own indexed columns so ``query`` is answered
+    by the database instead of a scan over the in-memory list.
+    """
+
+    queries_disk = True
+
+    def __init__(self, data_dir, db_name="training_data.db", read_only=False):
+        super().__init__(data_dir, read_only)
+        self.db_file = os.path.join(data_dir, db_name)
+        self.list_tables = set()
+        if read_only:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_file))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def table(self, name):
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return f'"{name}"'
+
+    def create_list_table(self, name):
+        table = self.table(name)
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                norm_input TEXT,
+                feedback TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS "{name}_norm_input" ON {table} (norm_input);
+            CREATE INDEX IF NOT EXISTS "{name}_timestamp" ON {table} (timestamp);
+            CREATE INDEX IF NOT EXISTS "{name}_feedback" ON {table} (feedback);
+        """)
+
+    def create_dict_table(self, name):
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table(name)} (key TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+
+    def row(self, record):
+        return (
+            record.get('timestamp'),
+            normalize_input(record.get('user_input')),
+            feedback_type(record),
+            json.dumps(record, ensure_ascii=False, default=plain)
+        )
+
+    def load(self, name, default):
+        """Create the table if needed and load dict collections
+
+        List collections stay in the database and are read through
+        ``iter_records``/``query``; their in-memory copy is left empty.
+        """
+        with self.lock, self.io_lock:
+            table = self.table(name)
+            if isinstance(default, dict):
+                if not self.read_only:
+                    self.create_dict_table(name)
+                rows = self.conn.execute(f"SELECT key, data FROM {table}")
+                data = {key: json.loads(value) for key, value in rows}
+            else:
+                if not self.read_only:
+                    self.create_list_table(name)
+                self.list_tables.add(name)
+                data = []
+            self.conn.commit()
+            self.collections[name] = data
+            return data
+
+    def load_default(self, name, default):
+        with self.lock, self.io_lock:
+            if isinstance(default, dict):
+                self.create_dict_table(name)
+            else:
+                self.create_list_table(name)
+                self.list_tables.add(name)
+            return super().load_default(name, default)
+
+    def change(self, name, entry):
+        """Rows of list collections only live in the database"""
+        if name in self.list_tables:
+            return (name, entry)
+        return super().change(name, entry)
+
+    def persist(self, changes):
+        """Write the whole batch in one transaction"""
+        with self.io_lock:
+            for name, entry in changes:
+                if entry['op'] == 'append':
+                    self.conn.execute(
+                        f"INSERT INTO {self.table(name)} (timestamp, norm_input, feedback, data) VALUES (?, ?, ?, ?)",
+                        self.row(entry['value'])
+                    )
+                else:
+                    self.conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table(name)} (key, data) VALUES (?, ?)",
+                        (entry['key'], json.dumps(entry['value'], ensure_ascii=False, default=plain))
+                    )
+            self.conn.commit()
+
+    def flush(self, name=None):
+        """Rewrite dict tables from memory; list rows are already written"""
+        with self.lock, self.io_lock:
+            names = [name] if name else list(self.collections)
+            for collection in names:
+                if collection in self.list_tables:
+                    continue
+                table = self.table(collection)
+                self.conn.execute(f"DELETE FROM {table}")
+                self.conn.executemany(
+                    f"INSERT INTO {table} (key, data) VALUES (?, ?)",
+                    ((key, json.dumps(value, ensure_ascii=False, default=plain))
+                     for key, value in self.collections[collection].items())
+                )
+            self.conn.commit()
+
+    def select(self, name, norm_input=None, feedback=None, since=None, until=None,
+               newest_first=False, limit=None):
+        """Build the SELECT for the given filters on the indexed columns"""
+        clauses = []
+        params = []
+        if norm_input is not None:
+            clauses.append("norm_input = ?")
+            params.append(norm_input)
+        if feedback is not None:
+            wanted = list(feedback) if isinstance(feedback, (tuple, list, set)) else [feedback]
+            labels = [label for label in wanted if label is not None]
+            clause = f"feedback IN ({', '.join('?' for _ in labels)})"
+            if None in wanted:
+                clause = f"({clause} OR feedback IS NULL)"
+            clauses.append(clause)
+            params.extend(labels)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+
+        sql = f"SELECT data FROM {self.table(name)}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC" if newest_first else " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    def query(self, name, norm_input=None, feedback=None, since=None, until=None,
+              newest_first=False, limit=None):
+        """Answer the query from the indexed columns"""
+        sql, params = self.select(name, norm_input, feedback, since, until, newest_first, limit)
+        with self.io_lock:
+            return [json.loads(value) for value, in self.conn.execute(sql, params)]
+
+    def iter_records(self, name, newest_first=False, since=None, until=None, feedback=None):
+        """Stream matching rows from the database in batches"""
+        sql, params = self.select(name, None, feedback, since, until, newest_first)
+        return self.stream(sql, params)
+
+    def iter_from(self, name, start):
+        """Stream rows from position start on, skipped by the database"""
+        return self.stream(f"SELECT data FROM {self.table(name)} ORDER BY id LIMIT -1 OFFSET ?", [start])
+
+    def stream(self, sql, params):
+        with self.io_lock:
+            cursor = self.conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchmany(1000)
+        while rows:
+            for value, in rows:
+                yield json.loads(value)
+            with self.io_lock:
+                rows = cursor.fetchmany(1000)
+
+    def records_at(self, name, positions):
+        """Rows looked up by id: list rows are only appended, so ids run on from the first"""
+        table = self.table(name)
+        positions = list(positions)
+        rows = {}
+        with self.io_lock:
+            first = self.conn.execute(f"SELECT MIN(id) FROM {table}").fetchone()[0] or 1
+            ids = sorted({first + position for position in positions})
+            # In chunks below SQLite's limit on bound parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                sql = f"SELECT id, data FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})"
+                rows.update(self.conn.execute(sql, chunk))
+        return [json.loads(rows[first + position]) for position in positions]
+
+    def count(self, name):
+        with self.io_lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {self.table(name)}").fetchone()[0]
+
+    def feedback_counts(self, name):
+        with self.io_lock:
+            rows = self.conn.execute(f"SELECT feedback, COUNT(*) FROM {self.table(name)} GROUP BY feedback")
+            return Counter(dict(rows.fetchall()))
+
+    def close(self):
+        with self.io_lock:
+            self.conn.close()
+
+
+class SegmentedStorage(JsonlStorage):
+    """Conversation history split into daily (or size-capped) segments
+
+    List collections are written to a hot ``.jsonl`` segment under
+    ``segments/<name>/``.  When a record for a new day arrives, or the hot
+    segment grows past ``max_segment_bytes``, the hot segment is closed:
+    compressed with gzip (or lzma) and added to ``manifest.json`` together
+    with its record count, time range and feedback counts.  Only the hot
+    segment is loaded into memory; closed segments are read lazily by
+    ``iter_records`` and counts come from the manifest.  Dict collections
+    are kept as in JsonlStorage.
+    """
+
+    def __init__(self, data_dir, compression="gzip", max_segment_bytes=64 * 1024 * 1024,
+                 rotate_daily=True, snapshot_every=1000, fsync=False, compact=False, read_only=False):
+        super().__init__(data_dir, snapshot_every=snapshot_every, fsync=fsync, compact=compact,
+                         read_only=read_only)
+        if compression not in ("gzip", "lzma"):
+            raise ValueError(f"Unknown compression: {compression}")
+        self.compression = compression
+        self.max_segment_bytes = max_segment_bytes
+        self.rotate_daily = rotate_daily
+        self.manifests = {}
+        self.hot_files = {}
+        # Closed segment path -> compressed offsets of its blocks (read on first lookup)
+        self.block_offsets = {}
+
+    def segment_dir(self, name):
+        return os.path.join(self.data_dir, "segments", name)
+
+    def manifest_path(self, name):
+        return os.path.join(self.segment_dir(name), "manifest.json")
+
+    def save_manifest(self, name):
+        path = self.manifest_path(name)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.manifests[name], f, indent=2, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def open_compressed(self, path, mode):
+        opener = lzma.open if path.endswith(".xz") else gzip.open
+        return opener(path, mode, encoding='utf-8')
+
+    def read_lines(self, path, compressed=False):
+        if not os.path.exists(path):
+            return
+        f = self.open_compressed(path, 'rt') if compressed else open(path, 'r', encoding='utf-8')
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A torn final line from an interrupted write
+                    continue
+
+    def load(self, name, default):
+        """Load only the hot segment of a list collection"""
+        if isinstance(default, dict):
+            return super().load(name, default)
+        if self.read_only and not os.path.exists(self.manifest_path(name)):
+            # Not converted yet, and converting would write: read it as JSONL
+            return super().load(name, default)
+
+        with self.lock, self.io_lock:
+            os.makedirs(self.segment_dir(name), exist_ok=True)
+            self.seq.setdefault(name, 0)
+            self.pending[name] = 0
+            if os.path.exists(self.manifest_path(name)):
+                with open(self.manifest_path(name), 'r', encoding='utf-8') as f:
+                    self.manifests[name] = json.load(f)
+            else:
+                self.manifests[name] = {'segments': [], 'hot': None, 'hot_day': None}
+                # First start in this mode: existing data becomes the first closed segment
+                legacy = super().load(name, [])
+                if legacy:
+                    self.write_segment(name, legacy)
+                self.save_manifest(name)
+
+            hot = self.manifests[name]['hot']
+            data = list(self.read_lines(os.path.join(self.segment_dir(name), hot))) if hot else []
+            data = self.in_memory(data)
+            self.collections[name] = data
+            return data
+
+    def is_segmented(self, name):
+        return name in self.manifests
+
+    def write_segment(self, name, records):
+        """Write records as a closed, compressed segment and register it
+
+        Every SEGMENT_BLOCK_RECORDS records are compressed separately (as
+        concatenated gzip members or xz streams, still one valid file) and
+        their offsets are kept in ``<segment>.idx``, so ``records_at`` can
+        seek to the block it needs.
+        """
+        manifest = self.manifests[name]
+        extension = ".xz" if self.compression == "lzma" else ".gz"
+        compress = lzma.compress if self.compression == "lzma" else gzip.compress
+        first_day = (records[0].get('timestamp') or '')[:10].replace('-', '') or "undated"
+        filename = f"{len(manifest['segments']):06d}-{first_day}.jsonl{extension}"
+        path = os.path.join(self.segment_dir(name), filename)
+        offsets = array('Q')
+        with open(path, 'wb') as f:
+            for start in range(0, len(records), SEGMENT_BLOCK_RECORDS):
+                offsets.append(f.tell())
+                lines = [json.dumps(record, ensure_ascii=False, default=plain) + "\n"
+                         for record in records[start:start + SEGMENT_BLOCK_RECORDS]]
+                f.write(compress("".join(lines).encode('utf-8')))
+            offsets.append(f.tell())
+        with open(path + ".idx", 'wb') as f:
+            offsets.tofile(f)
+        timestamps = [record.get('timestamp') or '' for record in records]
+        manifest['segments'].append({
+            'file': filename,
+            'count': len(records),
+            'first_timestamp': min(timestamps),
+            'last_timestamp': max(timestamps),
+            'feedback': dict(Counter(feedback_type(record) for record in records)),
+            'block_records': SEGMENT_BLOCK_RECORDS
+        })
+
+    def needs_rotation(self, name, record):
+        manifest = self.manifests[name]
+        if not manifest['hot']:
+            return False
+        day = (record.get('timestamp') or '')[:10]
+        if self.rotate_daily and day and manifest['hot_day'] and day != manifest['hot_day']:
+            return True
+        hot_path = os.path.join(self.segment_dir(name), manifest['hot'])
+        return os.path.exists(hot_path) and os.path.getsize(hot_path) >= self.max_segment_bytes
+
+    def rotate(self, name):
+        """Close the hot segment and drop its records from memory"""
+        with self.lock, self.io_lock:
+            manifest = self.manifests[name]
+            if not manifest['hot']:
+                return
+            if name in self.hot_files:
+                self.hot_files.pop(name).close()
+            hot_path = os.path.join(self.segment_dir(name), manifest['hot'])
+            records = list(self.read_lines(hot_path))
+            if records:
+                self.write_segment(name, records)
+            manifest['hot'] = None
+            manifest['hot_day'] = None
+            self.save_manifest(name)
+            os.remove(hot_path)
+            # The in-memory hot list starts with exactly the records just closed
+            del self.collections[name][:len(records)]
+
+    def hot_file(self, name, record):
+        manifest = self.manifests[name]
+        if not manifest['hot']:
+            day = (record.get('timestamp') or '')[:10]
+            manifest['hot'] = f"{len(manifest['segments']):06d}-{day.replace('-', '') or 'undated'}.jsonl"
+            manifest['hot_day'] = day or None
+            self.save_manifest(name)
+        if name not in self.hot_files:
+            path = os.path.join(self.segment_dir(name), manifest['hot'])
+            self.hot_files[name] = open(path, 'a', encoding='utf-8')
+        return self.hot_files[name]
+
+    def persist(self, changes):
+        """Append list records to the hot segment, rotating when it is full"""
+        others = []
+        touched = {}
+        for name, entry in changes:
+            if not self.is_segmented(name):
+                others.append((name, entry))
+                continue
+            record = entry['value']
+            if self.needs_rotation(name, record):
+                if name in touched:
+                    touched.pop(name).flush()
+                self.rotate(name)
+            with self.io_lock:
+                f = self.hot_file(name, record)
+                f.write(json.dumps(record, ensure_ascii=False, default=plain) + "\n")
+                touched[name] = f
+        with self.io_lock:
+            for f in touched.values():
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        if others:
+            super().persist(others)
+
+    def flush(self, name=None):
+        """Rewrite the hot segment of list collections, snapshot dict collections"""
+        names = [name] if name else list(self.collections)
+        for collection in names:
+            if not self.is_segmented(collection):
+                super().flush(collection)
+                continue
+            with self.lock, self.io_lock:
+                records = self.collections[collection]
+                if not records and not self.manifests[collection]['hot']:
+                    continue
+                self.hot_file(collection, records[0] if records else {})
+                self.hot_files.pop(collection).close()
+                path = os.path.join(self.segment_dir(collection), self.manifests[collection]['hot'])
+                with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False, default=plain) + "\n")
+                os.replace(path + ".tmp", path)
+
+    def segment_may_match(self, segment, since, until, feedback):
+        """Use the manifest to skip segments that cannot hold matching records"""
+        if since is not None and segment['last_timestamp'] < since:
+            return False
+        if until is not None and segment['first_timestamp'] >= until:
+            return False
+        if feedback is not None:
+            wanted = feedback if isinstance(feedback, (tuple, list, set)) else (feedback,)
+            labels = {'null' if label is None else label for label in wanted}
+            if not labels & set(segment['feedback']):
+                return False
+        return True
+
+    def iter_records(self, name, newest_first=False, since=None, until=None, feedback=None):
+        """Yield closed segments lazily from disk, then the hot segment"""
+        if not self.is_segmented(name):
+            yield from super().iter_records(name, newest_first, since, until, feedback)
+            return
+        with self.lock:
+            segments = [segment for segment in self.manifests[name]['segments']
+                        if self.segment_may_match(segment, since, until, feedback)]
+        if newest_first:
+            yield from super().iter_records(name, True, since, until, feedback)
+            for segment in reversed(segments):
+                path = os.path.join(self.segment_dir(name), segment['file'])
+                for record in reversed(list(self.read_lines(path, compressed=True))):
+                    if matches(record, None, feedback, since, until):
+                        yield record
+        else:
+            for segment in segments:
+                path = os.path.join(self.segment_dir(name), segment['file'])
+                for record in self.read_lines(path, compressed=True):
+                    if matches(record, None, feedback, since, until):
+                        yield record
+            yield from super().iter_records(name, False, since, until, feedback)
+
+    def iter_from(self, name, start):
+        """Skip whole closed segments by their manifest counts"""
+        if not self.is_segmented(name):
+            yield from super().iter_from(name, start)
+            return
+        with self.lock:
+            segments = list(self.manifests[name]['segments'])
+        position = 0
+        for segment in segments:
+            if position + segment['count'] > start:
+                path = os.path.join(self.segment_dir(name), segment['file'])
+                yield from islice(self.read_lines(path, compressed=True), max(start - position, 0), None)
+            position += segment['count']
+        yield from super().iter_from(name, max(start - position, 0))
+
+    def read_block(self, path, block):
+        """Lines of one block of a closed segment"""
+        offsets = self.block_offsets.get(path)
+        if offsets is None:
+            offsets = array('Q')
+            with open(path + ".idx", 'rb') as f:
+                offsets.frombytes(f.read())
+            self.block_offsets[path] = offsets
+        with open(path, 'rb') as f:
+            f.seek(offsets[block])
+            data = f.read(offsets[block + 1] - offsets[block])
+        decompress = lzma.decompress if path.endswith(".xz") else gzip.decompress
+        return decompress(data).decode('utf-8').split("\n")
+
+    def records_at(self, name, positions):
+        """Hot records from memory; closed segments are read one block per position wanted
+
+        Segments written before blocks were kept are read up to the last
+        position wanted.
+        """
+        if not self.is_segmented(name):
+            return super().records_at(name, positions)
+        with self.lock:
+            segments = list(self.manifests[name]['segments'])
+            closed = sum(segment['count'] for segment in segments)
+            hot = self.collections[name]
+            found = {position: dict(hot[position - closed]) for position in positions if position >= closed}
+        start = 0
+        for segment in segments:
+            wanted = {position for position in positions if start <= position < start + segment['count']}
+            size = segment.get('block_records')
+            path = os.path.join(self.segment_dir(name), segment['file'])
+            if wanted and size:
+                for block in sorted({(position - start) // size for position in wanted}):
+                    lines = self.read_block(path, block)
+                    for position in wanted:
+                        if (position - start) // size == block:
+                            found[position] = json.loads(lines[(position - start) % size])
+            elif wanted:
+                lines = islice(self.read_lines(path, compressed=True), max(wanted) - start + 1)
+                for position, record in enumerate(lines, start):
+                    if position in wanted:
+                        found[position] = record
+            start += segment['count']
+        return [found[position] for position in positions]
+
+    def count(self, name):
+        """Closed segment counts from the manifest plus the hot segment"""
+        if not self.is_segmented(name):
+            return super().count(name)
+        with self.lock:
+            closed = sum(segment['count'] for segment in self.manifests[name]['segments'])
+            return closed + len(self.collections[name])
+
+    def feedback_counts(self, name):
+        """Closed segment counts from the manifest plus the hot segment"""
+        if not self.is_segmented(name):
+            return super().feedback_counts(name)
+        with self.lock:
+            counts = Counter()
+            for segment in self.manifests[name]['segments']:
+                counts.update({(None if key == 'null' else key): value
+                               for key, value in segment['feedback'].items()})
+            counts.update(feedback_type(record) for record in self.collections[name])
+            return counts
+
+    def close(self):
+        with self.io_lock:
+            for f in self.hot_files.values():
+                f.close()
+            self.hot_files = {}
+        super().close()
+
+
+class BackgroundWriter:
+    """Group-commit writer that takes storage writes off the calling thread
+
+    ``append``/``put`` apply the change in memory right away and queue it.
+    A background thread collects queued changes until ``batch_size`` of
+    them are waiting or ``flush_interval`` seconds have passed since the
+    first one, then writes the batch with a single ``persist`` call.  With
+    ``wait=True`` (the "group" write mode) callers block until their batch
+    is on disk, and a batch is whatever queued up while the previous one was
+    being written; otherwise they return immediately.  The queue is bounded so
+    a stalled disk slows callers down instead of growing memory.
+    ``after_writes`` queues a callback behind the changes, so files kept
+    next to a collection (hash and search indexes) are written by the same
+    thread once the records are.
+    """
+
+    def __init__(self, storage, batch_size=100, flush_interval=0.5, max_queue=10000, wait=False):
+        self.storage = storage
+        self.data_dir = storage.data_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.wait = wait
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.submit_lock = threading.Lock()
+        self.written = threading.Condition()
+        self.queued_count = 0
+        self.written_count = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="storage-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def load(self, name, default):
+        return self.storage.load(name, default)
+
+    def load_default(self, name, default):
+        return self.storage.load_default(name, default)
+
+    def submit(self, name, entries):
+        if self.closed:
+            with self.storage.lock:
+                self.storage.persist([self.storage.change(name, entry) for entry in entries])
+            return
+        # Queue under submit_lock (never taken by the writer thread) so
+        # batches keep the order in which changes were applied
+        with self.submit_lock:
+            for entry in entries:
+                self.queue.put(self.storage.change(name, entry))
+                with self.written:
+                    self.queued_count += 1
+                    ticket = self.queued_count
+        if self.wait and entries:
+            self.wait_for(ticket)
+
+    def append(self, name, record):
+        """Apply now, write with the next batch"""
+        self.submit(name, [{'op': 'append', 'value': record}])
+
+    def put(self, name, key, value):
+        """Apply now, write with the next batch"""
+        self.submit(name, [{'op': 'put', 'key': key, 'value': value}])
+
+    def extend(self, name, records):
+        self.submit(name, [{'op': 'append', 'value': record} for record in records])
+
+    def update(self, name, entries):
+        self.submit(name, [{'op': 'put', 'key': key, 'value': value} for key, value in entries.items()])
+
+    def after_writes(self, callback):
+        """Call callback on the writer thread once the changes queued so far are written"""
+        if self.closed:
+            callback()
+            return
+        with self.submit_lock:
+            self.queue.put((None, callback))
+
+    def wait_for(self, ticket=None):
+        """Block until everything queued so far (or up to ticket) is written"""
+        with self.written:
+            if ticket is None:
+                ticket = self.queued_count
+            while self.written_count < ticket and self.thread.is_alive():
+                self.written.wait(self.flush_interval)
+
+    def flush(self, name=None):
+        """Write queued changes, then flush the storage itself"""
+        self.wait_for()
+        self.storage.flush(name)
+
+    def sync_reads(self):
+        # Disk-backed reads must see changes still sitting in the queue
+        if self.storage.queries_disk and self.written_count < self.queued_count:
+            self.wait_for()
+
+    def query(self, *args, **kwargs):
+        self.sync_reads()
+        return self.storage.query(*args, **kwargs)
+
+    def iter_records(self, *args, **kwargs):
+        self.sync_reads()
+        return self.storage.iter_records(*args, **kwargs)
+
+    def iter_from(self, name, start):
+        self.sync_reads()
+        return self.storage.iter_from(name, start)
+
+    def records_at(self, name, positions):
+        self.sync_reads()
+        return self.storage.records_at(name, positions)
+
+    def count(self, name):
+        self.sync_reads()
+        return self.storage.count(name)
+
+    def feedback_counts(self, name):
+        self.sync_reads()
+        return self.storage.feedback_counts(name)
+
+    def run(self):
+        while True:
+            change = self.queue.get()
+            if change is None:
+                break
+            batch = [change]
+            # Callers blocked on a group commit only batch with what is
+            # already queued; fire-and-forget writes wait for the interval
+            linger = 0 if self.wait else self.flush_interval
+            deadline = time.monotonic() + linger
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        change = self.queue.get(timeout=remaining)
+                    else:
+                        change = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if change is None:
+                    stop = True
+                    break
+                batch.append(change)
+            self.write(batch)
+            if stop:
+                break
+
+    def write(self, batch):
+        changes = [change for change in batch if change[0] is not None]
+        try:
+            if changes:
+                self.storage.persist(changes)
+        except Exception as e:
+            print(f"❌ Error writing training data: {e}")
+        # Callbacks queued with after_writes, each once per batch
+        for callback in dict.fromkeys(callback for name, callback in batch if name is None):
+            try:
+                callback()
+            except Exception as e:
+                print(f"❌ Error writing training data: {e}")
+        with self.written:
+            self.written_count += len(changes)
+            self.written.notify_all()
+
+    def close(self):
+        """Write everything still queued, stop the thread and close the storage"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self.storage.close()
+
+
+def record_hash(record):
+    """64-bit content hash of a record: normalized input, response and timestamp"""
+    content = "\x1f".join((
+        normalize_input(record.get('user_input')),
+        (record.get('bot_response') or '').strip(),
+        record.get('timestamp') or ''
+    ))
+    digest = hashlib.blake2b(content.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class SidecarFile:
+    """Append-only file kept next to a collection, written with its records
+
+    ``append`` only buffers the data and asks the storage to call ``write``
+    once the records stored so far are written: at once for direct writes,
+    on the BackgroundWriter thread otherwise, so the request thread never
+    touches the file.  The file stays open between writes.
+    """
+
+    def __init__(self, storage, path):
+        self.storage = storage
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = []
+        self.file = None
+
+    def append(self, data):
+        if not data:
+            return
+        with self.lock:
+            self.pending.append(data)
+        self.storage.after_writes(self.write)
+
+    def write(self):
+        with self.lock:
+            if not self.pending:
+                return
+            if self.file is None:
+                self.file = open(self.path, 'ab')
+            self.file.writelines(self.pending)
+            self.file.flush()
+            self.pending = []
+
+    def replace(self, chunks):
+        """Rewrite the whole file from chunks, dropping anything still buffered"""
+        with self.lock:
+            self.pending = []
+            if self.file is not None:
+                # Windows cannot replace a file that is open
+                self.file.close()
+                self.file = None
+            temp_file = self.path + ".tmp"
+            with open(temp_file, 'wb') as f:
+                f.writelines(chunks)
+            os.replace(temp_file, self.path)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class ContentIndex:
+    """Persistent set of record hashes used to skip exact duplicates
+
+    ``<name>.hashes`` holds one 8-byte hash per stored record, so its size
+    tells whether it still covers the collection (e.g. after the data was
+    cleared, written without the index, or a crash lost the last hashes);
+    if not it is rebuilt from the records once.  New hashes are written
+    after their records, through a SidecarFile.
+
+    In memory the hashes are a sorted array searched by bisection (8 bytes
+    per record instead of a set entry and an int object), plus a set of the
+    last ``RECENT_HASHES`` added, merged into the array when it fills up.
+    """
+
+    def __init__(self, storage, name):
+        self.file = SidecarFile(storage, os.path.join(storage.data_dir, f"{name}.hashes"))
+        self.lock = threading.Lock()
+        hashes = array('Q')
+        total = storage.count(name)
+        path = self.file.path
+        if os.path.exists(path) and os.path.getsize(path) == total * hashes.itemsize:
+            with open(path, 'rb') as f:
+                hashes.fromfile(f, total)
+        else:
+            hashes.extend(record_hash(record) for record in storage.iter_records(name))
+            self.file.replace([hashes.tobytes()])
+        self.sorted = array('Q', sorted(hashes))
+        self.recent = set()
+        self.unsaved = array('Q')
+
+    def __contains__(self, record):
+        return self.seen(record_hash(record))
+
+    def seen(self, content_hash):
+        if content_hash in self.recent:
+            return True
+        position = bisect_left(self.sorted, content_hash)
+        return position < len(self.sorted) and self.sorted[position] == content_hash
+
+    def merge_recent(self):
+        """Move the recent hashes into the sorted array (called with lock held)"""
+        merged = array('Q')
+        start = 0
+        for content_hash in sorted(self.recent):
+            end = bisect_left(self.sorted, content_hash, start)
+            merged.extend(self.sorted[start:end])
+            merged.append(content_hash)
+            start = end
+        merged.extend(self.sorted[start:])
+        # Array first, so a lookup meanwhile finds the hash in one or the other
+        self.sorted = merged
+        self.recent = set()
+
+    def add_new(self, records):
+        """Remember the records not seen before and return just those (see save)"""
+        fresh = []
+        with self.lock:
+            for record in records:
+                content_hash = record_hash(record)
+                if not self.seen(content_hash):
+                    self.recent.add(content_hash)
+                    self.unsaved.append(content_hash)
+                    fresh.append(record)
+            if len(self.recent) >= RECENT_HASHES:
+                self.merge_recent()
+        return fresh
+
+    def save(self):
+        """Write the hashes added since the last save once their records are stored"""
+        with self.lock:
+            added, self.unsaved = self.unsaved, array('Q')
+        if added:
+            self.file.append(added.tobytes())
+
+
+class ExactResponseIndex:
+    """Latest response per normalized input among the records with the given feedback
+
+    Kept in ``path`` as JSON lines, each with the entries of a batch of new
+    records and how many history records are covered after it, written
+    through a SidecarFile.  A restart reads the file and catches up with
+    the records logged since the last line instead of filtering the whole
+    history again; a file covering more records than the history (cleared
+    or replaced) is rebuilt.  After loading the file is rewritten as one
+    line, so it holds each input once.
+    """
+
+    def __init__(self, history, path, feedback):
+        self.history = history
+        self.feedback = feedback
+        self.file = SidecarFile(history.storage, path)
+        self.lock = threading.Lock()
+        total = len(history)
+        lines = self.read(total)
+        if lines is None:
+            self.responses = {}
+            self.index(history.iter(feedback=feedback))
+        elif self.records < total:
+            self.index(islice(history.iter_from(self.records), total - self.records))
+        stale = lines != 1 or self.records < total
+        self.records = total
+        if stale:
+            self.file.replace([self.line(self.responses)])
+        history.listeners.append(self.add)
+
+    def read(self, total):
+        """Load the entries in path; the number of lines, or None if they do not fit the history"""
+        self.responses = {}
+        self.records = 0
+        lines = 0
+        if not os.path.exists(self.file.path):
+            return lines
+        with open(self.file.path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line: caught up from the history instead
+                    break
+                if entry['records'] > total:
+                    return None
+                self.responses.update(entry['responses'])
+                self.records = entry['records']
+                lines += 1
+        return lines
+
+    def line(self, responses):
+        entry = {'records': self.records, 'responses': responses}
+        return json.dumps(entry, ensure_ascii=False, default=plain).encode('utf-8') + b"\n"
+
+    def index(self, records):
+        """Add the matching records (oldest first) and return their entries"""
+        entries = {}
+        for record in records:
+            if matches(record, feedback=self.feedback):
+                entries[normalize_input(record.get('user_input'))] = record.get('bot_response')
+        self.responses.update(entries)
+        return entries
+
+    def add(self, records):
+        """Index newly stored records (a history listener)"""
+        with self.lock:
+            entries = self.index(records)
+            self.records += len(records)
+            # Unrated batches are not written; a restart catches up on them
+            if entries:
+                self.file.append(self.line(entries))
+
+    def get(self, user_input):
+        return self.responses.get(normalize_input(user_input))
+
+
+class ConversationHistory:
+    """Streaming view of a list collection with a recent-window cache
+
+    Iterating, ``iter`` and ``len`` go to the storage, so consumers can run
+    over histories larger than memory.  ``recent`` holds only the last
+    ``window`` records for code that wants a quick look at the latest turns.
+    With ``dedup`` a ContentIndex drops records that are already stored,
+    so importing the same data twice is a no-op.
+    """
+
+    def __init__(self, storage, name, window=RECENT_WINDOW, dedup=True):
+        self.storage = storage
+        self.name = name
+        self.window = window
+        self.index = ContentIndex(storage, name) if dedup else None
+        # Callables given every batch of newly stored records (e.g. search indexes)
+        self.listeners = []
+        latest = islice(storage.iter_records(name, newest_first=True), window)
+        # Copies, so the window never holds views into a compact store
+        self.recent = [dict(record) for record in latest][::-1]
+
+    def __len__(self):
+        return self.storage.count(self.name)
+
+    def __iter__(self):
+        return self.iter()
+
+    def iter(self, since=None, until=None, feedback=None, newest_first=False):
+        """Stream records, optionally within [since, until) and of given feedback types"""
+        return self.storage.iter_records(self.name, newest_first, since, until, feedback)
+
+    def iter_from(self, start):
+        """Stream records from position start on, without reading the ones before"""
+        return self.storage.iter_from(self.name, start)
+
+    def records_at(self, positions):
+        return self.storage.records_at(self.name, positions)
+
+    def query(self, **filters):
+        return self.storage.query(self.name, **filters)
+
+    def feedback_counts(self):
+        return self.storage.feedback_counts(self.name)
+
+    def trim(self):
+        # Trim in chunks so appends stay O(1) amortized
+        if len(self.recent) > 2 * self.window:
+            del self.recent[:len(self.recent) - self.window]
+
+    def append(self, record):
+        """Store a record; False if it was an exact duplicate"""
+        return self.extend([record]) == 1
+
+    def extend(self, records):
+        """Store records, returning how many were new"""
+        records = list(records)
+        if self.index is not None:
+            records = self.index.add_new(records)
+        if records:
+            self.storage.extend(self.name, records)
+            if self.index is not None:
+                self.index.save()
+            self.recent.extend(records)
+            self.trim()
+            for listener in self.listeners:
+                listener(records)
+        return len(records)
+
+
+def open_storage(data_dir, mode=None, write_mode=None, **options):
+    """Create the storage for a data directory in the requested mode"""
+    mode = mode or DEFAULT_STORAGE_MODE
+    write_mode = write_mode or DEFAULT_WRITE_MODE
+    if mode in ("json", "jsonl", "segmented"):
+        options.setdefault("compact", DEFAULT_COMPACT)
+    if mode == "json":
+        storage = JsonStorage(data_dir, **options)
+    elif mode == "jsonl":
+        storage = JsonlStorage(data_dir, **options)
+    elif mode == "sqlite":
+        storage = SqliteStorage(data_dir, **options)
+    elif mode == "segmented":
+        storage = SegmentedStorage(data_dir, **options)
+    else:
+        raise ValueError(f"Unknown storage mode: {mode}")
+
+    if write_mode == "direct":
+        return storage
+    if write_mode in ("background", "group"):
+        return BackgroundWriter(storage, wait=(write_mode == "group"))
+    raise ValueError(f"Unknown write mode: {write_mode}")
+
+
+def migrate(data_dir="training_data", target_mode="sqlite"):
+    """Copy the JSON/JSONL training data of a directory into another storage mode"""
+    source = JsonlStorage(data_dir)
+    target = open_storage(data_dir, target_mode)
+    migrated = {}
+    for name, default in COLLECTIONS.items():
+        paths = [source.json_path(name), source.snapshot_path(name), source.log_path(name)]
+        if not any(os.path.exists(path) for path in paths):
+            continue
+        data = source.load(name, type(default)())
+        target.load(name, type(default)())
+        if isinstance(data, dict):
+            target.update(name, data)
+        elif target.count(name):
+            print(f"ℹ {name} already present in {target_mode} storage, skipping")
+            continue
+        else:
+            target.extend(name, data)
+        migrated[name] = len(data)
+    source.close()
+    target.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    # Usage: python storage.py migrate [data_dir] [target_mode]
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python storage.py migrate [data_dir] [target_mode]")
+        sys.exit(1)
+
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else "training_data"
+    target_mode = sys.argv[3] if len(sys.argv) > 3 else "sqlite"
+    for name, count in migrate(data_dir, target_mode).items():
+        print(f"✅ Migrated {count} {name} entries to {target_mode}")
@@ -5,6 +5,7 @@ Run this to verify training features work correctly
 
 import sys
 import os
+import json
 sys.path.append(os.path.dirname(__file__))
 
 def test_training_system():
@@ -25,8 +26,8 @@ def test_training_system():
         # Test sample data creation
         print("\n📚 Testing sample data creation...")
         create_sample_training_data(trainer)
-        print(f"  ✅ Created {len(trainer.conversations)} sample conversations")
-        print(f"  ✅ Created {len(trainer.feedback_data)} sample feedback entries")
+        print(f"  ✅ Created {len(trainer.history)} sample conversations")
+        print(f"  ✅ Created {len(trainer.feedback_history)} sample feedback entries")
         
         # Test training report
         print("\n📊 Testing training report...")
@@ -40,11 +41,12 @@ def test_training_system():
         
         # Test ML model training
         print("\n🧠 Testing ML model training...")
-        if len(trainer.conversations) >= 10:
+        conversation_count = len(trainer.history)
+        if conversation_count >= 10:
             success = trainer.train_ml_model()
             print(f"  ✅ ML model training: {'Success' if success else 'Failed'}")
         else:
-            print(f"  ⏳ Need {10 - len(trainer.conversations)} more conversations for ML training")
+            print(f"  ⏳ Need {10 - conversation_count} more conversations for ML training")
         
         # Test response enhancement
         print("\n💬 Testing response enhancement...")
@@ -78,8 +80,699 @@ def test_training_system():
         print(f"❌ Test failed: {e}")
         return False
 
+def sample_conversations(count, start=0):
+    return [{'timestamp': f"2024-01-01T00:00:{i % 60:02d}", 'user_input': f"question about topic{i} gardens",
+             'bot_response': f"Answer {i}", 'feedback': None} for i in range(start, start + count)]
+
+def test_jsonl_replay_and_snapshot_recovery():
+    """The JSONL log replays on load, snapshots truncate it, and stale or torn lines are skipped"""
+    import tempfile
+    from storage import JsonlStorage
+    print("📜 Testing JSONL log replay...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = JsonlStorage(data_dir, snapshot_every=5)
+        storage.load("conversations", [])
+        storage.extend("conversations", sample_conversations(3))
+        storage.close()
+        assert not os.path.exists(storage.snapshot_path("conversations"))
+
+        # Replayed from the log alone
+        storage = JsonlStorage(data_dir, snapshot_every=5)
+        assert len(storage.load("conversations", [])) == 3
+        storage.extend("conversations", sample_conversations(4, start=3))
+        assert os.path.getsize(storage.log_path("conversations")) == 0
+        storage.append("conversations", sample_conversations(1, start=7)[0])
+        storage.close()
+        print("  ✅ Snapshot written and log truncated")
+
+        # A crash between the snapshot and the truncation leaves lines the
+        # snapshot already holds; the last write may be torn
+        with open(storage.log_path("conversations"), 'r', encoding='utf-8') as f:
+            last_line = f.read()
+        with open(storage.snapshot_path("conversations"), 'r', encoding='utf-8') as f:
+            snapshot_seq = json.load(f)['seq']
+        with open(storage.log_path("conversations"), 'w', encoding='utf-8') as f:
+            for seq in range(1, snapshot_seq + 1):
+                f.write(json.dumps({'seq': seq, 'op': 'append', 'record': {'user_input': "replayed twice"}}) + "\n")
+            f.write(last_line)
+            f.write('{"seq": 99, "op": "app')
+
+        storage = JsonlStorage(data_dir, snapshot_every=5)
+        data = storage.load("conversations", [])
+        storage.close()
+        assert [conv['bot_response'] for conv in data] == [f"Answer {i}" for i in range(8)]
+        print("  ✅ Snapshot plus log recovered without duplicates")
+
+def test_background_writes_ordered_and_durable():
+    """Queued writes keep their order, group commits are on disk on return, close writes the rest"""
+    import tempfile
+    import threading
+    from storage import open_storage
+    print("✍️ Testing background and group writes...")
+    for mode in ("jsonl", "sqlite"):
+        for write_mode in ("background", "group"):
+            with tempfile.TemporaryDirectory() as data_dir:
+                storage = open_storage(data_dir, mode, write_mode)
+                storage.load("conversations", [])
+
+                def log(thread):
+                    for conv in sample_conversations(50, start=thread * 50):
+                        storage.append("conversations", conv)
+                        if write_mode == "group" and conv['bot_response'].endswith("0"):
+                            # Returned, so another process reading the files sees it
+                            reader = open_storage(data_dir, mode, "direct", read_only=True)
+                            reader.load("conversations", [])
+                            stored = [stored['bot_response'] for stored in reader.iter_records("conversations")]
+                            assert conv['bot_response'] in stored
+                            reader.close()
+
+                threads = [threading.Thread(target=log, args=(thread,)) for thread in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                storage.close()
+
+                storage = open_storage(data_dir, mode, "direct")
+                storage.load("conversations", [])
+                stored = [int(conv['bot_response'].split()[1]) for conv in storage.iter_records("conversations")]
+                storage.close()
+                assert sorted(stored) == list(range(200))
+                for thread in range(4):
+                    mine = [i for i in stored if i // 50 == thread]
+                    assert mine == sorted(mine), f"{mode}/{write_mode} reordered writes"
+        print(f"  ✅ {mode}: every write stored once, in order")
+
+def test_segment_rollover_and_manifest_filtering():
+    """Segments close per day or size, and reads skip segments the manifest rules out"""
+    import tempfile
+    from storage import SegmentedStorage
+    print("🗂️ Testing segmented storage...")
+    days = ["2024-01-01", "2024-01-01", "2024-01-01", "2024-01-02", "2024-01-02", "2024-01-02",
+            "2024-01-03", "2024-01-03"]
+    records = sample_conversations(len(days))
+    for record, day in zip(records, days):
+        record['timestamp'] = f"{day}T12:00:00"
+    records[4]['feedback'] = 'good'
+    for compression, extension in (("gzip", ".gz"), ("lzma", ".xz")):
+        with tempfile.TemporaryDirectory() as data_dir:
+            storage = SegmentedStorage(data_dir, compression=compression)
+            storage.load("conversations", [])
+            for record in records:
+                storage.append("conversations", record)
+            storage.close()
+
+            storage = SegmentedStorage(data_dir, compression=compression)
+            hot = storage.load("conversations", [])
+            segments = storage.manifests["conversations"]['segments']
+            assert [segment['count'] for segment in segments] == [3, 3] and len(hot) == 2
+            assert all(segment['file'].endswith(extension) for segment in segments)
+            assert storage.count("conversations") == 8
+            assert storage.feedback_counts("conversations") == {None: 7, 'good': 1}
+            answers = [f"Answer {i}" for i in range(8)]
+            assert [conv['bot_response'] for conv in storage.iter_records("conversations")] == answers
+            assert [conv['bot_response'] for conv in storage.iter_records("conversations", newest_first=True)] == \
+                answers[::-1]
+            assert [conv['bot_response'] for conv in storage.records_at("conversations", [7, 0, 4])] == \
+                ["Answer 7", "Answer 0", "Answer 4"]
+
+            # The first day's segment is unreadable, so only skipping it lets these succeed
+            with open(os.path.join(storage.segment_dir("conversations"), segments[0]['file']), 'wb') as f:
+                f.write(b"not compressed")
+            since = storage.iter_records("conversations", since="2024-01-02")
+            assert [conv['bot_response'] for conv in since] == answers[3:]
+            good = storage.iter_records("conversations", feedback='good')
+            assert [conv['bot_response'] for conv in good] == ["Answer 4"]
+            storage.close()
+        print(f"  ✅ {compression}: daily segments with manifest filtering")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = SegmentedStorage(data_dir, max_segment_bytes=200)
+        storage.load("conversations", [])
+        for record in sample_conversations(10):
+            storage.append("conversations", record)
+        segments = storage.manifests["conversations"]['segments']
+        assert len(segments) > 1 and sum(segment['count'] for segment in segments) + \
+            len(storage.collections["conversations"]) == 10
+        assert [conv['bot_response'] for conv in storage.iter_records("conversations")] == \
+            [f"Answer {i}" for i in range(10)]
+        storage.close()
+    print("  ✅ Hot segment closed when it outgrows max_segment_bytes")
+
+def test_model_artifact_versions():
+    """Saved models predict like the pipeline, CURRENT moves on, and old versions are pruned"""
+    import tempfile
+    import numpy as np
+    from ai_trainer import categorize_responses, fit_ml_pipeline
+    from model_artifact import CompiledModel, CURRENT_FILE, current_version, save_model, write_model
+    print("📦 Testing versioned model artifacts...")
+    responses = ["Hello there!", "I can help you", "It is ten o'clock", "Sunny weather today",
+                 "Python code sample", "Nice to meet you"] * 3
+    inputs = [f"question {i} about {response.lower()}" for i, response in enumerate(responses)]
+    pipeline, vectorizer = fit_ml_pipeline(inputs, categorize_responses(responses))
+    classifier = pipeline.named_steps['classifier']
+    probes = ["hello friend", "please help me", "what time is it", "python code", "nothing known"]
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "trained_model")
+
+        # An unversioned model from an older release still loads
+        write_model(path, vectorizer, classifier, len(inputs))
+        legacy = CompiledModel(path)
+        assert current_version(path) == path
+        assert list(legacy.predict(probes)) == list(pipeline.predict(probes))
+        assert np.allclose(legacy.predict_proba(probes), pipeline.predict_proba(probes))
+
+        versions = [save_model(path, vectorizer, classifier, len(inputs)) for _ in range(3)]
+        with open(os.path.join(path, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            assert os.path.join(path, f.read()) == versions[-1]
+        # The current version and the one it replaced; the legacy files are gone
+        assert sorted(os.listdir(path)) == sorted([CURRENT_FILE] + [os.path.basename(v) for v in versions[-2:]])
+        model = CompiledModel(path)
+        assert model.path == versions[-1] and model.meta['conversations'] == len(inputs)
+        assert list(model.predict(probes)) == list(pipeline.predict(probes))
+        assert np.allclose(model.predict_proba(probes), pipeline.predict_proba(probes))
+        print("  ✅ Round trip matches the pipeline, two versions kept")
+
+        meta_file = os.path.join(versions[-1], "meta.json")
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        meta['schema_version'] += 1
+        with open(meta_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        try:
+            CompiledModel(path)
+            assert False, "loaded a newer schema"
+        except ValueError:
+            pass
+        print("  ✅ Unknown schema version rejected")
+
+def test_adaptive_response_index_matches_scan():
+    """The keyword and bad-response indexes answer like scanning the learned patterns in order"""
+    import random
+    import tempfile
+    from ai_trainer import AITrainer
+    print("🗂️ Testing the learned pattern index...")
+
+    def scan(trainer, user_input, base_response):
+        # The in-order loop the indexes replaced
+        keywords = trainer.extract_keywords(user_input)
+        for pattern_data in trainer.learned_patterns.values():
+            if not isinstance(pattern_data, dict):
+                continue
+            if pattern_data['learn_type'] == 'positive':
+                if any(keyword in pattern_data['input_keywords'] for keyword in keywords):
+                    return f"{base_response} (I've learned you might like responses like this!)"
+            elif pattern_data['learn_type'] == 'negative':
+                if base_response.lower() == pattern_data['bad_response'].lower():
+                    return "Let me try a different approach to answer that better."
+        return base_response
+
+    words = ["python", "weather", "garden", "music", "travel", "recipe", "football", "movie"]
+    responses = ["Sure thing", "Here is how", "Not sure", "Try again", "Good question"]
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as data_dir:
+        trainer = AITrainer(data_dir=data_dir, write_mode="direct")
+        for _ in range(40):
+            user_input = " ".join(rng.sample(words, 2))
+            if rng.random() < 0.5:
+                trainer.learn_from_positive_feedback(user_input, rng.choice(responses))
+            else:
+                trainer.learn_from_negative_feedback(user_input, rng.choice(responses).upper(), "meh")
+        # Overwriting a key and importing patterns rebuild the indexes
+        trainer.add_pattern("good_0", {"input_keywords": ["garden"], "good_response": "Dig",
+                                       "learn_type": "positive"})
+        trainer.import_patterns({"python": ["SimpleAITrainer list"],
+                                 "avoid_x": {"input_keywords": [], "bad_response": "Good question",
+                                             "feedback": "", "learn_type": "negative"}})
+
+        for reloaded in (False, True):
+            if reloaded:
+                trainer.storage.close()
+                trainer = AITrainer(data_dir=data_dir, write_mode="direct")
+            for _ in range(200):
+                user_input = " ".join(rng.sample(words + ["unknown"], 2))
+                base_response = rng.choice(responses)
+                assert trainer.get_adaptive_response(user_input, base_response) == \
+                    scan(trainer, user_input, base_response), (user_input, base_response)
+        trainer.storage.close()
+    print("  ✅ Indexed lookups agree with the in-order scan")
+
+def test_pattern_matcher_agrees_with_regex_loop():
+    """PatternMatcher picks the same rule as re.search over the rules in order"""
+    import random
+    import re
+    from pattern_matcher import PatternMatcher
+    print("🧩 Testing the pattern matcher...")
+    rules = [
+        r'\b(hello|hi|hey|good morning)\b',
+        r'\b(how are you|what\'s up)\b',
+        r'\d+\s*(am|pm)',
+        r'\b(what time|today\'s date)\b',
+        r'\b(hi there|his|history)\b',
+        r'^bye',
+        r'\b(help|assist|support)\b',
+        r'\b(time|up)\b',
+    ]
+    words = ["hello", "hi", "his", "history", "hey", "good", "morning", "how", "are", "you", "what's",
+             "up", "what", "time", "today's", "date", "7", "pm", "am", "bye", "help", "assistant",
+             "there", "hithere", "helpful", "supported", "!", "?", ","]
+    rng = random.Random(3)
+    inputs = ["", "bye now", "good-bye", "hi!", "it's 10pm", "his-story", "what's up?", "history of time"]
+    inputs += ["".join(rng.choice([" ", "", " "]) + rng.choice(words) for _ in range(rng.randint(1, 6)))
+               for _ in range(2000)]
+    matcher = PatternMatcher(rules)
+    for text in inputs:
+        expected = next((pattern for pattern in rules if re.search(pattern, text)), None)
+        assert matcher.match(text) == expected, (text, expected)
+    print(f"  ✅ Same rule as the regex loop for {len(inputs)} inputs")
+
+def test_spelling_index_corrections():
+    """SpellingIndex finds the same correction as comparing the word with the whole vocabulary"""
+    import random
+    from spelling import SpellingIndex, allowed_distance, edit_distance
+    print("🔤 Testing spelling correction...")
+    rng = random.Random(11)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = {"".join(rng.choice(letters[:8]) for _ in range(rng.randint(3, 12))): rng.randint(1, 5)
+                  for _ in range(300)}
+
+    def typo(word):
+        i = rng.randrange(len(word))
+        edit = rng.choice(("delete", "insert", "replace", "swap"))
+        if edit == "delete":
+            return word[:i] + word[i + 1:]
+        if edit == "insert":
+            return word[:i] + rng.choice(letters[:8]) + word[i:]
+        if edit == "replace":
+            return word[:i] + rng.choice(letters[:8]) + word[i + 1:]
+        return word[:i] + word[i + 1:i + 2] + word[i:i + 1] + word[i + 2:]
+
+    for lexicon in (frozenset(), frozenset(["held"])):
+        index = SpellingIndex(lexicon=lexicon)
+        for word, count in vocabulary.items():
+            index.add(word, count)
+
+        def scan(word):
+            # Every vocabulary word compared, closest then most frequent then alphabetical
+            if word in vocabulary or word in lexicon:
+                return word
+            limit = allowed_distance(word, strict=not lexicon)
+            candidates = [(edit_distance(word, known, limit), -count, known)
+                          for known, count in vocabulary.items()]
+            candidates = [candidate for candidate in candidates if candidate[0] <= limit]
+            return min(candidates)[2] if limit and candidates else word
+
+        words = list(vocabulary)
+        for _ in range(400):
+            word = rng.choice(words)
+            for _ in range(rng.randint(1, 2)):
+                word = typo(word) or word
+            assert index.correct(word) == scan(word), word
+    index = SpellingIndex(["hello", "help"], lexicon=frozenset(["held"]))
+    assert index.correct("helo") == "hello" and index.correct("held") == "held"
+    print("  ✅ Corrections match a scan of the vocabulary")
+
+def test_online_model_catch_up():
+    """catch_up learns only what the saved state has not seen, and queued records only once"""
+    import tempfile
+    import numpy as np
+    from ai_trainer import ML_CATEGORIES, categorize_responses
+    from online_model import OnlineModel
+    from storage import open_storage, ConversationHistory
+    print("📈 Testing online model catch-up...")
+    responses = ["Hello there", "I can help", "Python code", "Sunny weather", "Anything else"]
+    records = sample_conversations(280)
+    for i, record in enumerate(records):
+        record['bot_response'] = responses[i % len(responses)]
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "online_model")
+        storage = open_storage(data_dir, "jsonl", "direct")
+        storage.load("conversations", [])
+        history = ConversationHistory(storage, "conversations")
+        history.extend(records[:250])
+
+        model = OnlineModel(path, ML_CATEGORIES, categorize_responses)
+        assert model.catch_up(history) == 250
+        model.save()
+        # Learned on the worker as they are logged, then nothing is left to catch up
+        history.listeners.append(model.learn_later)
+        history.extend(records[250:])
+        assert model.catch_up(history) == 0
+        assert model.learned == 280 and model.classifier.class_count_.sum() == 280
+
+        # Restarted from the state saved at 250: only the last 30 are learned again
+        restarted = OnlineModel(path, ML_CATEGORIES, categorize_responses)
+        assert restarted.learned == 250
+        assert restarted.catch_up(history) == 30
+        assert np.allclose(restarted.classifier.feature_count_, model.classifier.feature_count_)
+        probes = ["hello", "python help", "weather"]
+        assert np.allclose(restarted.predict_proba(probes), model.predict_proba(probes))
+        storage.close()
+    print("  ✅ Caught up from the saved offset without double counting")
+
+def test_sqlite_migration_idempotent():
+    """Migrating JSON data to sqlite twice stores every record once"""
+    import tempfile
+    from storage import JsonStorage, open_storage, migrate
+    print("🗄️ Testing sqlite migration...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        source = JsonStorage(data_dir)
+        source.load("conversations", [])
+        source.load("learned_patterns", {})
+        source.extend("conversations", sample_conversations(6))
+        source.put("learned_patterns", "gardens", ["Answer 1"])
+        source.flush()
+
+        first = migrate(data_dir, "sqlite")
+        second = migrate(data_dir, "sqlite")
+        assert first == {'conversations': 6, 'learned_patterns': 1}
+        assert 'conversations' not in second
+
+        storage = open_storage(data_dir, "sqlite", "direct")
+        storage.load("conversations", [])
+        patterns = storage.load("learned_patterns", {})
+        assert storage.count("conversations") == 6
+        assert [conv['bot_response'] for conv in storage.iter_records("conversations")] == \
+            [f"Answer {i}" for i in range(6)]
+        assert patterns == {"gardens": ["Answer 1"]}
+        storage.close()
+        print("  ✅ Second migration changed nothing")
+
+def test_dedup_across_restarts():
+    """Duplicates are dropped after a restart, and a stale hash file is rebuilt"""
+    import tempfile
+    import storage as storage_module
+    from storage import open_storage, ConversationHistory
+    print("🧬 Testing dedup across restarts...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        def open_history():
+            storage = open_storage(data_dir, "jsonl", "direct")
+            storage.load("conversations", [])
+            return ConversationHistory(storage, "conversations")
+
+        history = open_history()
+        assert history.extend(sample_conversations(5)) == 5
+        assert history.extend(sample_conversations(5)) == 0
+        history.storage.close()
+        hashes_file = os.path.join(data_dir, "conversations.hashes")
+        assert os.path.getsize(hashes_file) == 5 * 8
+
+        history = open_history()
+        assert history.extend(sample_conversations(6)) == 1
+        history.storage.close()
+        print("  ✅ Hashes survive a restart")
+
+        # Hashes lost in a crash: the file no longer covers the history
+        with open(hashes_file, 'r+b') as f:
+            f.truncate(3 * 8)
+        history = open_history()
+        assert os.path.getsize(hashes_file) == 6 * 8
+        assert history.extend(sample_conversations(7)) == 1
+        assert len(history) == 7
+        history.storage.close()
+        print("  ✅ Stale hash index rebuilt")
+
+        # New hashes merged into the sorted array many times over
+        recent_hashes = storage_module.RECENT_HASHES
+        storage_module.RECENT_HASHES = 3
+        try:
+            history = open_history()
+            for start in range(7, 41, 2):
+                assert history.extend(sample_conversations(2, start=start)) == 2
+            assert history.extend(sample_conversations(41)) == 0
+            assert len(history) == 41 and len(history.index.recent) < 3
+            assert list(history.index.sorted) == sorted(history.index.sorted)
+            history.storage.close()
+        finally:
+            storage_module.RECENT_HASHES = recent_hashes
+        print("  ✅ Duplicates found in the sorted and the recent hashes")
+
+def check_index_staleness(index_class):
+    """A search index's term cache catches up with new records and is rebuilt when stale"""
+    import tempfile
+    from storage import open_storage, ConversationHistory
+    print(f"🔎 Testing {index_class.__name__} staleness...")
+    with tempfile.TemporaryDirectory() as data_dir:
+        index_file = os.path.join(data_dir, "index.jsonl")
+
+        def open_index():
+            storage = open_storage(data_dir, "jsonl", "direct")
+            storage.load("conversations", [])
+            history = ConversationHistory(storage, "conversations")
+            return history, index_class(index_file, history)
+
+        def lines():
+            with open(index_file, 'rb') as f:
+                return f.read().splitlines()
+
+        def found(index, i):
+            results = index.search(f"topic{i}", top_k=1)
+            return bool(results) and results[0]['conversation']['bot_response'] == f"Answer {i}"
+
+        history, index = open_index()
+        history.extend(sample_conversations(5))
+        assert found(index, 2)
+        history.extend(sample_conversations(2, start=5))
+        assert found(index, 6) and len(lines()) == 7
+        history.storage.close()
+
+        # Logged while no index was loaded: caught up from the history
+        history, index = open_index()
+        history.extend(sample_conversations(3, start=7))
+        assert found(index, 9) and len(lines()) == 10
+        history.storage.close()
+
+        # More lines than records, a torn line, or the old format with
+        # record copies: rebuilt from the history
+        for stale in (lines() + [b'{"terms": {"extra": 1}}'],
+                      lines()[:-1] + [b'{"terms": {"top'],
+                      [json.dumps({'record': {}, 'terms': {}}).encode('utf-8')] * 10):
+            with open(index_file, 'wb') as f:
+                f.write(b"\n".join(stale) + b"\n")
+            history, index = open_index()
+            assert found(index, 9) and found(index, 0)
+            assert len(lines()) == 10 and all(b'"record"' not in line for line in lines())
+            history.storage.close()
+    print(f"  ✅ {index_class.__name__} caught up and rebuilt")
+
+def test_similarity_index_staleness():
+    from similarity_index import SimilarityIndex
+    check_index_staleness(SimilarityIndex)
+
+def test_bm25_index_staleness():
+    from bm25_index import BM25Index
+    check_index_staleness(BM25Index)
+
+def test_json_restart_after_migration():
+    """The lightweight trainers refuse JSON files superseded by sqlite instead of starting empty"""
+    import tempfile
+    import hybrid_app
+    import simple_ai_trainer
+    from storage import migrate
+    print("🗄️ Testing JSON restart after migration...")
+    cwd = os.getcwd()
+    for trainer_class in (simple_ai_trainer.SimpleAITrainer, hybrid_app.SimpleAITrainer):
+        with tempfile.TemporaryDirectory() as work_dir:
+            # The trainers keep their data in ./training_data
+            os.chdir(work_dir)
+            try:
+                trainer = trainer_class(storage_mode="json", write_mode="direct")
+                for conv in sample_conversations(5):
+                    trainer.log_conversation(conv['user_input'], conv['bot_response'])
+                migrate("training_data", "sqlite")
+                trainer = trainer_class(storage_mode="sqlite", write_mode="direct")
+                trainer.log_conversation("after migration", "Stored in sqlite")
+                trainer.storage.close()
+                try:
+                    trainer_class(storage_mode="json", write_mode="direct")
+                    assert False, "loaded superseded JSON"
+                except ValueError:
+                    pass
+                with open(os.path.join("training_data", "conversations.json"), 'r', encoding='utf-8') as f:
+                    assert len(json.load(f)) == 5
+            finally:
+                os.chdir(cwd)
+    print("  ✅ Superseded JSON refused and left intact")
+
+def test_retrain_job_end_to_end():
+    """A retrain job fits the model in a child process and installs it with its semantic index"""
+    import tempfile
+    import time
+    from ai_trainer import AITrainer
+    from model_artifact import CompiledModel, CURRENT_FILE
+    from retrain_jobs import RetrainJobs
+    print("🔄 Testing a retrain job...")
+    responses = ["Hello there", "I can help", "Python code", "Sunny weather", "Anything else"]
+    records = sample_conversations(1100)
+    for i, record in enumerate(records):
+        record['bot_response'] = responses[i % len(responses)]
+    with tempfile.TemporaryDirectory() as data_dir:
+        # The server never snapshots during the test; a child opening the
+        # storage for writing would (more than its default 1000 log lines)
+        trainer = AITrainer(data_dir=data_dir, storage_mode="jsonl", write_mode="background",
+                            snapshot_every=5000)
+        trainer.history.extend(records)
+        jobs = RetrainJobs(trainer)
+        job = jobs.submit()
+        deadline = time.monotonic() + 120
+        while jobs.status(job['id'])['status'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(0.1)
+        status = jobs.status(job['id'])
+        assert status['status'] == 'succeeded', status
+        assert status['stage'] == 'installed' and status['conversations'] == 1100
+
+        assert isinstance(trainer.ml_model, CompiledModel) and trainer.ml_model.meta['conversations'] == 1100
+        assert os.path.exists(os.path.join(trainer.model_dir, CURRENT_FILE))
+        assert not os.path.exists(trainer.model_dir + ".candidate")
+        assert trainer.semantic_index.exists()
+        results = trainer.semantic_index.search("question about topic7 gardens", top_k=1)
+        assert results and results[0]['conversation']['user_input'] == "question about topic7 gardens"
+        assert not os.path.exists(trainer.storage.storage.snapshot_path("conversations"))
+        trainer.storage.close()
+    print("  ✅ Model and semantic index installed from the child process")
+
+def test_staged_semantic_index_install():
+    """A retrained semantic index goes live with its model, and not when the model fails its check"""
+    import shutil
+    import tempfile
+    import numpy as np
+    from ai_trainer import AITrainer
+    from retrain_jobs import train
+    print("🧭 Testing staged semantic index install...")
+    responses = ["Hello there", "I can help", "Python code", "Sunny weather", "Anything else"]
+    records = sample_conversations(40)
+    for i, record in enumerate(records):
+        record['bot_response'] = responses[i % len(responses)]
+
+    def top_input(trainer, text):
+        results = trainer.semantic_index.search(text, top_k=1)
+        return results[0]['conversation']['user_input'] if results else None
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        trainer = AITrainer(data_dir=data_dir, storage_mode="jsonl", write_mode="direct")
+        trainer.history.extend(records[:20])
+        assert trainer.train_ml_model()
+        assert top_input(trainer, "topic3") == records[3]['user_input']
+        trainer.history.extend(records[20:])
+        # Not indexed until the next training
+        assert top_input(trainer, "topic25") is None
+
+        candidate = os.path.join(data_dir, "candidate")
+        train(data_dir, "jsonl", candidate)
+        broken = os.path.join(candidate, "trained_model", "feature_log_prob.npy")
+        np.save(broken, np.full_like(np.load(broken), np.nan))
+        try:
+            trainer.install_model(os.path.join(candidate, "trained_model"), os.path.join(candidate, "semantic_index"))
+            assert False, "installed a broken model"
+        except ValueError:
+            pass
+        assert top_input(trainer, "topic25") is None
+        assert os.path.exists(os.path.join(candidate, "semantic_index"))
+        print("  ✅ Index left staged when the model fails its check")
+
+        shutil.rmtree(candidate)
+        train(data_dir, "jsonl", candidate)
+        trainer.install_model(os.path.join(candidate, "trained_model"), os.path.join(candidate, "semantic_index"))
+        assert top_input(trainer, "topic25") == records[25]['user_input']
+        assert top_input(trainer, "topic3") == records[3]['user_input']
+        trainer.storage.close()
+    print("  ✅ Index installed and reloaded with the model")
+
+def test_exact_response_index_restart():
+    """The hybrid bot's exact answers survive restarts, catch up on missed records and follow a cleared history"""
+    import shutil
+    import tempfile
+    from hybrid_app import SimpleAITrainer
+    from storage import open_storage, ConversationHistory
+    print("🎯 Testing the exact response index...")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # The trainer keeps its data in ./training_data
+        os.chdir(work_dir)
+        try:
+            index_file = os.path.join("training_data", "exact_responses.jsonl")
+            trainer = SimpleAITrainer(storage_mode="jsonl", write_mode="direct")
+            trainer.log_conversation("What is BM25?", "A ranking function", feedback='good')
+            trainer.log_conversation("what is bm25", "Wrong answer", feedback='bad')
+            trainer.log_conversation("Who are you?", "Unrated answer")
+            trainer.log_conversation("who are you", "I'm AI-BD", feedback='User taught response')
+            trainer.storage.close()
+
+            trainer = SimpleAITrainer(storage_mode="jsonl", write_mode="direct")
+            assert trainer.exact_responses.get("what is BM25?") == "A ranking function"
+            assert trainer.exact_responses.get("Who are you") == "I'm AI-BD"
+            with open(index_file, 'rb') as f:
+                assert len(f.readlines()) == 1
+            trainer.storage.close()
+            print("  ✅ Loaded from the index file")
+
+            # Logged while no hybrid trainer was listening
+            storage = open_storage("training_data", "jsonl", "direct")
+            storage.load("conversations", [])
+            ConversationHistory(storage, "conversations").extend([
+                {'timestamp': "2024-01-01T00:00:00", 'user_input': "Is it raining?",
+                 'bot_response': "Take an umbrella", 'feedback': 'good'}])
+            storage.close()
+            trainer = SimpleAITrainer(storage_mode="jsonl", write_mode="direct")
+            assert trainer.exact_responses.get("is it raining?") == "Take an umbrella"
+            trainer.storage.close()
+            print("  ✅ Caught up with records logged meanwhile")
+
+            for name in os.listdir("training_data"):
+                if name.startswith("conversations"):
+                    os.remove(os.path.join("training_data", name))
+            trainer = SimpleAITrainer(storage_mode="jsonl", write_mode="direct")
+            assert trainer.exact_responses.get("What is BM25?") is None
+            trainer.log_conversation("What is BM25?", "Rated again", feedback='good')
+            assert trainer.exact_responses.get("What is BM25?") == "Rated again"
+            trainer.storage.close()
+            print("  ✅ Rebuilt after the history was cleared")
+        finally:
+            os.chdir(cwd)
+
+def test_hybrid_semantic_index_positive_only():
+    """The hybrid bot's paraphrase lookups never answer with an unrated or downvoted response"""
+    import tempfile
+    print("🔍 Testing hybrid semantic index...")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Both trainers keep their data in ./training_data
+        os.chdir(work_dir)
+        try:
+            from ai_trainer import AITrainer
+            from hybrid_app import SimpleAITrainer, POSITIVE_FEEDBACK
+            hybrid = SimpleAITrainer(write_mode='direct')
+            topics = ["python lists", "french cooking", "weather forecast", "guitar chords", "moon landing"]
+            for topic in topics:
+                hybrid.log_conversation(f"tell me about {topic}", f"Good answer on {topic}", feedback='good')
+                hybrid.log_conversation(f"explain {topic} please", f"Bad answer on {topic}", feedback='bad')
+                hybrid.log_conversation(f"what about {topic} today", f"Unrated answer on {topic}")
+            hybrid.train_simple_model()
+
+            # AITrainer indexes every conversation of the same history
+            trainer = AITrainer(write_mode='direct')
+            assert trainer.train_ml_model()
+            assert trainer.semantic_index.exists()
+
+            positive = {conv['bot_response'] for conv in hybrid.history.iter(feedback=POSITIVE_FEEDBACK)}
+            for conv in list(hybrid.history.iter()):
+                response = hybrid.get_semantic_response(conv['user_input'])
+                assert response is None or response in positive, response
+            print("  ✅ Only positively rated responses are reused")
+        finally:
+            os.chdir(cwd)
+
 if __name__ == "__main__":
     success = test_training_system()
+    for name, test in list(globals().items()):
+        if not name.startswith("test_") or test is test_training_system:
+            continue
+        print()
+        try:
+            test()
+        except Exception as e:
+            print(f"❌ {test.__name__} failed: {e!r}")
+            success = False
     if success:
         print("\n🚀 Your AI-BD training system is ready!")
         print("💡 Run 'python app.py' to start the chatbot")
@@ -0,0 +1,122 @@
+"""
+AI-BD Text Processing
+Keyword extraction shared by the trainers, without NLTK at run time
+"""
+
+import re
+import sys
+from functools import lru_cache
+
+# NLTK's English stop word list.  Its entries with an apostrophe ("don't",
+# "you're", ...) are left out: such tokens are never keywords anyway.
+STOP_WORDS = frozenset("""
+i me my myself we our ours ourselves you your yours yourself yourselves he him
+his himself she her hers herself it its itself they them their theirs
+themselves what which who whom this that these those am is are was were be been
+being have has had having do does did doing a an the and but if or because as
+until while of at by for with about against between into through during before
+after above below to from up down in out on off over under again further then
+once here there when where why how all any both each few more most other some
+such no nor not only own same so than too very s t can will just don should now
+d ll m o re ve y ain aren couldn didn doesn hadn hasn haven isn ma mightn mustn
+needn shan shouldn wasn weren won wouldn
+""".split())
+
+# The short list SimpleAITrainer has always filtered with
+SIMPLE_STOP_WORDS = frozenset("""
+the a an and or but in on at to for of with by is are was were be been have has
+had do does did will would could should may might can this that these those
+""".split())
+
+# Distinct inputs whose keywords are remembered
+CACHE_SIZE = 4096
+
+# Characters word_tokenize always splits on (the final period and the
+# contextual rules for ",", ":" and "'" are handled per piece)
+SEPARATORS = re.compile(r"[\s?!;@#$%&*()\[\]{}<>\"`«»“”‘’„‒-―]|\.\.+|--|[:,](?!\d)")
+FINAL_PERIOD = re.compile(r"(?<=[^.])\.(?=[\]\)}>\"'»”’ ]*\s*$)")
+LEADING_QUOTE = re.compile(r"^'+(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)")
+# Ending clitics, as split off by the Treebank rules
+CLITIC = re.compile(r"(?<=[^'])(?:'s|'m|'d|'ll|'re|'ve|n't|')$")
+# Words the Treebank rules split in two ("cannot" -> "can not")
+CONTRACTIONS = re.compile(r"\b(?:(can)(not)|(d)('ye)|(gim)(me)|(gon)(na)|(got)(ta)|(lem)(me)|(more)('n))\b|\b(wan)(na)$")
+# Period-final words that do not end a sentence (so keep their period)
+ABBREVIATIONS = frozenset("mr mrs ms dr st jr sr vs etc prof inc ltd co jan feb mar apr jun jul aug sep sept oct nov dec".split())
+SIMPLE_WORD = re.compile(r'\b\w+\b')
+
+
+def word_tokens(text):
+    """Alphanumeric tokens of text as nltk.word_tokenize produces them
+
+    Only tokens for which str.isalnum() holds are returned (the rest are
+    never keywords), so punctuation and tokens like "e.g." or "well-known"
+    are dropped exactly as the NLTK pipeline drops them.
+    """
+    # The final period is always split off, even after an abbreviation
+    text = FINAL_PERIOD.sub(" ", text)
+    tokens = []
+    for piece in SEPARATORS.split(text):
+        if not piece:
+            continue
+        piece = LEADING_QUOTE.sub("", piece)
+        if piece.endswith('.') and len(piece) > 2 and piece[:-1].isalnum() \
+                and piece[:-1] not in ABBREVIATIONS:
+            # Any other sentence ends here too, so its period is split off
+            piece = piece[:-1]
+        piece = CLITIC.sub("", piece, count=1)
+        piece = CONTRACTIONS.sub(lambda found: " %s " % " ".join(part for part in found.groups() if part), piece)
+        for token in piece.split():
+            if token.isalnum():
+                tokens.append(token)
+    return tokens
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cached_keywords(text):
+    return tuple(word for word in word_tokens(text.lower()) if word not in STOP_WORDS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cached_simple_keywords(text):
+    words = SIMPLE_WORD.findall(text.lower())
+    return tuple([word for word in words if word not in SIMPLE_STOP_WORDS and len(word) > 2][:5])
+
+
+def extract_keywords(text):
+    """AITrainer keywords: word_tokenize tokens that are alphanumeric and not stop words"""
+    return list(cached_keywords(text))
+
+
+def extract_simple_keywords(text):
+    """SimpleAITrainer keywords: up to 5 words longer than 2 letters, minus common words"""
+    return list(cached_simple_keywords(text))
+
+
+def verify(data_dir="training_data"):
+    """Compare extract_keywords with the NLTK pipeline on every logged input"""
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+    from storage import open_storage, ConversationHistory
+
+    nltk_stop_words = set(stopwords.words('english'))
+    # Only reads: no writer thread, no dedup hash file, nothing rewritten
+    storage = open_storage(data_dir, None, 'direct', read_only=True)
+    storage.load("conversations", [])
+    checked, mismatches = 0, 0
+    for conv in ConversationHistory(storage, "conversations", dedup=False):
+        text = conv.get('user_input') or ""
+        expected = [word for word in word_tokenize(text.lower()) if word.isalnum() and word not in nltk_stop_words]
+        checked += 1
+        if extract_keywords(text) != expected:
+            mismatches += 1
+            if mismatches <= 20:
+                print(f"❌ {text!r}: {extract_keywords(text)} != {expected}")
+    storage.close()
+    print(f"✅ {checked - mismatches} of {checked} inputs tokenized like word_tokenize")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "verify":
+        sys.exit(0 if verify(*sys.argv[2:3]) else 1)
+    print("Usage: python text_processing.py verify [data_dir]")
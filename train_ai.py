@@ -13,7 +13,7 @@ def main():
     trainer = AITrainer()
     
     # Create sample data if needed
-    if len(trainer.conversations) == 0:
+    if len(trainer.history) == 0:
         print("📚 Creating sample training data...")
         create_sample_training_data(trainer)
     
@@ -34,7 +34,7 @@ def main():
     
     # Train ML model if enough data
     print(f"\n🧠 Machine Learning Model:")
-    if len(trainer.conversations) >= 10:
+    if report['total_conversations'] >= 10:
         print("  Training ML model...")
         success = trainer.train_ml_model()
         if success:
@@ -42,7 +42,7 @@ def main():
         else:
             print("  ❌ ML model training failed")
     else:
-        needed = 10 - len(trainer.conversations)
+        needed = 10 - report['total_conversations']
         print(f"  ⏳ Need {needed} more conversations to train ML model")
     
     # Interactive training session